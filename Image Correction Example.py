@@ -20,7 +20,7 @@ def main() -> int:
     try:
         FullCorrection()
     except Exception as e:
-        logging.error(f"Caught exception during correction {e}")
+        logging.error("Caught exception during correction %s", e)
         return -1
     
     return 0
@@ -39,25 +39,25 @@ def FullCorrection() -> None:
     
     err = imageToCorrect.OffsetCorrection(darkMap, darkOffset)
     if err != SLError.SL_ERROR_SUCCESS:
-        logging.error(f"Failed to apply offset correction with error: {err}")
+        logging.error("Failed to apply offset correction with error: %s", err)
     
     logging.info("Offset correction applied.")
     
     err = imageToCorrect.GainCorrection(gainMap, darkOffset)
     if err != SLError.SL_ERROR_SUCCESS:
-        logging.error(f"Failed to apply gain correction with error: {err}")
+        logging.error("Failed to apply gain correction with error: %s", err)
         
     logging.info("Gain correction applied.")
     
     err = imageToCorrect.KernelDefectCorrection(defectMap)
     if err != SLError.SL_ERROR_SUCCESS:
-        logging.error(f"Failed to apply defect correction with error: {err}")
+        logging.error("Failed to apply defect correction with error: %s", err)
         
     logging.info("Defect correction applied.")
     
     filename = f"{imageSaveDir}Corrected_Image_2802_2400.tif"
     if imageToCorrect.WriteTiffImage(filename, 16):
-        logging.info(f"Saved image as {filename}")
+        logging.info("Saved image as %s", filename)
     else:
         logging.error("Failed to save image")
 
@@ -15,15 +15,15 @@ elif len(cameras) == 1:
     logging.info("Found one camera")
     
     camera = cameras[0]
-    logging.info(f"IP: {camera.DetectorIPAddress}")
-    logging.info(f"Interface: {camera.Interface}")
-    logging.info(f"unit: {camera.unit}")
+    logging.info("IP: %s", camera.DetectorIPAddress)
+    logging.info("Interface: %s", camera.Interface)
+    logging.info("unit: %s", camera.unit)
     
     device = SLDevice(camera)
     
     err = device.OpenCamera()
     if err != SLError.SL_ERROR_SUCCESS: 
-        logging.error(f"Failed to Open Camera with error: {err}")
+        logging.error("Failed to Open Camera with error: %s", err)
         sys.exit(-1)
     
     logging.info("Successfully opened camera")
@@ -33,17 +33,17 @@ elif len(cameras) == 1:
 
     err = device.CloseCamera()
     if err != SLError.SL_ERROR_SUCCESS:
-        logging.error(f"Failed to CloseCamera with error: {err}")
+        logging.error("Failed to CloseCamera with error: %s", err)
         sys.exit(-2)
     
     logging.info("Successfully closed camera")
 else:
-    logging.info(f"{len(cameras)} cameras found.")
+    logging.info("%s cameras found.", len(cameras))
     for count, camera in enumerate(cameras):
-        logging.info(f"------------ Camera {count} ------------")
-        logging.info(f"IP: {camera.DetectorIPAddress}")
-        logging.info(f"Interface: {camera.Interface}")
-        logging.info(f"unit: {camera.unit}")
+        logging.info("------------ Camera %s ------------", count)
+        logging.info("IP: %s", camera.DetectorIPAddress)
+        logging.info("Interface: %s", camera.Interface)
+        logging.info("unit: %s", camera.unit)
         
     while True:
         userInput = input("Select a camera to connect to: ")
@@ -52,17 +52,17 @@ else:
             if 0 <= number < len(cameras):
                 break
             else:
-                logging.error(f"Camera choice must be betweeen 0 and {len(cameras) - 1}")
+                logging.error("Camera choice must be betweeen 0 and %s", len(cameras) - 1)
         except ValueError:
             logging.error("Please enter a valid number")
             
-    logging.info(f"Connecting to camera {number}")
+    logging.info("Connecting to camera %s", number)
     
     device = SLDevice(cameras[number])
     
     err = device.OpenCamera()
     if err != SLError.SL_ERROR_SUCCESS: 
-        logging.error(f"Failed to Open Camera with error: {err}")
+        logging.error("Failed to Open Camera with error: %s", err)
         sys.exit(-3)
     
     logging.info("Successfully opened camera")
@@ -72,7 +72,7 @@ else:
     
     err = device.CloseCamera()
     if err != SLError.SL_ERROR_SUCCESS:
-        logging.error(f"Failed to CloseCamera with error: {err}")
+        logging.error("Failed to CloseCamera with error: %s", err)
         sys.exit(-4)
     
     logging.info("Successfully closed camera")
@@ -15,7 +15,7 @@ def main() -> int:
     
     err = device.OpenCamera()
     if err != SLError.SL_ERROR_SUCCESS: 
-        logging.error(f"Failed to Open Camera with error: {err}")
+        logging.error("Failed to Open Camera with error: %s", err)
         return -1
     
     logging.info("Successfully opened camera")
@@ -24,7 +24,7 @@ def main() -> int:
     
     err = device.CloseCamera()
     if err != SLError.SL_ERROR_SUCCESS:
-        logging.error(f"Failed to CloseCamera with error: {err}")
+        logging.error("Failed to CloseCamera with error: %s", err)
         return -2
     
     logging.info("Successfully closed camera")
@@ -43,17 +43,17 @@ def ExternalTriggerExample(device: SLDevice) -> None:
       # Configure the device
     err = device.SetExposureMode(exposureMode)
     if err != SLError.SL_ERROR_SUCCESS: 
-        logging.error(f"Failed to set exposure mode to {exposureMode} with error: {err}")
+        logging.error("Failed to set exposure mode to %s with error: %s", exposureMode, err)
         return
     
-    logging.info(f"Set exposure mode to {exposureMode}")
+    logging.info("Set exposure mode to %s", exposureMode)
     
     err = device.SetDDS(dds)
     if err != SLError.SL_ERROR_SUCCESS: 
-        logging.error(f"Failed to set DDS to {dds} with error: {err}")
+        logging.error("Failed to set DDS to %s with error: %s", dds, err)
         return
     
-    logging.info(f"Set DDS to {dds}")
+    logging.info("Set DDS to %s", dds)
 
     # Build SLImage object to read frames into
     image = SLImage(device.GetImageXDim(), device.GetImageYDim())
@@ -62,7 +62,7 @@ def ExternalTriggerExample(device: SLDevice) -> None:
     # Start Stream
     err = device.StartStream()
     if err != SLError.SL_ERROR_SUCCESS:
-        logging.error(f"Failed to StartStream with error: {err}")
+        logging.error("Failed to StartStream with error: %s", err)
         return
     
     logging.info("Started Stream") 
@@ -80,24 +80,24 @@ def ExternalTriggerExample(device: SLDevice) -> None:
 
         if bufferInfo.error == SLError.SL_ERROR_SUCCESS:                # Frame acquired successfully
             receivedFrames += 1
-            logging.info(f"Received frame #{receivedFrames} ({bufferInfo.frameCount}) with dims: {bufferInfo.width}x{bufferInfo.height}")
+            logging.info("Received frame #%s (%s) with dims: %sx%s", receivedFrames, bufferInfo.frameCount, bufferInfo.width, bufferInfo.height)
             if image.WriteTiffImage(filename) is False:
                 logging.error("Failed to save image")
         elif bufferInfo.error == SLError.SL_ERROR_MISSING_PACKETS:      # Frame acquired with missing packets
             receivedFrames += 1
-            logging.info(f"Received frame #{receivedFrames} ({bufferInfo.frameCount}) with dims: {bufferInfo.width}x{bufferInfo.height}, missing packets: {bufferInfo.missingPackets}")
+            logging.info("Received frame #%s (%s) with dims: %sx%s, missing packets: %s", receivedFrames, bufferInfo.frameCount, bufferInfo.width, bufferInfo.height, bufferInfo.missingPackets)
             if image.WriteTiffImage(filename) is False:
                 logging.error(": Failed to save image")
         elif bufferInfo.error == SLError.SL_ERROR_TIMEOUT:
             logging.warning("Timed out waiting for frame")  
             timedOut = True  
         else:
-            logging.error(f"Failed to acquire image with error: {bufferInfo.error}")
+            logging.error("Failed to acquire image with error: %s", bufferInfo.error)
         
     # Stop Stream
     err = device.StopStream()
     if err != SLError.SL_ERROR_SUCCESS:
-        logging.error(f"Failed to stop stream with error: {err}")
+        logging.error("Failed to stop stream with error: %s", err)
         return
     
     logging.info("Stopped Stream")
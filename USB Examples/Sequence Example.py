@@ -15,7 +15,7 @@ def main() -> int:
     
     err = device.OpenCamera()
     if err != SLError.SL_ERROR_SUCCESS: 
-        logging.error(f"Failed to Open Camera with error: {err}")
+        logging.error("Failed to Open Camera with error: %s", err)
         return -1
     
     logging.info("Successfully opened camera")
@@ -24,7 +24,7 @@ def main() -> int:
     
     err = device.CloseCamera()
     if err != SLError.SL_ERROR_SUCCESS:
-        logging.error(f"Failed to CloseCamera with error: {err}")
+        logging.error("Failed to CloseCamera with error: %s", err)
         return -2
     
     logging.info("Successfully closed camera")
@@ -44,31 +44,31 @@ def SequenceExample(device: SLDevice) -> None:
       # Configure the device
       err = device.SetExposureMode(exposureMode)
       if err != SLError.SL_ERROR_SUCCESS: 
-            logging.error(f"Failed to set exposure mode to {exposureMode} with error: {err}")
+            logging.error("Failed to set exposure mode to %s with error: %s", exposureMode, err)
             return
       
-      logging.info(f"Set exposure mode to {exposureMode}")
+      logging.info("Set exposure mode to %s", exposureMode)
       
       err = device.SetExposureTime(expTime)
       if err != SLError.SL_ERROR_SUCCESS: 
-            logging.error(f"Failed to set exposure time to {expTime} with error: {err}")
+            logging.error("Failed to set exposure time to %s with error: %s", expTime, err)
             return
       
-      logging.info(f"Set exposure time to {expTime}")
+      logging.info("Set exposure time to %s", expTime)
       
       err = device.SetNumberOfFrames(numFrames)
       if err != SLError.SL_ERROR_SUCCESS: 
-            logging.error(f"Failed to set number of frames to {numFrames} with error: {err}")
+            logging.error("Failed to set number of frames to %s with error: %s", numFrames, err)
             return
       
-      logging.info(f"Set number of frames to {numFrames}")
+      logging.info("Set number of frames to %s", numFrames)
       
       err = device.SetDDS(dds)
       if err != SLError.SL_ERROR_SUCCESS: 
-            logging.error(f"Failed to set DDS to {dds} with error: {err}")
+            logging.error("Failed to set DDS to %s with error: %s", dds, err)
             return
       
-      logging.info(f"Set DDS to {dds}")
+      logging.info("Set DDS to %s", dds)
       
       # Build SLImage object to read frames into
       image = SLImage(device.GetImageXDim(), device.GetImageYDim(), numFrames)      
@@ -77,7 +77,7 @@ def SequenceExample(device: SLDevice) -> None:
       # Start Stream
       err = device.StartStream()
       if err != SLError.SL_ERROR_SUCCESS:
-            logging.error(f"Failed to StartStream with error: {err}")
+            logging.error("Failed to StartStream with error: %s", err)
             return
       
       logging.info("Started stream")    
@@ -85,7 +85,7 @@ def SequenceExample(device: SLDevice) -> None:
       # Send a software trigger to start sequence capture
       err = device.SoftwareTrigger()
       if err != SLError.SL_ERROR_SUCCESS:
-            logging.error(f"Failed to send software trigger with error: {err}")
+            logging.error("Failed to send software trigger with error: %s", err)
             return
       
       logging.info("Sent software trigger")
@@ -100,20 +100,20 @@ def SequenceExample(device: SLDevice) -> None:
             
             if bufferInfo.error == SLError.SL_ERROR_SUCCESS:                # Frame acquired successfully
                   receivedFrames += 1
-                  logging.info(f"Received frame #{receivedFrames} ({bufferInfo.frameCount}) with dims: {bufferInfo.width}x{bufferInfo.height}")
+                  logging.info("Received frame #%s (%s) with dims: %sx%s", receivedFrames, bufferInfo.frameCount, bufferInfo.width, bufferInfo.height)
             elif bufferInfo.error == SLError.SL_ERROR_MISSING_PACKETS:      # Frame acquired with missing packets
                   receivedFrames += 1
-                  logging.info(f"Received frame #{receivedFrames} ({bufferInfo.frameCount}) with dims: {bufferInfo.width}x{bufferInfo.height}, missing packets: {bufferInfo.missingPackets}")
+                  logging.info("Received frame #%s (%s) with dims: %sx%s, missing packets: %s", receivedFrames, bufferInfo.frameCount, bufferInfo.width, bufferInfo.height, bufferInfo.missingPackets)
             elif bufferInfo.error == SLError.SL_ERROR_TIMEOUT:
                   logging.warning("Timed out waiting for frame")  
                   timedOut = True
             else:
-                  logging.error(f"Failed to acquire image with error: {bufferInfo.error}")
+                  logging.error("Failed to acquire image with error: %s", bufferInfo.error)
                                    
       # Stop Stream
       err = device.StopStream()
       if err != SLError.SL_ERROR_SUCCESS:
-            logging.error(f"Failed to stop stream with error: {err}")
+            logging.error("Failed to stop stream with error: %s", err)
             return
       
       logging.info("Stopped stream")
@@ -121,7 +121,7 @@ def SequenceExample(device: SLDevice) -> None:
       framesToCrop = numFrames - receivedFrames
       if framesToCrop > 0:
           image.DeleteLastNSlices(framesToCrop) # If all frames were not acquired, trim down the image
-          logging.info(f"Cropped last {framesToCrop}")
+          logging.info("Cropped last %s", framesToCrop)
           
       # Don't bother saving an image if it has no frames
       if image.GetDepth() == 0:
@@ -130,7 +130,7 @@ def SequenceExample(device: SLDevice) -> None:
       # Save the captured images
       filename = f"{imageSaveDirectory}SequenceCapture.tif"
       if image.WriteTiffImage(filename, 16):
-            logging.info(f"Saved image as {filename}")
+            logging.info("Saved image as %s", filename)
       else:
             logging.error("Error saving image.")
 
@@ -15,7 +15,7 @@ def main() -> int:
     
     err = device.OpenCamera()
     if err != SLError.SL_ERROR_SUCCESS: 
-        logging.error(f"Failed to Open Camera with error: {err}")
+        logging.error("Failed to Open Camera with error: %s", err)
         return -1
     
     logging.info("Successfully opened camera")
@@ -24,7 +24,7 @@ def main() -> int:
     
     err = device.CloseCamera()
     if err != SLError.SL_ERROR_SUCCESS:
-        logging.error(f"Failed to CloseCamera with error: {err}")
+        logging.error("Failed to CloseCamera with error: %s", err)
         return -2
     
     logging.info("Successfully closed camera")
@@ -41,17 +41,17 @@ def SoftwareTriggerExample(device: SLDevice) -> None:
     # Configure the device
     err = device.SetExposureMode(exposureMode)
     if err != SLError.SL_ERROR_SUCCESS: 
-        logging.error(f"Failed to set exposure mode to {exposureMode} with error: {err}")
+        logging.error("Failed to set exposure mode to %s with error: %s", exposureMode, err)
         return
     
-    logging.info(f"Set exposure mode to {exposureMode}")
+    logging.info("Set exposure mode to %s", exposureMode)
     
     err = device.SetDDS(dds)
     if err != SLError.SL_ERROR_SUCCESS: 
-        logging.error(f"Failed to set DDS to {dds} with error: {err}")
+        logging.error("Failed to set DDS to %s with error: %s", dds, err)
         return
     
-    logging.info(f"Set DDS to {dds}")
+    logging.info("Set DDS to %s", dds)
 
     # Build SLImage object to read frames into
     image = SLImage(device.GetImageXDim(), device.GetImageYDim())
@@ -60,7 +60,7 @@ def SoftwareTriggerExample(device: SLDevice) -> None:
     # Start Stream
     err = device.StartStream()
     if err != SLError.SL_ERROR_SUCCESS:
-        logging.error(f"Failed to start stream with error: {err}")
+        logging.error("Failed to start stream with error: %s", err)
         return
     
     logging.info("Started stream") 
@@ -78,7 +78,7 @@ def SoftwareTriggerExample(device: SLDevice) -> None:
         
         err = device.SoftwareTrigger()
         if err != SLError.SL_ERROR_SUCCESS:
-            logging.error(f"Failed to send software trigger with error: {err}")
+            logging.error("Failed to send software trigger with error: %s", err)
             break
         
         logging.info("Sent software trigger")
@@ -87,22 +87,22 @@ def SoftwareTriggerExample(device: SLDevice) -> None:
         filename = f"{imageSaveDirectory}SoftwareTriggerCapture{bufferInfo.frameCount}.tif"
         
         if bufferInfo.error == SLError.SL_ERROR_SUCCESS:                # Frame acquired successfully
-            logging.info(f"Read new frame #{bufferInfo.frameCount} with dims: {bufferInfo.width}x{bufferInfo.height}")
+            logging.info("Read new frame #%s with dims: %sx%s", bufferInfo.frameCount, bufferInfo.width, bufferInfo.height)
             if image.WriteTiffImage(filename) is False:
                 logging.error("Failed to save image")
         elif bufferInfo.error == SLError.SL_ERROR_MISSING_PACKETS:      # Frame acquired with missing packets
-            logging.info(f"Read new frame #{bufferInfo.frameCount} with dims: {bufferInfo.width}x{bufferInfo.height}, missing packets: {bufferInfo.missingPackets}")
+            logging.info("Read new frame #%s with dims: %sx%s, missing packets: %s", bufferInfo.frameCount, bufferInfo.width, bufferInfo.height, bufferInfo.missingPackets)
             if image.WriteTiffImage(filename) is False:
                 logging.error("Failed to save image")
         elif bufferInfo.error == SLError.SL_ERROR_TIMEOUT:
             logging.warning("Timed out whilst waiting for frame")
         else:
-            logging.error(f"Failed to acquire image with error: {bufferInfo.error}")
+            logging.error("Failed to acquire image with error: %s", bufferInfo.error)
         
     # Stop Stream
     err = device.StopStream()
     if err != SLError.SL_ERROR_SUCCESS:
-        logging.error(f"Failed to stop stream with error: {err}")
+        logging.error("Failed to stop stream with error: %s", err)
         return
     
     logging.info("Stopped stream")
@@ -17,7 +17,7 @@ def main() -> int:
     
     err = device.OpenCamera()
     if err != SLError.SL_ERROR_SUCCESS: 
-        logging.error(f"Failed to Open Camera with error: {err}")
+        logging.error("Failed to Open Camera with error: %s", err)
         return -1
     
     logging.info("Successfully opened camera")
@@ -26,7 +26,7 @@ def main() -> int:
     
     err = device.CloseCamera()
     if err != SLError.SL_ERROR_SUCCESS:
-        logging.error(f"Failed to CloseCamera with error: {err}")
+        logging.error("Failed to CloseCamera with error: %s", err)
         return -2
     
     logging.info("Successfully closed camera")
@@ -41,16 +41,16 @@ def callback_fn(view: memoryview, bufferInfo: SLBufferInfo, counter: CallbackCou
       filename = f"{imageSaveDirectory}StreamCallbackCapture{bufferInfo.frameCount}.tif"
       if bufferInfo.error == SLError.SL_ERROR_SUCCESS:                  # Frame acquired successfully
             counter.value += 1
-            logging.info(f"Received frame #{counter.value} ({bufferInfo.frameCount}) with dims: {bufferInfo.width}x{bufferInfo.height}")
+            logging.info("Received frame #%s (%s) with dims: %sx%s", counter.value, bufferInfo.frameCount, bufferInfo.width, bufferInfo.height)
             image = SLImage.Array2Frame(np.frombuffer(view, dtype=np.uint16).reshape(bufferInfo.height, bufferInfo.width))
             image.WriteTiffImage(filename)
       elif bufferInfo.error == SLError.SL_ERROR_MISSING_PACKETS:        # Frame acquired with missing packets
             counter.value += 1
-            logging.info(f"Received frame #{counter.value} ({bufferInfo.frameCount}) with dims: {bufferInfo.width}x{bufferInfo.height}, missing packets: {bufferInfo.missingPackets}")
+            logging.info("Received frame #%s (%s) with dims: %sx%s, missing packets: %s", counter.value, bufferInfo.frameCount, bufferInfo.width, bufferInfo.height, bufferInfo.missingPackets)
             image = SLImage.Array2Frame(np.frombuffer(view, dtype=np.uint16).reshape(bufferInfo.height, bufferInfo.width))
             image.WriteTiffImage(filename)
       else:
-            logging.error(f"Received error in callback: {bufferInfo.error}")
+            logging.error("Received error in callback: %s", bufferInfo.error)
 
 def StartStreamWithCallbackExample(device: SLDevice) -> None:
       secondsToStream = 5
@@ -63,31 +63,31 @@ def StartStreamWithCallbackExample(device: SLDevice) -> None:
       # Configure the device            
       err = device.SetExposureMode(exposureMode)
       if err != SLError.SL_ERROR_SUCCESS: 
-            logging.error(f"Failed to set exposure mode to {exposureMode} with error: {err}")
+            logging.error("Failed to set exposure mode to %s with error: %s", exposureMode, err)
             return
       
-      logging.info(f"Set exposure mode to {exposureMode}")
+      logging.info("Set exposure mode to %s", exposureMode)
       
       err = device.SetExposureTime(expTime)
       if err != SLError.SL_ERROR_SUCCESS: 
-            logging.error(f"Failed to set exposure time to {expTime} with error: {err}")
+            logging.error("Failed to set exposure time to %s with error: %s", expTime, err)
             return
       
-      logging.info(f"Set exposure time to {expTime}")
+      logging.info("Set exposure time to %s", expTime)
       
       err = device.SetDDS(dds)
       if err != SLError.SL_ERROR_SUCCESS: 
-            logging.error(f"Failed to set DDS to {dds} with error: {err}")
+            logging.error("Failed to set DDS to %s with error: %s", dds, err)
             return
       
-      logging.info(f"Set DDS to {dds}")
+      logging.info("Set DDS to %s", dds)
 
       counter = CallbackCounter()
 
       # Start Stream
       err = device.StartStream(callback=callback_fn, counter=counter)
       if err != SLError.SL_ERROR_SUCCESS:
-            logging.error(f"Failed to start stream with error: {err}")
+            logging.error("Failed to start stream with error: %s", err)
             return
       
       logging.info("Started stream") 
@@ -103,7 +103,7 @@ def StartStreamWithCallbackExample(device: SLDevice) -> None:
       # Stop Stream
       err = device.StopStream()
       if err != SLError.SL_ERROR_SUCCESS:
-            logging.error(f"Failed to stop stream with error: {err}")
+            logging.error("Failed to stop stream with error: %s", err)
             return
       
       logging.info("Stopped stream")
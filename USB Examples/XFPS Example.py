@@ -16,7 +16,7 @@ def main() -> int:
     
     err = device.OpenCamera()
     if err != SLError.SL_ERROR_SUCCESS: 
-        logging.error(f"Failed to Open Camera with error: {err}")
+        logging.error("Failed to Open Camera with error: %s", err)
         return -1
     
     logging.info("Successfully opened camera")
@@ -25,7 +25,7 @@ def main() -> int:
     
     err = device.CloseCamera()
     if err != SLError.SL_ERROR_SUCCESS:
-        logging.error(f"Failed to CloseCamera with error: {err}")
+        logging.error("Failed to CloseCamera with error: %s", err)
         return -2
     
     logging.info("Successfully closed camera")
@@ -43,24 +43,24 @@ def XFPSExample(device: SLDevice) -> None:
       # Configure the device
       err = device.SetExposureMode(exposureMode)
       if err != SLError.SL_ERROR_SUCCESS: 
-            logging.error(f"Failed to set exposure mode to {exposureMode} with error: {err}")
+            logging.error("Failed to set exposure mode to %s with error: %s", exposureMode, err)
             return
       
-      logging.info(f"Set exposure mode to {exposureMode}")
+      logging.info("Set exposure mode to %s", exposureMode)
       
       err = device.SetExposureTime(expTime)
       if err != SLError.SL_ERROR_SUCCESS: 
-            logging.error(f"Failed to set exposure time to {expTime} with error: {err}")
+            logging.error("Failed to set exposure time to %s with error: %s", expTime, err)
             return
       
-      logging.info(f"Set exposure time to {expTime}")
+      logging.info("Set exposure time to %s", expTime)
     
       err = device.SetDDS(dds)
       if err != SLError.SL_ERROR_SUCCESS: 
-            logging.error(f"Failed to set DDS to {dds} with error: {err}")
+            logging.error("Failed to set DDS to %s with error: %s", dds, err)
             return
       
-      logging.info(f"Set DDS to {dds}")
+      logging.info("Set DDS to %s", dds)
 
       # Build SLImage object to read frames into
       image = SLImage(device.GetImageXDim(), device.GetImageYDim())
@@ -69,7 +69,7 @@ def XFPSExample(device: SLDevice) -> None:
       # Start Stream
       err = device.StartStream()
       if err != SLError.SL_ERROR_SUCCESS:
-            logging.error(f"Failed to StartStream with error: {err}")
+            logging.error("Failed to StartStream with error: %s", err)
             return
       
       logging.info("Started stream") 
@@ -85,22 +85,22 @@ def XFPSExample(device: SLDevice) -> None:
             filename = f"{imageSaveDirectory}XFPSCapture{bufferInfo.frameCount}.tif"
             
             if bufferInfo.error == SLError.SL_ERROR_SUCCESS:                # Frame acquired successfully
-                  logging.info(f"Received frame #{bufferInfo.frameCount} with dims: {bufferInfo.width}x{bufferInfo.height} at {readTime}")
+                  logging.info("Received frame #%s with dims: %sx%s at %s", bufferInfo.frameCount, bufferInfo.width, bufferInfo.height, readTime)
                   if image.WriteTiffImage(filename) is False:
                         logging.error("Failed to save image")
             elif bufferInfo.error == SLError.SL_ERROR_MISSING_PACKETS:      # Frame acquired with missing packets
-                  logging.info(f"Received frame #{bufferInfo.frameCount} with dims: {bufferInfo.width}x{bufferInfo.height} at {readTime}, missing packets: {bufferInfo.missingPackets}")
+                  logging.info("Received frame #%s with dims: %sx%s at %s, missing packets: %s", bufferInfo.frameCount, bufferInfo.width, bufferInfo.height, readTime, bufferInfo.missingPackets)
                   if image.WriteTiffImage(filename) is False:
                         logging.error("Failed to save image")
             elif bufferInfo.error == SLError.SL_ERROR_TIMEOUT:
                   logging.warning("Timed out waiting for frame")
             else:
-                  logging.error(f"Failed to acquire image with error: {bufferInfo.error}")
+                  logging.error("Failed to acquire image with error: %s", bufferInfo.error)
                             
       # Stop Stream
       err = device.StopStream()
       if err != SLError.SL_ERROR_SUCCESS:
-            logging.error(f"Failed to stop stream with error: {err}")
+            logging.error("Failed to stop stream with error: %s", err)
             return
       
       logging.info("Stopped stream")
@@ -0,0 +1,436 @@
+"""
+Scripted acquisitions from the command line.
+
+One entry point for what the USB Examples scripts do, with the settings as
+flags instead of constants in the code:
+
+  seq       one software trigger, --frames frames back to back (seq_mode)
+  xfps      free-running frames for --duration seconds (xfps_mode)
+  trigger   --frames hardware-triggered frames (trig_mode), or software
+            triggered with --software-trigger
+  callback  free-running frames for --duration seconds, delivered by the
+            SDK to a callback instead of being read
+
+Everything goes through AcquisitionEngine. The read loop only reads and
+hands frames on. Corrections (--dark, --gain, --defect), cropping to --roi
+and writing run on a writer thread, so saving doesn't hold up reads. A
+throughput summary is printed at the end.
+
+    python acquire.py seq --exposure 100 --frames 20
+    python acquire.py xfps --exposure 20 --duration 5 --binning 2 --output none
+    python acquire.py trigger --frames 50 --dark auto --defect --output tiff
+"""
+import argparse
+import itertools
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+
+import numpy as np
+
+from SLDevicePythonWrapper import BinningModes, DeviceInterface, ExposureModes, SLDevice, SLError, SLImage
+
+from acquisition import AcquisitionEngine, READ_MARGIN_MS, TRIGGER_TIMEOUT_MS
+from flat_field import DARK_OFFSET
+from log_config import setup_logging
+from naming import timestamp_id, unique_path
+from storage import Storage, DARKS, DEFECTS, RECORDINGS
+
+logger = logging.getLogger('acquire')
+
+EXPOSURE_MODES = {
+    'seq': ExposureModes.seq_mode,
+    'xfps': ExposureModes.xfps_mode,
+    'trigger': ExposureModes.trig_mode,
+    'callback': ExposureModes.xfps_mode,
+}
+BINNING = {1: BinningModes.x11, 2: BinningModes.x22, 4: BinningModes.x44}
+# stack: one multi-page TIFF, tiff: a folder of single-frame TIFFs, none: throughput only
+OUTPUTS = ('stack', 'tiff', 'none')
+# Frames waiting for the writer before reads wait for it (callbacks drop instead)
+QUEUE_FRAMES = 64
+
+
+class Summary:
+    def __init__(self):
+        self.received = 0
+        self.missing_packets = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.dropped = 0
+        self.written = 0
+        self.start = None
+        self.end = None
+
+
+class Corrections:
+    """Per-frame corrections and crop, applied on the writer thread"""
+
+    def __init__(self, dark=None, gain=None, defect=None, roi=None):
+        self.dark = dark        # SLImage
+        self.gain = gain        # SLImage set as the gain map
+        self.defect = defect    # CompiledDefectMap
+        self.roi = roi          # (x, y, width, height)
+
+    def apply(self, array):
+        if self.dark is not None:
+            image = SLImage.Array2Frame(array)
+            err = SLImage.OffsetCorrection(image, self.dark, darkOffset=DARK_OFFSET)
+            if err != SLError.SL_ERROR_SUCCESS:
+                logger.error('Failed to apply dark correction with error: %s', err)
+                return None
+            if self.gain is not None:
+                err = image.GainCorrection(self.gain, DARK_OFFSET)
+                if err != SLError.SL_ERROR_SUCCESS:
+                    logger.error('Failed to apply gain correction with error: %s', err)
+                    return None
+            array = image.Frame2Array(0)
+        if self.defect is not None:
+            if not array.flags.writeable:
+                array = array.copy()
+            self.defect.correct(array)
+        if self.roi is not None:
+            x, y, width, height = self.roi
+            array = array[y:y + height, x:x + width]
+        return array
+
+
+class FrameWriter(threading.Thread):
+    """Corrects and writes frames handed over by the read loop"""
+
+    def __init__(self, output, folder, stem, corrections, summary):
+        super().__init__(name='writer', daemon=True)
+        self.output = output
+        self.corrections = corrections
+        self.summary = summary
+        self.queue = queue.Queue(QUEUE_FRAMES)
+        self.path = None
+        self._writer = None
+        if output == 'stack':
+            import imageio.v2 as imageio
+            self.path = unique_path(folder, stem, '.tif')
+            self._writer = imageio.get_writer(self.path, format='TIFF')
+        elif output == 'tiff':
+            self.path = os.path.join(folder, f'{stem}_{timestamp_id()}')
+            os.makedirs(self.path)
+
+    def put(self, array, index, block=True):
+        """Queue a frame the caller no longer touches. False if full and not blocking"""
+        try:
+            self.queue.put((array, index), block=block)
+        except queue.Full:
+            return False
+        return True
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            array, index = item
+            try:
+                array = self.corrections.apply(array)
+                if array is None:
+                    continue
+                if self.output == 'stack':
+                    self._writer.append_data(array)
+                elif self.output == 'tiff':
+                    import imageio.v2 as imageio
+                    imageio.imwrite(os.path.join(self.path, f'frame_{index:05d}.tif'), array)
+                self.summary.written += 1
+            except Exception:
+                logger.exception('Failed to write frame %d', index)
+
+    def finish(self):
+        self.queue.put(None)
+        self.join()
+        if self._writer is not None:
+            self._writer.close()
+        if self.path is not None and not self.summary.written:
+            # Don't leave an empty file or folder behind for a run that wrote nothing
+            try:
+                if os.path.isdir(self.path):
+                    os.rmdir(self.path)
+                else:
+                    os.remove(self.path)
+            except OSError as e:
+                logger.warning('Could not remove %s: %s', self.path, e)
+            self.path = None
+
+
+def owned(image, i=0):
+    """Frame i of image as an array that the next read into image won't change"""
+    array = image.Frame2Array(i)
+    return array if array.flags.owndata else array.copy()
+
+
+def count(summary, bufferInfo, index):
+    """Tally a read. True if it produced a frame"""
+    if bufferInfo is None:
+        summary.errors += 1
+        return False
+    if bufferInfo.error == SLError.SL_ERROR_SUCCESS:
+        summary.received += 1
+        return True
+    if bufferInfo.error == SLError.SL_ERROR_MISSING_PACKETS:
+        logger.warning('Frame %d missing %d packets', index, bufferInfo.missingPackets)
+        summary.received += 1
+        summary.missing_packets += 1
+        return True
+    if bufferInfo.error == SLError.SL_ERROR_TIMEOUT:
+        summary.timeouts += 1
+    else:
+        logger.error('Failed to acquire frame %d with error: %s', index, bufferInfo.error)
+        summary.errors += 1
+    return False
+
+
+# ------------------- Modes -----------------
+
+def run_seq(engine, args, dims, writer, summary):
+    xdim, ydim = dims
+    stack = SLImage(xdim, ydim, args.frames)
+    summary.start = time.perf_counter()
+    received = engine.capture_sequence(stack, args.exposure, args.frames)
+    summary.end = time.perf_counter()
+    summary.received = received or 0
+    if received is None:
+        summary.errors += 1
+    for i in range(summary.received):
+        writer.put(owned(stack, i), i)
+
+
+def run_xfps(engine, args, dims, writer, summary):
+    image = SLImage(*dims)
+    if not engine.start_stream():
+        return
+    try:
+        summary.start = time.perf_counter()
+        deadline = summary.start + args.duration
+        index = 0
+        while time.perf_counter() < deadline:
+            bufferInfo = engine.acquire(image, timeout=args.exposure + READ_MARGIN_MS, frame=index)
+            if count(summary, bufferInfo, index):
+                writer.put(owned(image), index)
+                index += 1
+        summary.end = time.perf_counter()
+    finally:
+        engine.stop_stream()
+
+
+def run_trigger(engine, args, dims, writer, summary):
+    image = SLImage(*dims)
+    if not engine.start_stream():
+        return
+    try:
+        if not args.software_trigger:
+            logger.info('Awaiting %d hardware triggers', args.frames)
+        summary.start = time.perf_counter()
+        index = 0
+        while summary.received < args.frames:
+            if args.software_trigger:
+                bufferInfo = engine.capture(image, args.exposure, frame=index)
+            else:
+                bufferInfo = engine.acquire(image, timeout=args.timeout, frame=index)
+            if not count(summary, bufferInfo, index):
+                if bufferInfo is not None and bufferInfo.error == SLError.SL_ERROR_TIMEOUT:
+                    logger.warning('Timed out waiting for trigger %d', index + 1)
+                break
+            writer.put(owned(image), index)
+            index += 1
+        summary.end = time.perf_counter()
+    finally:
+        engine.stop_stream()
+
+
+def run_callback(engine, args, dims, writer, summary):
+    frames = itertools.count()
+
+    def on_frame(view, bufferInfo):
+        # On the SDK's thread: copy out and hand on, never block
+        index = next(frames)
+        if not count(summary, bufferInfo, index):
+            return
+        array = np.frombuffer(view, dtype=np.uint16).reshape(bufferInfo.height, bufferInfo.width).copy()
+        if not writer.put(array, index, block=False):
+            summary.dropped += 1
+
+    summary.start = time.perf_counter()
+    if not engine.start_stream(callback=on_frame):
+        return
+    try:
+        time.sleep(args.duration)
+    finally:
+        engine.stop_stream()
+        summary.end = time.perf_counter()
+
+
+RUNNERS = {'seq': run_seq, 'xfps': run_xfps, 'trigger': run_trigger, 'callback': run_callback}
+
+
+# ------------------- Setup -----------------
+
+def parse_roi(text):
+    try:
+        roi = tuple(int(v) for v in text.split(','))
+    except ValueError:
+        roi = ()
+    if len(roi) != 4 or min(roi) < 0 or roi[2] == 0 or roi[3] == 0:
+        raise argparse.ArgumentTypeError('ROI is x,y,width,height')
+    return roi
+
+
+def read_image(path, dims, what):
+    image = SLImage(*dims)
+    if not SLImage.ReadTiffImage(path, image):
+        logger.error('Failed to read %s %s', what, path)
+        return None
+    return image
+
+
+def load_corrections(engine, device_lock, args, dims, storage):
+    """Corrections for args, or None if one that was asked for can't be loaded"""
+    dark = gain = defect = None
+    dark_dir, defect_dir = storage.root(DARKS), storage.root(DEFECTS)
+    if args.dark:
+        path = args.dark
+        if path == 'auto':
+            from catalogue import Catalogue
+            from dark_library import DarkLibrary
+            from telemetry import TelemetrySampler
+            telemetry = TelemetrySampler(engine.device, device_lock)
+            telemetry.sample()
+            # The GUI's catalogue, so both share one dark library index
+            library = DarkLibrary(dark_dir, Catalogue(storage.base))
+            path = library.find(args.exposure, telemetry.temperature)
+            if path is None:
+                logger.error('No %dms dark in %s, capture one first', args.exposure, dark_dir)
+                return None
+        dark = read_image(path, dims, 'dark')
+        if dark is None:
+            return None
+        logger.info('Using dark %s', path)
+    if args.gain:
+        if dark is None:
+            logger.error('Gain correction works on dark-corrected frames, give --dark too')
+            return None
+        gain = read_image(args.gain, dims, 'gain map')
+        if gain is None or gain.SetAsGainMap() != SLError.SL_ERROR_SUCCESS:
+            logger.error('Failed to load gain map %s', args.gain)
+            return None
+    if args.defect:
+        import defect_map
+        defect = defect_map.load_defect_map(defect_dir)
+        if defect is None:
+            logger.error('No defect map in %s', defect_dir)
+            return None
+        if defect.shape != (dims[1], dims[0]):
+            logger.error('Defect map is %s but frames are %dx%d; it needs unbinned frames', defect.shape, *dims)
+            return None
+    if args.roi is not None:
+        x, y, width, height = args.roi
+        if x + width > dims[0] or y + height > dims[1]:
+            logger.error('ROI %s is outside the %dx%d frame', args.roi, *dims)
+            return None
+    return Corrections(dark, gain, defect, args.roi)
+
+
+def report(args, dims, summary, writer):
+    elapsed = (summary.end or time.perf_counter()) - (summary.start or time.perf_counter())
+    frame_mb = dims[0] * dims[1] * 2 / 1e6
+    print(f'{args.mode}: {summary.received} frames of {dims[0]}x{dims[1]} at {args.exposure} ms in {elapsed:.2f} s')
+    if elapsed > 0 and summary.received:
+        fps = summary.received / elapsed
+        print(f'  {fps:.1f} fps, {fps * frame_mb:.1f} MB/s read')
+    print(
+        f'  missing packets {summary.missing_packets}, timeouts {summary.timeouts}, '
+        f'errors {summary.errors}, dropped {summary.dropped}'
+    )
+    if writer.path is not None:
+        print(f'  wrote {summary.written} frames to {writer.path}')
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('mode', choices=tuple(RUNNERS))
+    parser.add_argument('--exposure', type=int, default=100, help='ms')
+    parser.add_argument('--frames', type=int, default=20, help='seq and trigger')
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds, xfps and callback')
+    parser.add_argument('--timeout', type=int, default=TRIGGER_TIMEOUT_MS, help='ms to wait for each hardware trigger')
+    parser.add_argument('--software-trigger', action='store_true', help='trigger mode: send the triggers from here')
+    parser.add_argument('--dds', action='store_true')
+    parser.add_argument('--binning', type=int, choices=tuple(BINNING), default=1)
+    parser.add_argument('--roi', type=parse_roi, help='x,y,width,height to keep, in read-out pixels')
+    parser.add_argument('--output', choices=OUTPUTS, default='stack')
+    parser.add_argument('--output-dir', help='recordings root, Images/recordings by default (see storage)')
+    parser.add_argument('--name', help='file name stem, the mode by default')
+    parser.add_argument('--dark', help="dark TIFF for offset correction, or 'auto' to pick one from the dark library")
+    parser.add_argument('--gain', help='gain map TIFF, needs --dark')
+    parser.add_argument('--defect', action='store_true', help='correct defects with the cached defect map')
+    parser.add_argument('--correction-dir', help='darks, Images/correction_images by default')
+    parser.add_argument('--defect-dir', help='defect map, Images/defect_maps by default')
+    parser.add_argument('--log-level', default='INFO')
+    args = parser.parse_args()
+    setup_logging(args.log_level.upper())
+
+    device_lock = threading.Lock()
+    engine = AcquisitionEngine(SLDevice(DeviceInterface.USB), device_lock)
+    if not engine.open():
+        return 1
+    try:
+        if not engine.set_binning(BINNING[args.binning]):
+            return 1
+        if not engine.configure(EXPOSURE_MODES[args.mode], args.exposure, args.dds):
+            return 1
+        dims = engine.image_dims()
+
+        roots = {}
+        if args.output_dir:
+            roots[RECORDINGS] = args.output_dir
+        if args.correction_dir:
+            roots[DARKS] = args.correction_dir
+        if args.defect_dir:
+            roots[DEFECTS] = args.defect_dir
+        # Moves finish on the mover thread; they are reported from here once it has stopped
+        moved = []
+        try:
+            storage = Storage(roots=roots, on_moved=lambda old, new: moved.append(new))
+        except ValueError as e:
+            logger.error('%s', e)
+            return 1
+        corrections = load_corrections(engine, device_lock, args, dims, storage)
+        if corrections is None:
+            return 1
+        if args.output != 'none':
+            # Free-running modes have no frame count up front, so only the margin is checked
+            expected = args.frames * dims[0] * dims[1] * 2 if args.mode in ('seq', 'trigger') else 0
+            if not storage.has_space(RECORDINGS, expected):
+                return 1
+        summary = Summary()
+        stem = args.name or f'{args.mode}_{args.exposure}ms'
+        writer = FrameWriter(args.output, storage.folder(RECORDINGS), stem, corrections, summary)
+        writer.start()
+        try:
+            RUNNERS[args.mode](engine, args, dims, writer, summary)
+        except KeyboardInterrupt:
+            logger.info('Interrupted, writing the frames read so far')
+            summary.end = summary.end or time.perf_counter()
+        finally:
+            writer.finish()
+        report(args, dims, summary, writer)
+        if writer.path is not None:
+            # From scratch to the recordings root, if written to scratch
+            storage.done(writer.path)
+            storage.close(wait=True)
+            for path in moved:
+                print(f'  moved to {path}')
+    finally:
+        engine.close()
+    return 0 if summary.received else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,383 @@
+"""
+Acquisition engine wrapping SLDevice.
+
+Every device call goes through device_lock so background users of the device
+(telemetry) never interleave with a trigger or readout. Methods log SDK errors
+and return True/False, or the SLBufferInfo for reads, leaving UI state to the
+caller.
+"""
+import logging
+import time
+
+import numpy as np
+
+from SLDevicePythonWrapper import (
+    SLError,
+    SLImage,
+    ExposureModes,
+)
+
+from instrumentation import metrics
+from log_config import RateLimitedLogger
+
+logger = logging.getLogger(__name__)
+frame_log = RateLimitedLogger(logger)
+
+# Acquisition modes offered by the GUI
+SOFTWARE_TRIGGER = 'software_trigger'
+# Software triggers, each sent as soon as the previous frame is read, see pipeline.py
+SOFTWARE_SERIES = 'software_series'
+FIRMWARE_AVERAGE = 'firmware_average'
+HOT_SEQUENCE = 'hot_sequence'
+EXTERNAL_TRIGGER = 'external_trigger'
+HOT_EDGE_TRIGGER = 'hot_edge_trigger'
+HOT_DURATION_TRIGGER = 'hot_duration_trigger'
+ACQUISITION_MODES = (
+    SOFTWARE_TRIGGER,
+    SOFTWARE_SERIES,
+    FIRMWARE_AVERAGE,
+    HOT_SEQUENCE,
+    EXTERNAL_TRIGGER,
+    HOT_EDGE_TRIGGER,
+    HOT_DURATION_TRIGGER,
+)
+# Catalogue mode of frames read n at a time with capture_sequence in seq_mode, not offered in the GUI
+SEQUENCE = 'sequence'
+
+# Detector exposure mode behind each acquisition mode
+EXPOSURE_MODES = {
+    SOFTWARE_TRIGGER: ExposureModes.seq_mode,
+    SOFTWARE_SERIES: ExposureModes.seq_mode,
+    FIRMWARE_AVERAGE: ExposureModes.seq_mode,
+    HOT_SEQUENCE: ExposureModes.hot_sequence_mode,
+    EXTERNAL_TRIGGER: ExposureModes.trig_mode,
+    HOT_EDGE_TRIGGER: ExposureModes.hot_edge_trig_mode,
+    HOT_DURATION_TRIGGER: ExposureModes.hot_duration_trig_mode,
+}
+
+# Burst modes fill frame-grabber memory at hardware speed and are drained afterwards
+BURST_MODES = (HOT_SEQUENCE, EXTERNAL_TRIGGER, HOT_EDGE_TRIGGER, HOT_DURATION_TRIGGER)
+# Burst modes started by the sync input rather than a software trigger
+HARDWARE_TRIGGERED = (EXTERNAL_TRIGGER, HOT_EDGE_TRIGGER, HOT_DURATION_TRIGGER)
+
+# 14-bit sensor; pixels within 51 ADU of full scale are treated as saturated
+BIT_DEPTH = 14
+SATURATION_LEVEL = 2**BIT_DEPTH - 51
+
+# Exposure limits accepted by the GUI (ms)
+MIN_EXPOSURE = 10
+MAX_EXPOSURE = 30000
+
+# Extra time allowed on top of the exposure before a read is considered lost
+READ_MARGIN_MS = 1000
+# How long a hardware-triggered burst waits for its triggers to arrive
+TRIGGER_TIMEOUT_MS = 10 * 1000
+
+
+class AcquisitionEngine:
+    def __init__(self, device, device_lock):
+        self.device = device
+        self.lock = device_lock
+        self.live = False
+        self.buffer_depth = None
+
+    def _ok(self, err, action):
+        if err != SLError.SL_ERROR_SUCCESS:
+            logger.error('Failed to %s with error: %s', action, err)
+            return False
+        return True
+
+    # ------------------- Device setup -----------------
+
+    def open(self, buffer_depth=None):
+        """Open the camera, optionally with room for buffer_depth frames in frame-grabber memory"""
+        with self.lock:
+            if buffer_depth is None:
+                err = self.device.OpenCamera()
+            else:
+                err = self.device.OpenCamera(bufferDepth=buffer_depth)
+        if not self._ok(err, 'open camera'):
+            return False
+        self.buffer_depth = buffer_depth
+        return True
+
+    def close(self):
+        with self.lock:
+            err = self.device.CloseCamera()
+        return self._ok(err, 'close camera')
+
+    def configure(self, exposure_mode, exposure, dds=False):
+        with self.lock:
+            if not self._ok(self.device.SetExposureMode(exposure_mode), f'set exposure mode to {exposure_mode}'):
+                return False
+            if not self._ok(self.device.SetExposureTime(exposure), f'set exposure time to {exposure}'):
+                return False
+            if not self._ok(self.device.SetDDS(dds), f'set DDS to {dds}'):
+                return False
+        logger.info('Configured %s, %dms, DDS %s', exposure_mode, exposure, dds)
+        return True
+
+    def set_exposure(self, exposure):
+        with self.lock:
+            err = self.device.SetExposureTime(exposure)
+        return self._ok(err, f'set exposure time to {exposure}')
+
+    def set_binning(self, binning):
+        with self.lock:
+            err = self.device.SetBinningMode(binning)
+        return self._ok(err, f'set binning mode to {binning}')
+
+    def image_dims(self):
+        """Current readout size (xdim, ydim), which shrinks with binning"""
+        with self.lock:
+            return self.device.GetImageXDim(), self.device.GetImageYDim()
+
+    def start_stream(self, callback=None, **kwargs):
+        """
+        Start streaming. With a callback, the SDK calls
+        callback(view, bufferInfo, **kwargs) on its own thread for every frame
+        instead of frames being read with acquire().
+        """
+        with self.lock:
+            if callback is None:
+                err = self.device.StartStream()
+            else:
+                err = self.device.StartStream(callback=callback, **kwargs)
+        return self._ok(err, 'start stream')
+
+    def stop_stream(self):
+        with self.lock:
+            err = self.device.StopStream()
+        return self._ok(err, 'stop stream')
+
+    # ------------------- Software trigger -----------------
+
+    def capture(self, image, exposure, frame=-1):
+        """Software trigger one exposure and read it into image. Returns the SLBufferInfo or None."""
+        with self.lock:
+            with metrics.span('trigger', frame):
+                err = self.device.SoftwareTrigger()
+            if not self._ok(err, 'send software trigger'):
+                return None
+            frame_log.debug('Sent software trigger')
+
+            with metrics.span('exposure_wait', frame):
+                time.sleep(exposure / 1000)
+            with metrics.span('acquire', frame):
+                return self.device.AcquireImage(image)
+
+    def acquire(self, image, timeout, frame=-1):
+        """
+        Read the next frame of a running stream into image without triggering,
+        for free-running (xfps) and hardware-triggered modes. Returns the
+        SLBufferInfo, whose error is SL_ERROR_TIMEOUT if nothing arrived.
+        """
+        with self.lock:
+            with metrics.span('acquire', frame):
+                return self.device.AcquireImage(image, timeout=timeout)
+
+    # ------------------- Buffered bursts -----------------
+
+    def arm_burst(self, num_frames):
+        """Set the burst length. Call before start_stream in a burst mode."""
+        if self.buffer_depth is not None and num_frames > self.buffer_depth:
+            logger.error('Burst of %d frames exceeds buffer depth %d', num_frames, self.buffer_depth)
+            return False
+        with self.lock:
+            err = self.device.SetNumberOfFrames(num_frames)
+        return self._ok(err, f'set number of frames to {num_frames}')
+
+    def capture_burst(self, mode, exposure, num_frames, xdim, ydim, timeout=None):
+        """
+        Capture a burst into frame-grabber memory and drain it. The stream must
+        already be running in a burst mode. No frame is read until the whole
+        burst has landed, so the detector runs at hardware speed. Returns a
+        (frames, ydim, xdim) uint16 stack, which may be short if triggers were
+        missed, or None on error.
+        """
+        if timeout is None:
+            timeout = num_frames * exposure + READ_MARGIN_MS
+            if mode in HARDWARE_TRIGGERED:
+                timeout += TRIGGER_TIMEOUT_MS
+
+        with self.lock:
+            # Start from empty buffers so the drain only sees this burst
+            depth = self.buffer_depth if self.buffer_depth is not None else num_frames
+            if not self._ok(self.device.ClearFrameGrabberMemory(depth), 'clear frame grabber memory'):
+                return None
+            start_count = self._frame_count()
+
+            if mode in HARDWARE_TRIGGERED:
+                logger.info('Awaiting %d hardware triggers', num_frames)
+            else:
+                with metrics.span('trigger'):
+                    err = self.device.SoftwareTrigger()
+                if not self._ok(err, 'send software trigger'):
+                    return None
+
+            with metrics.span('exposure_wait'):
+                captured = self._wait_for_frames(start_count, num_frames, timeout)
+            if captured < num_frames:
+                logger.warning('Burst timed out with %d of %d frames captured', captured, num_frames)
+
+            with metrics.span('drain'):
+                stack = self._drain(captured, xdim, ydim)
+
+        logger.info('Captured burst of %d frames', len(stack))
+        return stack
+
+    def _wait_for_frames(self, start_count, num_frames, timeout):
+        deadline = time.monotonic() + timeout / 1000
+        captured = 0
+        while captured < num_frames and time.monotonic() < deadline:
+            time.sleep(0.005)
+            captured = self._frame_count() - start_count
+        return min(captured, num_frames)
+
+    def _frame_count(self):
+        err, count = self.device.GetFrameCount()
+        if err != SLError.SL_ERROR_SUCCESS:
+            return 0
+        return count
+
+    def _drain(self, num_frames, xdim, ydim):
+        # One reusable SLImage for the readback, copied into a preallocated stack
+        frame = SLImage(xdim, ydim)
+        stack = np.empty((num_frames, ydim, xdim), dtype=np.uint16)
+        read = 0
+        for i in range(num_frames):
+            err = self.device.ReadBuffer(frame, i, timeout=READ_MARGIN_MS)
+            if err != SLError.SL_ERROR_SUCCESS:
+                logger.error('Failed to read buffer %d with error: %s', i, err)
+                break
+            stack[read] = frame.Frame2Array(0)
+            read += 1
+        return stack[:read]
+
+    # ------------------- Firmware averaging / auto-trigger -----------------
+
+    def go_live_auto_trigger(self, exposure, num_frames, threshold_adu, firmware_averaging=True):
+        """
+        Put the detector live, waiting for signal above threshold_adu. Once
+        triggered it exposes num_frames frames and, with firmware averaging on,
+        sends back their average as a single frame, so an N-frame average costs
+        one USB transfer. Used in place of StartStream.
+        """
+        with self.lock:
+            self.device.EnableFirmwareAveraging(firmware_averaging)
+            err = self.device.GoLiveWithAutoTrigger(exposure, num_frames, threshold_adu, firmware_averaging)
+        if not self._ok(err, 'go live with auto trigger'):
+            return False
+        self.live = True
+        logger.info(
+            'Live with auto trigger: %d x %dms, threshold %d ADU, firmware averaging %s',
+            num_frames, exposure, threshold_adu, firmware_averaging
+        )
+        return True
+
+    def go_unlive(self):
+        with self.lock:
+            err = self.device.GoUnLive()
+            self.device.EnableFirmwareAveraging(False)
+        self.live = False
+        return self._ok(err, 'go unlive')
+
+    def force_trigger(self):
+        with self.lock:
+            err = self.device.ForceAutoTrigger()
+        return self._ok(err, 'force auto trigger')
+
+    def acquire_auto_triggered(self, image, timeout, force_on_timeout=True, frame=-1):
+        """
+        Wait up to timeout (ms) for the detector to auto-trigger and read the
+        result. If nothing triggers, optionally force a trigger and read again.
+        """
+        with self.lock:
+            with metrics.span('acquire', frame):
+                bufferInfo = self.device.AcquireImage(image, timeout=timeout)
+            if bufferInfo.error == SLError.SL_ERROR_TIMEOUT and force_on_timeout:
+                logger.info('No auto trigger within %dms, forcing trigger', timeout)
+                if self._ok(self.device.ForceAutoTrigger(), 'force auto trigger'):
+                    with metrics.span('acquire', frame):
+                        bufferInfo = self.device.AcquireImage(image, timeout=timeout)
+        return bufferInfo
+
+    # ------------------- Sequences -----------------
+
+    def capture_sequence(self, stack, exposure, num_frames):
+        """
+        Expose num_frames back to back from a single software trigger
+        (seq_mode), reading frame i into slice i of stack. Expects the camera
+        configured for seq_mode and not streaming. Returns the number of frames
+        received, or None on error.
+        """
+        with self.lock:
+            if not self._ok(self.device.SetNumberOfFrames(num_frames), f'set number of frames to {num_frames}'):
+                return None
+            if not self._ok(self.device.StartStream(), 'start stream'):
+                return None
+            received = 0
+            try:
+                with metrics.span('trigger'):
+                    err = self.device.SoftwareTrigger()
+                if not self._ok(err, 'send software trigger'):
+                    return None
+                for i in range(num_frames):
+                    with metrics.span('acquire', i):
+                        bufferInfo = self.device.AcquireImage(stack, frame=i, timeout=exposure + READ_MARGIN_MS)
+                    if bufferInfo.error == SLError.SL_ERROR_MISSING_PACKETS:
+                        frame_log.warning('Frame %d of %d missing %d packets', i, num_frames, bufferInfo.missingPackets)
+                    elif bufferInfo.error != SLError.SL_ERROR_SUCCESS:
+                        logger.error('Failed to acquire frame %d of %d with error: %s', i, num_frames, bufferInfo.error)
+                        break
+                    received += 1
+            finally:
+                self.device.StopStream()
+        return received
+
+    def capture_preview(self, exposure):
+        """
+        Single seq_mode frame at the current binning, returned as an array.
+        Expects the camera configured for seq_mode and not streaming.
+        """
+        if not self.set_exposure(exposure):
+            return None
+        xdim, ydim = self.image_dims()
+        image = SLImage(xdim, ydim)
+        if self.capture_sequence(image, exposure, 1) != 1:
+            return None
+        return image.Frame2Array(0)
+
+    # ------------------- Averaging -----------------
+
+    def capture_host_average(self, xdim, ydim, exposure, num_frames):
+        """
+        Average num_frames on the host: a seq_mode sequence of num_frames
+        transfers, averaged in float32. Expects the camera configured for
+        seq_mode and not streaming. Returns the average or None.
+        """
+        stack = SLImage(xdim, ydim, num_frames)
+        if self.capture_sequence(stack, exposure, num_frames) != num_frames:
+            return None
+
+        total = np.zeros((ydim, xdim), dtype=np.float32)
+        for i in range(num_frames):
+            total += stack.Frame2Array(i)
+        return total / num_frames
+
+    def capture_firmware_average(self, xdim, ydim, exposure, num_frames, threshold_adu=0):
+        """
+        Average num_frames on the detector and read back one frame. A threshold
+        of 0 triggers straight away. Returns the average or None.
+        """
+        image = SLImage(xdim, ydim)
+        if not self.go_live_auto_trigger(exposure, num_frames, threshold_adu, firmware_averaging=True):
+            return None
+        try:
+            bufferInfo = self.acquire_auto_triggered(image, timeout=exposure * num_frames + READ_MARGIN_MS)
+        finally:
+            self.go_unlive()
+        if bufferInfo.error not in (SLError.SL_ERROR_SUCCESS, SLError.SL_ERROR_MISSING_PACKETS):
+            logger.error('Failed to acquire firmware average with error: %s', bufferInfo.error)
+            return None
+        return image.Frame2Array(0).astype(np.float32)
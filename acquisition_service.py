@@ -0,0 +1,279 @@
+"""
+Headless acquisition service.
+
+One process owns the SLDevice through an AcquisitionEngine and takes
+requests from local clients, so acquisitions can be scripted from lab
+automation without the GUI. Requests and replies are small dicts sent over
+multiprocessing.connection, on a Unix socket where there is one and on
+localhost otherwise. Clients must know AUTHKEY.
+
+Frames never go through the socket. The service keeps a ring of frame slots
+in shared memory (shared_frames.FrameSlots). A capture reads into an
+SLImage, copies the frame into the next slot and replies with the slot and
+its sequence number. Clients attach to the ring once and read frames
+straight out of it.
+
+Commands:
+  set_exposure  exposure (ms)
+  capture       one software-triggered frame
+  sequence      frames, back to back in seq_mode; at most one ring's worth
+  get_frame     metadata of the latest frame, or of a given sequence number
+  status        exposure, frames captured, streaming
+
+    python acquisition_service.py --exposure 100
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+from SLDevicePythonWrapper import DeviceInterface, ExposureModes, SLDevice, SLError, SLImage
+
+from acquisition import AcquisitionEngine, MIN_EXPOSURE, MAX_EXPOSURE
+from log_config import setup_logging
+from shared_frames import FrameSlots
+
+logger = logging.getLogger(__name__)
+
+AUTHKEY = b'xview-acquisition'
+if sys.platform == 'win32':
+    DEFAULT_ADDRESS = ('127.0.0.1', 6007)
+else:
+    DEFAULT_ADDRESS = os.path.join(tempfile.gettempdir(), 'xview-acquisition.sock')
+# Frames kept in shared memory; a client must read a frame before this many more are captured
+SLOTS = 8
+
+
+class AcquisitionService:
+    def __init__(self, engine, xdim, ydim, exposure=MIN_EXPOSURE, address=DEFAULT_ADDRESS, slots=SLOTS, authkey=AUTHKEY):
+        self.engine = engine
+        self.xdim, self.ydim = xdim, ydim
+        self.exposure = exposure
+        self.address = address
+        self.authkey = authkey
+        self.slots = FrameSlots(slots, (ydim, xdim))
+        self.image = SLImage(xdim, ydim)
+        self.streaming = False
+        # Sequence number of the next frame, and (slot, metadata) of recent ones
+        self.count = 0
+        self.recent = {}
+        # One request at a time reaches the device
+        self.lock = threading.Lock()
+        self.listener = None
+        self._stop = False
+
+    # ------------------- Commands -----------------
+
+    def set_exposure(self, exposure):
+        exposure = int(exposure)
+        if not MIN_EXPOSURE <= exposure <= MAX_EXPOSURE:
+            raise ValueError(f'Exposure must be {MIN_EXPOSURE}-{MAX_EXPOSURE} ms')
+        if not self.engine.set_exposure(exposure):
+            raise RuntimeError(f'Failed to set exposure to {exposure} ms')
+        self.exposure = exposure
+        return {'exposure': exposure}
+
+    def _store(self, array, missing_packets=0):
+        sequence = self.count
+        slot = sequence % self.slots.slots
+        self.slots.write(slot, array, sequence)
+        self.recent.pop(sequence - self.slots.slots, None)
+        meta = {
+            'slot': slot,
+            'sequence': sequence,
+            'exposure': self.exposure,
+            'timestamp': time.time(),
+            'missing_packets': missing_packets,
+        }
+        self.recent[sequence] = meta
+        self.count += 1
+        return meta
+
+    def capture(self):
+        if not self.streaming:
+            if not self.engine.start_stream():
+                raise RuntimeError('Failed to start stream')
+            self.streaming = True
+        bufferInfo = self.engine.capture(self.image, self.exposure, frame=self.count)
+        if bufferInfo is None or bufferInfo.error not in (SLError.SL_ERROR_SUCCESS, SLError.SL_ERROR_MISSING_PACKETS):
+            raise RuntimeError(f'Failed to read frame: {getattr(bufferInfo, "error", None)}')
+        missing = bufferInfo.missingPackets if bufferInfo.error == SLError.SL_ERROR_MISSING_PACKETS else 0
+        return self._store(self.image.Frame2Array(0), missing)
+
+    def sequence(self, frames):
+        frames = int(frames)
+        if not 1 <= frames <= self.slots.slots:
+            raise ValueError(f'Sequence must be 1-{self.slots.slots} frames, the size of the ring')
+        # capture_sequence runs its own stream
+        if self.streaming:
+            self.engine.stop_stream()
+            self.streaming = False
+        stack = SLImage(self.xdim, self.ydim, frames)
+        received = self.engine.capture_sequence(stack, self.exposure, frames)
+        if not received:
+            raise RuntimeError('Sequence captured no frames')
+        return {'frames': [self._store(stack.Frame2Array(i)) for i in range(received)]}
+
+    def get_frame(self, sequence=None):
+        if not self.recent:
+            raise LookupError('No frame captured yet')
+        sequence = self.count - 1 if sequence is None else sequence
+        if sequence not in self.recent:
+            raise LookupError(f'Frame {sequence} is no longer in the ring')
+        return self.recent[sequence]
+
+    def status(self):
+        return {'exposure': self.exposure, 'frames': self.count, 'streaming': self.streaming}
+
+    COMMANDS = ('set_exposure', 'capture', 'sequence', 'get_frame', 'status')
+
+    # ------------------- Serving -----------------
+
+    def handle(self, request):
+        command = request.pop('command', None)
+        if command == 'hello':
+            return {'ok': True, 'slots': self.slots.describe()}
+        if command not in self.COMMANDS:
+            return {'ok': False, 'error': f'Unknown command {command!r}'}
+        try:
+            with self.lock:
+                reply = getattr(self, command)(**request)
+        except (ValueError, LookupError, RuntimeError, TypeError) as e:
+            return {'ok': False, 'error': str(e)}
+        except Exception as e:
+            logger.exception('%s failed', command)
+            return {'ok': False, 'error': str(e)}
+        return {'ok': True, **reply}
+
+    def _serve_client(self, conn):
+        with conn:
+            while not self._stop:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    break
+                conn.send(self.handle(request))
+        logger.info('Client disconnected')
+
+    def serve_forever(self):
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            # Left behind by a service that didn't shut down cleanly
+            os.unlink(self.address)
+        self.listener = Listener(self.address, authkey=self.authkey)
+        logger.info('Acquisition service listening on %s', self.listener.address)
+        while not self._stop:
+            try:
+                conn = self.listener.accept()
+            except AuthenticationError:
+                logger.warning('Refused a client with the wrong key')
+                continue
+            except OSError:
+                break
+            logger.info('Client connected')
+            threading.Thread(target=self._serve_client, args=(conn,), daemon=True).start()
+
+    def stop(self):
+        self._stop = True
+        if self.listener is not None:
+            self.listener.close()
+
+    def close(self):
+        self.stop()
+        if self.streaming:
+            self.engine.stop_stream()
+            self.streaming = False
+        self.slots.close()
+
+
+class AcquisitionClient:
+    """
+    Connection to a running service. Methods log failures and return None
+    (False for set_exposure), like the engine.
+    """
+
+    def __init__(self, address=DEFAULT_ADDRESS, authkey=AUTHKEY):
+        self.conn = Client(address, authkey=authkey)
+        reply = self._call('hello')
+        self.slots = FrameSlots.attach(reply['slots'])
+
+    def _call(self, command, **kwargs):
+        self.conn.send({'command': command, **kwargs})
+        reply = self.conn.recv()
+        if not reply.pop('ok'):
+            logger.error('%s failed: %s', command, reply['error'])
+            return None
+        return reply
+
+    def set_exposure(self, exposure):
+        return self._call('set_exposure', exposure=exposure) is not None
+
+    def capture(self):
+        """Metadata of a new frame (slot, sequence, exposure, timestamp, missing_packets)"""
+        return self._call('capture')
+
+    def sequence(self, frames):
+        reply = self._call('sequence', frames=frames)
+        return reply['frames'] if reply is not None else None
+
+    def get_frame(self, meta=None, copy=True):
+        """
+        Pixels of the frame described by meta, the latest one by default.
+        Without copy the array is a view into shared memory, valid until the
+        ring comes round to its slot again.
+        """
+        if meta is None:
+            meta = self._call('get_frame')
+            if meta is None:
+                return None
+        frame = self.slots.read(meta['slot'], meta['sequence'], copy=copy)
+        if frame is None:
+            logger.error('Frame %d was overwritten before it was read', meta['sequence'])
+        return frame
+
+    def status(self):
+        return self._call('status')
+
+    def close(self):
+        self.conn.close()
+        self.slots.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--exposure', type=int, default=MIN_EXPOSURE, help='initial exposure, ms')
+    parser.add_argument('--slots', type=int, default=SLOTS, help='frames kept in shared memory')
+    parser.add_argument('--address', help='Unix socket path, or host:port')
+    args = parser.parse_args()
+    setup_logging()
+
+    address = DEFAULT_ADDRESS
+    if args.address:
+        host, _, port = args.address.rpartition(':')
+        address = (host, int(port)) if host and port.isdigit() else args.address
+
+    device = SLDevice(DeviceInterface.USB)
+    engine = AcquisitionEngine(device, threading.Lock())
+    if not engine.open():
+        return 1
+    if not engine.configure(ExposureModes.seq_mode, args.exposure):
+        engine.close()
+        return 1
+    xdim, ydim = engine.image_dims()
+    service = AcquisitionService(engine, xdim, ydim, args.exposure, address, args.slots)
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+        engine.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
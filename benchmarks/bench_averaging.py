@@ -0,0 +1,76 @@
+"""
+Host-side vs firmware averaging of N frames.
+
+Host averaging reads N full frames over USB and averages them in NumPy.
+Firmware averaging reads one already-averaged frame. The script reports
+wall-clock latency per average and the bytes moved over USB for each.
+Needs a connected detector.
+
+    python benchmarks/bench_averaging.py --exposure 100 --frames 4 16 64
+"""
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from SLDevicePythonWrapper import (
+    SLDevice,
+    DeviceInterface,
+    ExposureModes,
+)
+
+from acquisition import AcquisitionEngine
+from log_config import setup_logging
+
+logger = logging.getLogger('bench_averaging')
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--exposure', type=int, default=100, help='exposure per frame (ms)')
+    parser.add_argument('--frames', type=int, nargs='+', default=[4, 16, 64], help='frames per average')
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    setup_logging(level=logging.WARNING)
+
+    engine = AcquisitionEngine(SLDevice(DeviceInterface.USB), threading.Lock())
+    if not engine.open():
+        return -1
+
+    try:
+        xdim, ydim = engine.device.GetImageXDim(), engine.device.GetImageYDim()
+        frame_bytes = xdim * ydim * 2
+
+        print(f'{"frames":>6} {"mode":>9} {"latency (s)":>12} {"overhead (s)":>13} {"USB MB":>8}')
+        for n in args.frames:
+            ideal = n * args.exposure / 1000
+            for mode in ('host', 'firmware'):
+                latencies = []
+                for _ in range(args.repeats):
+                    if not engine.configure(ExposureModes.seq_mode, args.exposure):
+                        return -1
+                    start = time.perf_counter()
+                    if mode == 'host':
+                        result = engine.capture_host_average(xdim, ydim, args.exposure, n)
+                    else:
+                        result = engine.capture_firmware_average(xdim, ydim, args.exposure, n)
+                    if result is None:
+                        return -1
+                    latencies.append(time.perf_counter() - start)
+
+                latency = min(latencies)
+                transferred = (n if mode == 'host' else 1) * frame_bytes / 1e6
+                print(f'{n:>6} {mode:>9} {latency:>12.3f} {latency - ideal:>13.3f} {transferred:>8.1f}')
+    finally:
+        engine.close()
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
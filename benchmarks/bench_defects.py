@@ -0,0 +1,98 @@
+"""
+Defect correction: compiled gather vs full-image passes.
+
+A synthetic full-size frame gets scattered hot pixels plus a few clusters and
+a bad column. Three corrections are timed per frame:
+
+  gather  CompiledDefectMap.correct, touching only the defects
+  scan    a NumPy masked 3x3 mean over the whole image, the cost of a kernel
+          pass without the SDK
+  sdk     SLImage.KernelDefectCorrection with the same map
+
+    python benchmarks/bench_defects.py --fraction 0.001 0.01
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from SLDevicePythonWrapper import SLImage, SLError
+
+from defect_map import CompiledDefectMap
+
+
+def synthetic_defects(xdim, ydim, fraction, seed=0):
+    rng = np.random.default_rng(seed)
+    mask = rng.random((ydim, xdim)) < fraction
+    for y, x in rng.integers(0, [ydim - 4, xdim - 4], (10, 2)):
+        mask[y:y + 3, x:x + 3] = True
+    mask[:, xdim // 2] = True
+    frame = rng.normal(1000, 20, (ydim, xdim)).astype(np.uint16)
+    frame[mask] = 2**14 - 1
+    return mask, frame
+
+
+def masked_mean_scan(frame, mask):
+    """Mean of the good pixels in each 3x3 window, written over the defects"""
+    good = (~mask).astype(np.float32)
+    values = frame.astype(np.float32) * good
+    padded_v = np.pad(values, 1)
+    padded_g = np.pad(good, 1)
+    h, w = frame.shape
+    total = sum(padded_v[dy:dy + h, dx:dx + w] for dy in range(3) for dx in range(3))
+    count = sum(padded_g[dy:dy + h, dx:dx + w] for dy in range(3) for dx in range(3))
+    out = frame.copy()
+    fix = mask & (count > 0)
+    out[fix] = np.rint(total[fix] / count[fix]).astype(np.uint16)
+    return out
+
+
+def best_of(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--xdim', type=int, default=1031)
+    parser.add_argument('--ydim', type=int, default=1536)
+    parser.add_argument('--fraction', type=float, nargs='+', default=[0.0005, 0.005])
+    parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f'{"defects":>8} {"compile (ms)":>13} {"gather (ms)":>12} {"scan (ms)":>10} {"sdk (ms)":>9}')
+    for fraction in args.fraction:
+        mask, frame = synthetic_defects(args.xdim, args.ydim, fraction)
+
+        start = time.perf_counter()
+        compiled = CompiledDefectMap.compile(mask)
+        compile_ms = (time.perf_counter() - start) * 1000
+
+        work = frame.copy()
+        gather_ms = best_of(lambda: compiled.correct(frame, out=work), args.repeats)
+        scan_ms = best_of(lambda: masked_mean_scan(frame, mask), args.repeats)
+
+        # The SDK corrects in place, so each run starts from a fresh copy of the frame
+        defect_map = SLImage.Array2Frame(mask.astype(np.uint16))
+        err = defect_map.SetAsKernelDefectMap()
+        if err == SLError.SL_ERROR_SUCCESS:
+            images = [SLImage.Array2Frame(frame) for _ in range(args.repeats)]
+            sdk_ms = best_of(lambda: images.pop().KernelDefectCorrection(defect_map), args.repeats)
+            sdk = f'{sdk_ms:>9.2f}'
+        else:
+            sdk = f'{"n/a":>9}'
+
+        print(f'{len(compiled):>8} {compile_ms:>13.1f} {gather_ms:>12.3f} {scan_ms:>10.2f} {sdk}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""
+Median denoise latency vs window size on full frames.
+
+A synthetic full-size frame with shot noise and scattered hot pixels is
+filtered by each method at each window size, single-threaded and banded
+across the given worker counts. Also reports how many hot pixels survive,
+as a check that the bands and their halos join up.
+
+    python benchmarks/bench_denoise.py --windows 3 5 7 9 --workers 1 4
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from denoise import Denoiser, OPENCV_WINDOWS
+
+
+def synthetic_frame(xdim, ydim, hot_fraction, seed=0):
+    rng = np.random.default_rng(seed)
+    frame = rng.poisson(1000, (ydim, xdim)).astype(np.uint16)
+    hot = rng.random((ydim, xdim)) < hot_fraction
+    frame[hot] = 2**14 - 1
+    return frame, hot
+
+
+def best_of(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--xdim', type=int, default=1031)
+    parser.add_argument('--ydim', type=int, default=1536)
+    parser.add_argument('--windows', type=int, nargs='+', default=[3, 5, 7, 9, 15])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count() or 1])
+    parser.add_argument('--methods', nargs='+', default=['sdk', 'opencv', 'separable'])
+    parser.add_argument('--hot-fraction', type=float, default=0.001)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    frame, hot = synthetic_frame(args.xdim, args.ydim, args.hot_fraction)
+    print(f'{args.ydim}x{args.xdim} frame, {np.count_nonzero(hot)} hot pixels')
+    print(f'{"method":>10} {"window":>7} {"workers":>8} {"latency (ms)":>13} {"Mpix/s":>8} {"hot left":>9}')
+    for method in args.methods:
+        for window in args.windows:
+            if method == 'opencv' and window not in OPENCV_WINDOWS:
+                continue
+            # The SDK filters the whole frame in one call, so it isn't banded
+            for workers in ([1] if method == 'sdk' else args.workers):
+                denoiser = Denoiser(window, method, workers=workers)
+                try:
+                    out = denoiser.apply(frame)
+                    if out is None:
+                        print(f'{method:>10} {window:>7} {workers:>8} {"n/a":>13}')
+                        break
+                    ms = best_of(lambda: denoiser.apply(frame), args.repeats)
+                finally:
+                    denoiser.close()
+                left = np.count_nonzero(out[hot] == 2**14 - 1)
+                rate = frame.size / ms / 1000
+                print(f'{method:>10} {window:>7} {workers:>8} {ms:>13.2f} {rate:>8.1f} {left:>9}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
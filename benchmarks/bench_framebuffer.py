@@ -0,0 +1,111 @@
+"""
+Memory allocated per frame for display, before and after FrameBuffer.
+
+Before is the path the GUI used to take: Frame2Array copied out of the
+SLImage, invert as 2**14 - frame into a new array, CLAHE into another and
+reset re-reading the saved TIFF. After holds the one owned frame in a
+FrameBuffer and adjusts it into a reused scratch buffer. Each frame is
+captured, inverted, contrast adjusted, inverted back and reset, each step
+followed by orienting for the view. tracemalloc counts what numpy allocates
+in each step.
+
+    python benchmarks/bench_framebuffer.py --frames 20
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from framebuffer import FrameBuffer
+
+
+def before_steps(frame, clahe, path):
+    import imageio.v2 as imageio
+    state = {}
+
+    def set_current(array):
+        state['current'] = array
+        state['view'] = np.rot90(array)
+
+    return [
+        lambda: set_current(frame.copy()),                                  # Frame2Array
+        lambda: set_current(2**14 - state['current']),                      # invert
+        lambda: set_current(clahe.apply(state['current'])),
+        lambda: set_current(2**14 - state['current']),
+        lambda: set_current(imageio.imread(path)),                          # reset re-reads the save
+    ]
+
+
+def after_steps(frame, clahe, buffer):
+    state = {}
+
+    def show():
+        state['view'] = buffer.oriented()
+
+    return [
+        lambda: (buffer.set(frame.copy()), show()),     # the one owned copy out of the SLImage
+        lambda: (buffer.invert(), show()),
+        lambda: (buffer.apply(lambda source, out: clahe.apply(source, dst=out)), show()),
+        lambda: (buffer.invert(), show()),
+        lambda: (buffer.reset(), show()),
+    ]
+
+
+def measure(steps, frames):
+    """Bytes allocated per frame, summed over the steps, and ms per frame"""
+    for step in steps:     # warm up caches and the scratch buffer
+        step()
+    tracemalloc.start()
+    allocated = 0
+    start = time.perf_counter()
+    for _ in range(frames):
+        for step in steps:
+            held, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            step()
+            _, peak = tracemalloc.get_traced_memory()
+            allocated += peak - held
+    elapsed = time.perf_counter() - start
+    tracemalloc.stop()
+    return allocated / frames, elapsed * 1000 / frames
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--xdim', type=int, default=1031)
+    parser.add_argument('--ydim', type=int, default=1536)
+    parser.add_argument('--frames', type=int, default=20)
+    args = parser.parse_args()
+
+    import cv2
+    import imageio.v2 as imageio
+
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 2**14, (args.ydim, args.xdim), dtype=np.uint16)
+    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+    frame_bytes = frame.nbytes
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'frame.tif')
+        imageio.imwrite(path, frame)
+        buffer = FrameBuffer()
+        results = (
+            ('before', measure(before_steps(frame, clahe, path), args.frames)),
+            ('after', measure(after_steps(frame, clahe, buffer), args.frames)),
+        )
+
+    print(f'frame: {args.ydim} x {args.xdim} uint16, {frame_bytes / 2**20:.2f} MiB')
+    print(f'{"path":>8} {"MiB/frame":>10} {"frames":>7} {"ms/frame":>9}')
+    for name, (allocated, ms) in results:
+        print(f'{name:>8} {allocated / 2**20:>10.2f} {allocated / frame_bytes:>7.1f} {ms:>9.1f}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
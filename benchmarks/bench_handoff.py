@@ -0,0 +1,130 @@
+"""
+Per-frame cost of handing frames to processing processes.
+
+Latency is one frame at a time: write it into a slot, run a task that only
+copies it to the output, read the result back. Throughput keeps every
+slot busy. Both are compared with sending the frame pickled through a
+multiprocessing queue to a worker that sends it back. Then CLAHE, the
+heaviest per-frame step, is run in process and across worker counts to
+show how it scales.
+
+    python benchmarks/bench_handoff.py --frames 200 --workers 1 2 4
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from processing_pool import ProcessingPool, clahe, copy
+
+
+def echo(tasks, results):
+    while True:
+        frame = tasks.get()
+        if frame is None:
+            break
+        out = np.empty_like(frame)
+        copy(frame, out)
+        results.put(out)
+
+
+def pool_latency(pool, frame, frames):
+    times = []
+    for _ in range(frames):
+        start = time.perf_counter()
+        pool.put(frame, copy)
+        ticket, out, _ = pool.get()
+        pool.release(ticket)
+        times.append(time.perf_counter() - start)
+    return np.median(times) * 1000
+
+
+def pool_throughput(pool, frame, frames, fn=copy):
+    """ms per frame with every slot kept busy"""
+    start = time.perf_counter()
+    submitted = done = 0
+    while done < frames:
+        while submitted < frames and pool.pending < pool.slots:
+            pool.put(frame, fn)
+            submitted += 1
+        ticket, out, _ = pool.get()
+        pool.release(ticket)
+        done += 1
+    return (time.perf_counter() - start) * 1000 / frames
+
+
+def pickled(frame, frames):
+    context = multiprocessing.get_context('spawn')
+    tasks, results = context.Queue(), context.Queue()
+    worker = context.Process(target=echo, args=(tasks, results), daemon=True)
+    worker.start()
+    tasks.put(frame)
+    results.get()
+
+    times = []
+    for _ in range(frames):
+        start = time.perf_counter()
+        tasks.put(frame)
+        results.get()
+        times.append(time.perf_counter() - start)
+    latency = np.median(times) * 1000
+
+    start = time.perf_counter()
+    for _ in range(frames):
+        tasks.put(frame)
+    for _ in range(frames):
+        results.get()
+    throughput = (time.perf_counter() - start) * 1000 / frames
+
+    tasks.put(None)
+    worker.join()
+    return latency, throughput
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--xdim', type=int, default=1031)
+    parser.add_argument('--ydim', type=int, default=1536)
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 2**14, (args.ydim, args.xdim), dtype=np.uint16)
+    print(f'frame: {args.ydim} x {args.xdim} uint16, {frame.nbytes / 2**20:.2f} MiB')
+
+    print(f'{"handoff":>16} {"latency ms":>11} {"ms/frame":>9}')
+    with ProcessingPool(frame.shape, workers=1) as pool:
+        pool_throughput(pool, frame, pool.slots)   # workers up and warm
+        latency = pool_latency(pool, frame, args.frames)
+        throughput = pool_throughput(pool, frame, args.frames)
+    print(f'{"shared memory":>16} {latency:>11.3f} {throughput:>9.3f}')
+    latency, throughput = pickled(frame, args.frames)
+    print(f'{"pickled queue":>16} {latency:>11.3f} {throughput:>9.3f}')
+
+    import cv2
+    engine = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+    out = np.empty_like(frame)
+    clahe_frames = max(1, args.frames // 4)
+    start = time.perf_counter()
+    for _ in range(clahe_frames):
+        engine.apply(frame, dst=out)
+    serial = (time.perf_counter() - start) * 1000 / clahe_frames
+
+    print(f'\n{"CLAHE":>16} {"ms/frame":>9} {"speed-up":>9}')
+    print(f'{"in process":>16} {serial:>9.2f} {1:>8.2f}x')
+    for workers in args.workers:
+        with ProcessingPool(frame.shape, workers=workers) as pool:
+            pool_throughput(pool, frame, pool.slots, clahe)
+            per_frame = pool_throughput(pool, frame, clahe_frames, clahe)
+        print(f'{f"{workers} workers":>16} {per_frame:>9.2f} {serial / per_frame:>8.2f}x')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
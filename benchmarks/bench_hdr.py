@@ -0,0 +1,57 @@
+"""
+HDR merge timing on a synthetic 12-exposure ladder at full sensor size.
+
+    python benchmarks/bench_hdr.py --workers 0 4
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from exposure_ladder import DEFAULT_EXPOSURES
+from hdr import merge_ladder
+
+
+def synthetic_ladder(xdim, ydim, exposures, seed=0):
+    rng = np.random.default_rng(seed)
+    # Radiance spanning ~4 decades, in ADU per ms
+    scene = np.exp(rng.uniform(np.log(0.01), np.log(100), (ydim, xdim))).astype(np.float32)
+    dark = rng.normal(300, 5, (ydim, xdim)).astype(np.float32)
+    frames, darks = {}, {}
+    for e in exposures:
+        frame = dark + scene * e + rng.normal(0, 5, (ydim, xdim))
+        frames[e] = np.clip(frame, 0, 2**14 - 1).astype(np.uint16)
+        darks[e] = dark
+    return frames, darks, scene
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--xdim', type=int, default=1031)
+    parser.add_argument('--ydim', type=int, default=1536)
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 4])
+    parser.add_argument('--processes', action='store_true', help='use a process pool instead of threads')
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    frames, darks, scene = synthetic_ladder(args.xdim, args.ydim, DEFAULT_EXPOSURES)
+
+    print(f'{"workers":>7} {"best (s)":>9} {"median rel. error":>18}')
+    for workers in args.workers:
+        times = []
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            radiance = merge_ladder(frames, darks, workers=workers or None, use_processes=args.processes)
+            times.append(time.perf_counter() - start)
+        error = np.median(np.abs(radiance - scene) / scene)
+        print(f'{workers:>7} {min(times):>9.3f} {error:>18.4f}')
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
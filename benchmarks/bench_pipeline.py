@@ -0,0 +1,112 @@
+"""
+Serial vs pipelined software-trigger capture.
+
+The detector is simulated: capture() sleeps for the exposure plus a readout
+time while holding the engine lock, as the real one does. Processing
+(dark subtraction, defect-style fix-up, array copy) and saving (a TIFF to a
+temporary folder) are real work on a full-size frame. The serial loop runs
+every stage per frame in turn, the pipeline overlaps them. With
+--gantt, the pipelined run's stage timeline is written as an image.
+
+    python benchmarks/bench_pipeline.py --exposure 50 --frames 20 --gantt pipeline.png
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from SLDevicePythonWrapper import SLError
+
+from instrumentation import metrics
+from pipeline import CapturePipeline
+
+
+class SimulatedEngine:
+    def __init__(self, readout_ms):
+        self.readout_ms = readout_ms
+        self.lock = threading.Lock()
+
+    def capture(self, image, exposure, frame=-1):
+        with self.lock:
+            with metrics.span('exposure_wait', frame):
+                time.sleep(exposure / 1000)
+            with metrics.span('acquire', frame):
+                time.sleep(self.readout_ms / 1000)
+        return SimpleNamespace(error=SLError.SL_ERROR_SUCCESS)
+
+
+def make_stages(xdim, ydim, folder):
+    import imageio.v2 as imageio
+    rng = np.random.default_rng(0)
+    raw = rng.normal(1000, 20, (ydim, xdim)).astype(np.uint16)
+    dark = np.full((ydim, xdim), 100, dtype=np.uint16)
+    hot = rng.integers(0, raw.size, 2000)
+
+    def process(image, frame):
+        with metrics.span('offset_correction', frame):
+            corrected = raw - dark
+        with metrics.span('defect_correction', frame):
+            flat = corrected.reshape(-1)
+            flat[hot] = flat[hot - 1]
+        return corrected
+
+    def save(array, frame):
+        imageio.imwrite(os.path.join(folder, f'{frame}.tif'), array)
+
+    return process, save
+
+
+def run_serial(engine, exposure, frames, process, save):
+    start = time.perf_counter()
+    for frame in range(frames):
+        engine.capture(None, exposure, frame)
+        array = process(None, frame)
+        with metrics.span('save', frame):
+            save(array, frame)
+    return time.perf_counter() - start
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--xdim', type=int, default=1031)
+    parser.add_argument('--ydim', type=int, default=1536)
+    parser.add_argument('--exposure', type=int, default=50)
+    parser.add_argument('--readout', type=float, default=30.0, help='simulated readout, ms')
+    parser.add_argument('--frames', type=int, default=20)
+    parser.add_argument('--gantt', help='write the pipelined stage timeline to this image')
+    args = parser.parse_args()
+
+    engine = SimulatedEngine(args.readout)
+    metrics.enabled = True
+    with tempfile.TemporaryDirectory() as folder:
+        process, save = make_stages(args.xdim, args.ydim, folder)
+
+        metrics.clear()
+        serial = run_serial(engine, args.exposure, args.frames, process, save)
+        serial_overlap = metrics.overlap()
+
+        metrics.clear()
+        pipeline = CapturePipeline(engine, args.xdim, args.ydim, args.exposure, process, save)
+        read, pipelined = pipeline.run(args.frames)
+        pipelined_overlap = metrics.overlap()
+        if args.gantt:
+            metrics.export_gantt(args.gantt, title=f'Pipelined capture, {args.exposure} ms exposure')
+
+    bound = args.exposure + args.readout
+    print(f'exposure + readout bound: {bound:.1f} ms per frame')
+    print(f'{"loop":>10} {"ms/frame":>9} {"fps":>6} {"overlap":>8}')
+    for name, elapsed, overlap in (('serial', serial, serial_overlap), ('pipelined', pipelined, pipelined_overlap)):
+        per_frame = elapsed * 1000 / args.frames
+        print(f'{name:>10} {per_frame:>9.1f} {1000 / per_frame:>6.1f} {overlap:>7.2f}x')
+    return 0 if read == args.frames else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""
+Round-trip overhead of the acquisition service.
+
+The service runs in a child process with a simulated engine whose captures
+take no exposure time, so every millisecond measured is overhead: the
+request and reply, copying the frame into its shared memory slot and, on
+the client, copying it out again. For comparison the same frame is also
+sent pickled through the connection, which is what the shared memory ring
+avoids.
+
+    python benchmarks/bench_service.py --repeats 200
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from SLDevicePythonWrapper import SLError
+
+from acquisition_service import AcquisitionClient, AcquisitionService, DEFAULT_ADDRESS
+
+
+class SimulatedEngine:
+    def start_stream(self):
+        return True
+
+    def stop_stream(self):
+        return True
+
+    def set_exposure(self, exposure):
+        return True
+
+    def capture(self, image, exposure, frame=-1):
+        return SimpleNamespace(error=SLError.SL_ERROR_SUCCESS, missingPackets=0)
+
+    def capture_sequence(self, stack, exposure, num_frames):
+        return num_frames
+
+
+class PicklingService(AcquisitionService):
+    """Adds a command that sends the latest frame itself, serialised"""
+    COMMANDS = AcquisitionService.COMMANDS + ('pixels',)
+
+    def pixels(self):
+        meta = self.get_frame()
+        return {'pixels': self.slots.frames[meta['slot']].copy()}
+
+
+def serve(address, xdim, ydim):
+    service = PicklingService(SimulatedEngine(), xdim, ydim, address=address)
+    try:
+        service.serve_forever()
+    finally:
+        service.close()
+
+
+def timed(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return times[len(times) // 2] * 1000, times[int(len(times) * 0.99)] * 1000
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--xdim', type=int, default=1031)
+    parser.add_argument('--ydim', type=int, default=1536)
+    parser.add_argument('--repeats', type=int, default=200)
+    args = parser.parse_args()
+
+    # Same family as the real service, away from its address
+    if isinstance(DEFAULT_ADDRESS, str):
+        address = os.path.join(tempfile.mkdtemp(), 'bench.sock')
+    else:
+        address = ('127.0.0.1', DEFAULT_ADDRESS[1] + 10)
+
+    server = multiprocessing.get_context('spawn').Process(target=serve, args=(address, args.xdim, args.ydim), daemon=True)
+    server.start()
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            client = AcquisitionClient(address)
+            break
+        except (FileNotFoundError, ConnectionRefusedError):
+            if time.monotonic() > deadline:
+                print('Service did not start')
+                return 1
+            time.sleep(0.05)
+
+    try:
+        client.capture()
+        results = (
+            ('status', timed(client.status, args.repeats)),
+            ('capture', timed(client.capture, args.repeats)),
+            ('capture + read', timed(lambda: client.get_frame(client.capture()), args.repeats)),
+            ('read (view)', timed(lambda: client.get_frame(copy=False), args.repeats)),
+            ('pickled frame', timed(lambda: client._call('pixels'), args.repeats)),
+        )
+    finally:
+        client.close()
+        server.terminate()
+        server.join()
+
+    print(f'frame: {args.ydim} x {args.xdim} uint16, {args.xdim * args.ydim * 2 / 2**20:.2f} MiB')
+    print(f'{"round trip":>16} {"median ms":>10} {"p99 ms":>8}')
+    for name, (median, p99) in results:
+        print(f'{name:>16} {median:>10.3f} {p99:>8.3f}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,111 @@
+"""
+Cold-start timing for gui_test.py.
+
+Each measurement runs in a fresh interpreter so nothing is already imported.
+First the import cost of each heavy module on its own, then the time from
+interpreter start to the first paint of the main window. The device is built
+after the first paint, so the driver load is not part of that figure.
+
+    python benchmarks/bench_startup.py --repeats 5 --target 1.0
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ('numpy', 'PySide6.QtWidgets', 'pyqtgraph', 'SLDevicePythonWrapper', 'cv2', 'imageio.v2', 'gui_test')
+
+_IMPORT_SCRIPT = """
+import sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+"""
+
+# Paint events reach the central widget once the window is actually drawn
+_PAINT_SCRIPT = """
+import sys, time
+sys.path.insert(0, {root!r})
+import gui_test
+from PySide6.QtCore import QObject, QEvent, QTimer
+from PySide6.QtWidgets import QApplication
+
+class FirstPaint(QObject):
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint:
+            print(time.time())
+            QTimer.singleShot(0, app.quit)
+            app.removeEventFilter(self)
+        return False
+
+app = QApplication(sys.argv)
+first_paint = FirstPaint()
+app.installEventFilter(first_paint)
+window = gui_test.MainWindow()
+window.show()
+window.connect_device()
+app.exec()
+window.close()
+"""
+
+
+def run(script, env=None):
+    result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, env=env, cwd=ROOT)
+    if result.returncode != 0 or not result.stdout.strip():
+        return None, result.stderr.strip().splitlines()[-1:] or ['no output']
+    return float(result.stdout.split()[-1]), None
+
+
+def time_to_first_paint(env):
+    # Wall clock, since the interval spans the parent and the child process
+    start = time.time()
+    painted, error = run(_PAINT_SCRIPT.format(root=ROOT), env)
+    if error:
+        return None, error
+    return painted - start, None
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--target', type=float, default=1.0, help='seconds to first paint')
+    parser.add_argument('--offscreen', action='store_true', help='use the offscreen Qt platform')
+    args = parser.parse_args()
+
+    print(f'{"module":<24} {"median import (s)":>18}')
+    for module in MODULES:
+        times = []
+        for _ in range(args.repeats):
+            t, error = run(_IMPORT_SCRIPT.format(root=ROOT, module=module))
+            if error:
+                break
+            times.append(t)
+        if times:
+            print(f'{module:<24} {statistics.median(times):>18.3f}')
+        else:
+            print(f'{module:<24} {"unavailable":>18}  ({error[0]})')
+
+    env = dict(os.environ)
+    if args.offscreen:
+        env['QT_QPA_PLATFORM'] = 'offscreen'
+
+    times = []
+    for _ in range(args.repeats):
+        t, error = time_to_first_paint(env)
+        if error:
+            print(f'first paint: unavailable ({error[0]})')
+            return 1
+        times.append(t)
+    median = statistics.median(times)
+    verdict = 'OK' if median < args.target else 'over target'
+    print(f'first paint: median {median:.3f}s over {len(times)} runs, target {args.target:.1f}s: {verdict}')
+    return 0 if median < args.target else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
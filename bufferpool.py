@@ -0,0 +1,198 @@
+"""
+One pool of SLImage buffers for the whole app, under a memory budget.
+
+Subsystems check buffers out with acquire() and hand them back with
+release() rather than making a new SLImage each time and leaving it to the
+garbage collector. A released buffer is kept, and the next request of the
+same geometry gets it back. The pool counts every buffer it has made, in
+use or idle, against the budget.
+
+Caches (BufferCache) hold buffers checked out of the pool, keyed by
+whatever they cache. When a new buffer would take the pool over budget,
+idle buffers are dropped first, then the least recently used cache entries
+across every cache. Evicted entries are forgotten rather than reused, as
+whoever last fetched one may still hold it. Buffers that are actually in
+use are never taken away, so a capture is never refused. The pool just
+logs that it is over budget until usage falls back under it.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from SLDevicePythonWrapper import SLImage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUDGET_MB = 512
+# SLImage frames are 16-bit
+BYTES_PER_PIXEL = 2
+
+
+class BufferPool:
+    def __init__(self, xdim, ydim, budget=DEFAULT_BUDGET_MB * 2**20):
+        self.xdim, self.ydim = xdim, ydim
+        self.budget = budget
+        self._free = {}         # (xdim, ydim, frames) -> idle SLImages
+        self._in_use = {}       # id(image) -> (image, key)
+        self._caches = []
+        self.free_bytes = 0
+        self.in_use_bytes = 0
+        self._over = False
+        # Re-entrant, as evicting a cache entry calls back into the pool
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def nbytes(key):
+        xdim, ydim, frames = key
+        return xdim * ydim * frames * BYTES_PER_PIXEL
+
+    @property
+    def used(self):
+        return self.in_use_bytes + self.free_bytes
+
+    def acquire(self, frames=1, xdim=None, ydim=None):
+        """An SLImage of the given geometry, the sensor's by default"""
+        key = (xdim or self.xdim, ydim or self.ydim, frames)
+        n = self.nbytes(key)
+        with self._lock:
+            free = self._free.get(key)
+            if free:
+                image = free.pop()
+                self.free_bytes -= n
+            else:
+                self._make_room(n)
+                image = SLImage(key[0], key[1]) if frames == 1 else SLImage(key[0], key[1], frames)
+            self._in_use[id(image)] = (image, key)
+            self.in_use_bytes += n
+            self._check_budget()
+        return image
+
+    def release(self, image):
+        """Hand a buffer back for reuse. Buffers not from the pool are ignored"""
+        with self._lock:
+            entry = self._forget(image)
+            if entry is None:
+                return
+            key = entry[1]
+            n = self.nbytes(key)
+            if self.used + n <= self.budget:
+                self._free.setdefault(key, []).append(image)
+                self.free_bytes += n
+            self._check_budget()
+
+    def discard(self, image):
+        """Stop counting a buffer without reusing it, for one that may still be referenced"""
+        with self._lock:
+            self._forget(image)
+            self._check_budget()
+
+    def _forget(self, image):
+        entry = self._in_use.pop(id(image), None)
+        if entry is not None:
+            self.in_use_bytes -= self.nbytes(entry[1])
+        return entry
+
+    def register(self, cache):
+        self._caches.append(cache)
+
+    def set_budget(self, budget):
+        with self._lock:
+            self.budget = budget
+            self._make_room(0)
+            self._check_budget()
+        logger.info('Buffer pool budget set to %d MB', budget // 2**20)
+
+    def _make_room(self, n):
+        # Idle buffers go first, then the least recently used cache entry of any cache
+        while self.used + n > self.budget:
+            if self.free_bytes:
+                key = next(k for k, images in self._free.items() if images)
+                self._free[key].pop()
+                self.free_bytes -= self.nbytes(key)
+                continue
+            caches = [cache for cache in self._caches if len(cache)]
+            if not caches:
+                break
+            min(caches, key=lambda cache: cache.last_used()).evict()
+
+    def _check_budget(self):
+        over = self.used > self.budget
+        if over and not self._over:
+            logger.warning(
+                'Buffer pool over budget: %.0f of %.0f MB in use',
+                self.used / 2**20, self.budget / 2**20
+            )
+        self._over = over
+
+    def usage(self):
+        """Bytes by state: in use (cached included), cached, idle and the budget"""
+        with self._lock:
+            return {
+                'in_use': self.in_use_bytes,
+                'cached': sum(cache.nbytes for cache in self._caches),
+                'free': self.free_bytes,
+                'budget': self.budget,
+            }
+
+
+class BufferCache:
+    """Pool buffers kept by key, the least recently used evicted first under pressure"""
+
+    def __init__(self, pool, name):
+        self.pool = pool
+        self.name = name
+        self._entries = OrderedDict()   # key -> (image, bytes, last used)
+        self.nbytes = 0
+        pool.register(self)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self.pool._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            self._entries[key] = (entry[0], entry[1], time.monotonic())
+            return entry[0]
+
+    def load(self, key, fill, frames=1):
+        """
+        The cached buffer for key, or a new one from the pool filled by
+        fill(image), which returns False on failure. Returns None on failure.
+        """
+        image = self.get(key)
+        if image is not None:
+            return image
+        image = self.pool.acquire(frames)
+        if not fill(image):
+            self.pool.release(image)
+            return None
+        n = self.pool.nbytes((self.pool.xdim, self.pool.ydim, frames))
+        with self.pool._lock:
+            # Loaded twice at once, keep the newer one
+            self.evict(key)
+            self._entries[key] = (image, n, time.monotonic())
+            self.nbytes += n
+        return image
+
+    def last_used(self):
+        return next(iter(self._entries.values()))[2]
+
+    def evict(self, key=None):
+        """Drop key, or the least recently used entry"""
+        with self.pool._lock:
+            if key is None:
+                key = next(iter(self._entries))
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return
+            self.nbytes -= entry[1]
+            self.pool.discard(entry[0])
+        logger.debug('Evicted %s from the %s cache', key, self.name)
+
+    def clear(self):
+        with self.pool._lock:
+            while self._entries:
+                self.evict()
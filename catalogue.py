@@ -0,0 +1,284 @@
+"""
+SQLite catalogue of everything saved under the image folder.
+
+One row per saved file: what kind of file it is, its exposure, the corrections
+applied, acquisition mode, sensor temperature, device, frame count and when it
+was captured and saved. Rows are written as files are saved, so sorting,
+filtering and finding the matching dark are indexed queries rather than a glob
+and a filename regex over the whole folder.
+
+Paths are stored relative to the catalogue root so the image folder can be
+moved. Files saved before the catalogue existed are picked up by
+import_legacy(), with what metadata their file names carry.
+"""
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CATALOGUE_NAME = 'catalogue.sqlite'
+
+# Kinds of file in the catalogue
+CAPTURE = 'capture'
+BURST = 'burst'
+DARK = 'dark'
+LADDER = 'ladder'
+HDR = 'hdr'
+DEFECT_MAP = 'defect_map'
+GAIN_MAP = 'gain_map'
+CUMULATIVE = 'cumulative'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS captures (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    kind TEXT NOT NULL,
+    exposure INTEGER,
+    corrections TEXT NOT NULL DEFAULT '',
+    mode TEXT,
+    temperature REAL,
+    device_id TEXT,
+    frames INTEGER NOT NULL DEFAULT 1,
+    frame_number INTEGER,
+    captured_at REAL NOT NULL,
+    saved_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS captures_kind_exposure ON captures (kind, exposure, temperature);
+CREATE INDEX IF NOT EXISTS captures_captured_at ON captures (captured_at);
+"""
+
+_COLUMNS = (
+    'path', 'kind', 'exposure', 'corrections', 'mode', 'temperature',
+    'device_id', 'frames', 'frame_number', 'captured_at', 'saved_at',
+)
+_ORDERINGS = {
+    'exposure': 'exposure IS NULL, exposure, captured_at',
+    'captured_at': 'captured_at',
+    'temperature': 'temperature IS NULL, temperature, captured_at',
+}
+_EXPOSURE_PATTERN = re.compile(r'(\d+)ms')
+# Darks saved before temperatures were recorded: dark_frame_<exp>.tif
+_LEGACY_DARK_PATTERN = re.compile(r'^dark_frame_(\d+)\.tif$')
+# Darks named by DarkLibrary: dark_frame_<exp>ms_<temperature>C.tif
+_DARK_TEMPERATURE_PATTERN = re.compile(r'^dark_frame_\d+ms_(-?\d+(?:\.\d+)?)C\.tif$')
+_LEGACY_EXTENSIONS = ('.tif', '.tiff', '.npz')
+
+
+def parse_exposure(filename):
+    """Exposure (ms) from a name like '200ms_7196.tif', or None. Only for files the catalogue doesn't know."""
+    name = os.path.basename(filename)
+    match = _EXPOSURE_PATTERN.search(name) or _LEGACY_DARK_PATTERN.match(name)
+    return int(match.group(1)) if match else None
+
+
+def _infer_kind(name):
+    if name.startswith('dark_frame_'):
+        return DARK
+    if name.startswith('burst_'):
+        return BURST
+    if name.startswith('ladder') and name.endswith('.npz'):
+        return LADDER
+    if name.endswith('_hdr.tif'):
+        return HDR
+    if name == 'defect_map.tif':
+        return DEFECT_MAP
+    if name.startswith('gain_map_'):
+        return GAIN_MAP
+    if name.startswith('cumulative_'):
+        return CUMULATIVE
+    return CAPTURE
+
+
+class Catalogue:
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.path = os.path.join(root, CATALOGUE_NAME)
+        # Shared by the GUI and its worker threads, serialised by the lock
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._lock, self._db:
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _rel(self, path):
+        try:
+            rel = os.path.relpath(os.path.abspath(path), os.path.abspath(self.root))
+        except ValueError:
+            # Different drive on Windows
+            return os.path.abspath(path)
+        return os.path.abspath(path) if rel.startswith('..') else rel.replace(os.sep, '/')
+
+    def _like_folder(self, folder):
+        """LIKE pattern matching every path under folder"""
+        rel = self._rel(folder)
+        if rel == '.':
+            return '%'
+        return rel.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '/%'
+
+    def _abs(self, rel):
+        return os.path.normpath(os.path.join(self.root, rel))
+
+    def _row(self, row):
+        record = dict(row)
+        record['path'] = self._abs(record['path'])
+        record['corrections'] = [c for c in record['corrections'].split(',') if c]
+        return record
+
+    def add(self, path, kind=CAPTURE, exposure=None, corrections=(), mode=None, temperature=None,
+            device_id=None, frames=1, frame_number=None, captured_at=None):
+        """Insert or replace the row for a saved file"""
+        now = time.time()
+        values = (
+            self._rel(path), kind, exposure, ','.join(corrections), mode, temperature,
+            device_id, frames, frame_number, captured_at or now, now,
+        )
+        with self._lock, self._db:
+            self._db.execute(
+                f'INSERT OR REPLACE INTO captures ({", ".join(_COLUMNS)}) '
+                f'VALUES ({", ".join("?" * len(_COLUMNS))})',
+                values,
+            )
+
+    def remove(self, path):
+        with self._lock, self._db:
+            self._db.execute('DELETE FROM captures WHERE path = ?', (self._rel(path),))
+
+    def remove_many(self, paths):
+        with self._lock, self._db:
+            self._db.executemany('DELETE FROM captures WHERE path = ?', [(self._rel(p),) for p in paths])
+
+    def relocate(self, moves):
+        """Follow files that were moved, given (old_path, new_path) pairs"""
+        with self._lock, self._db:
+            self._db.executemany(
+                'UPDATE captures SET path = ? WHERE path = ?',
+                [(self._rel(new), self._rel(old)) for old, new in moves],
+            )
+
+    def get(self, path):
+        with self._lock:
+            row = self._db.execute('SELECT * FROM captures WHERE path = ?', (self._rel(path),)).fetchone()
+        return self._row(row) if row is not None else None
+
+    def exposure_of(self, path):
+        record = self.get(path)
+        if record is not None and record['exposure'] is not None:
+            return record['exposure']
+        return parse_exposure(path)
+
+    def query(self, kind=None, exposure=None, corrected=None, folder=None, order_by='exposure', limit=None):
+        """
+        Rows matching every given filter, as dicts with absolute paths. kind
+        may be a single kind or a tuple of kinds.
+        """
+        clauses, params = [], []
+        if kind is not None:
+            kinds = (kind,) if isinstance(kind, str) else tuple(kind)
+            clauses.append(f'kind IN ({", ".join("?" * len(kinds))})')
+            params.extend(kinds)
+        if exposure is not None:
+            clauses.append('exposure = ?')
+            params.append(exposure)
+        if corrected is not None:
+            clauses.append("corrections != ''" if corrected else "corrections = ''")
+        if folder is not None:
+            clauses.append("path LIKE ? ESCAPE '\\'")
+            params.append(self._like_folder(folder))
+
+        sql = 'SELECT * FROM captures'
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        sql += ' ORDER BY ' + _ORDERINGS[order_by]
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        return [self._row(row) for row in rows]
+
+    def find_dark(self, exposure, temperature=None, max_temperature_delta=2.0, folder=None):
+        """
+        Path of the dark closest in temperature at this exposure. Darks of
+        unknown temperature are only used when no measured one exists. With no
+        temperature to match, the most recent dark wins. None if nothing fits.
+        """
+        sql = 'SELECT path, temperature FROM captures WHERE kind = ? AND exposure = ?'
+        params = [DARK, exposure]
+        if folder is not None:
+            sql += " AND path LIKE ? ESCAPE '\\'"
+            params.append(self._like_folder(folder))
+        if temperature is None:
+            sql += ' ORDER BY captured_at DESC LIMIT 1'
+        else:
+            sql += ' ORDER BY temperature IS NULL, ABS(temperature - ?), captured_at DESC LIMIT 1'
+            params.append(temperature)
+
+        with self._lock:
+            row = self._db.execute(sql, params).fetchone()
+        if row is None:
+            return None
+        if temperature is not None and row['temperature'] is not None:
+            delta = abs(row['temperature'] - temperature)
+            if delta > max_temperature_delta:
+                logger.info('Closest %dms dark is %.1fC away from sensor temperature', exposure, delta)
+                return None
+        return self._abs(row['path'])
+
+    def remove_missing(self, folder=None):
+        """Drop rows whose file has been deleted. Returns how many went."""
+        sql, params = 'SELECT path FROM captures', []
+        if folder is not None:
+            sql += " WHERE path LIKE ? ESCAPE '\\'"
+            params.append(self._like_folder(folder))
+        with self._lock:
+            paths = [row['path'] for row in self._db.execute(sql, params)]
+            gone = [(p,) for p in paths if not os.path.exists(self._abs(p))]
+            if gone:
+                with self._db:
+                    self._db.executemany('DELETE FROM captures WHERE path = ?', gone)
+        return len(gone)
+
+    def import_legacy(self, folder):
+        """
+        Catalogue files in folder that predate the catalogue. Metadata comes
+        from the file name and mtime. Returns the number of files added.
+        """
+        if not os.path.isdir(folder):
+            return 0
+        with self._lock:
+            known = {
+                row['path'] for row in
+                self._db.execute("SELECT path FROM captures WHERE path LIKE ? ESCAPE '\\'", (self._like_folder(folder),))
+            }
+
+        added = 0
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if not entry.is_file() or not entry.name.lower().endswith(_LEGACY_EXTENSIONS):
+                    continue
+                if self._rel(entry.path) in known:
+                    continue
+                temperature = _DARK_TEMPERATURE_PATTERN.match(entry.name)
+                self.add(
+                    entry.path,
+                    kind=_infer_kind(entry.name),
+                    exposure=parse_exposure(entry.name),
+                    corrections=('offset',) if entry.name.startswith('corr_') else (),
+                    temperature=float(temperature.group(1)) if temperature else None,
+                    captured_at=entry.stat().st_mtime,
+                )
+                added += 1
+        if added:
+            logger.info('Catalogued %d existing files in %s', added, folder)
+        return added
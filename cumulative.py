@@ -0,0 +1,167 @@
+"""
+Cumulative (stacked) long exposures.
+
+Instead of one exposure near the 30 s limit, which can saturate with no
+warning, short seq_mode frames are taken a few at a time. Each is
+dark-corrected and added into one float32 running sum. The sum is reported
+after every frame so it can be shown as it builds. The run stops by itself
+at the first of:
+
+  the frame limit
+  a saturation target, when the brightest part of the sum (a high
+  percentile, so a few hot pixels don't count) reaches the level a single
+  exposure would saturate at
+  an SNR target, estimated from the temporal noise between consecutive
+  frames in the measured region
+  a frame that is saturated itself, which stacking can't undo
+
+Memory is one accumulator, one previous frame and a small capture buffer,
+however many frames are taken. Every intermediate sum is appended as a
+float32 page to a multi-page TIFF as it is made, so any of them can be read
+back later with read_intermediate().
+"""
+import logging
+import time
+
+import numpy as np
+
+from SLDevicePythonWrapper import ExposureModes, SLImage
+
+from acquisition import SATURATION_LEVEL
+
+logger = logging.getLogger(__name__)
+
+# Frames per hardware sequence
+CHUNK_FRAMES = 4
+# The saturation target looks at this percentile of the sum, not its maximum
+LEVEL_PERCENTILE = 99.9
+# A frame with more than this fraction of saturated pixels ends the run
+SATURATED_FRACTION = 1e-4
+
+# Why a run stopped
+FRAME_LIMIT = 'frame_limit'
+LEVEL_REACHED = 'level_reached'
+SNR_REACHED = 'snr_reached'
+FRAME_SATURATED = 'frame_saturated'
+STOPPED = 'stopped'
+
+
+class CumulativeResult:
+    def __init__(self, image, frames, exposure, reason, snr, filename):
+        self.image = image          # (ydim, xdim) float32 dark-corrected sum
+        self.frames = frames
+        self.exposure = exposure    # per frame, ms
+        self.reason = reason
+        self.snr = snr
+        self.filename = filename    # multi-page TIFF of every intermediate sum
+
+    @property
+    def total_exposure(self):
+        return self.frames * self.exposure
+
+
+def read_intermediate(filename, frames):
+    """Sum after the given number of frames, read back from a run's TIFF"""
+    import imageio.v2 as imageio
+    reader = imageio.get_reader(filename, format='TIFF')
+    try:
+        return reader.get_data(frames - 1)
+    finally:
+        reader.close()
+
+
+class CumulativeExposure:
+    def __init__(self, engine, xdim, ydim, exposure, max_frames, dark, filename,
+                 target_level=SATURATION_LEVEL, snr_target=None, region=None, chunk=CHUNK_FRAMES):
+        self.engine = engine
+        self.xdim, self.ydim = xdim, ydim
+        self.exposure = exposure
+        self.max_frames = max_frames
+        self.dark = np.asarray(dark, dtype=np.float32)
+        self.filename = filename
+        self.target_level = target_level
+        self.snr_target = snr_target
+        # (y0, y1, x0, x1) the stop targets are measured in, default the whole frame
+        y0, y1, x0, x1 = region if region is not None else (0, ydim, 0, xdim)
+        self.region = (slice(y0, y1), slice(x0, x1))
+        self.chunk = min(chunk, max_frames)
+        self._stop = False
+
+    def stop(self):
+        self._stop = True
+
+    def snr(self, total, frame, previous, frames):
+        """Mean signal over the temporal noise of frames frames, in the region"""
+        if previous is None:
+            return None
+        # Fixed pattern cancels in the difference, which has twice one frame's variance
+        diff = frame[self.region] - previous[self.region]
+        noise = np.sqrt(frames * diff.var() / 2)
+        return float(total[self.region].mean() / noise) if noise > 0 else None
+
+    def run(self, progress=None):
+        """
+        Capture until a stop condition. progress(frames, total, snr, level) is
+        called after every frame, total being the live float32 sum; copy it to
+        keep it. Returns a CumulativeResult, or None if nothing was captured.
+        Expects the camera open and not streaming.
+        """
+        import imageio.v2 as imageio
+
+        if not self.engine.configure(ExposureModes.seq_mode, self.exposure):
+            return None
+
+        buffer = SLImage(self.xdim, self.ydim, self.chunk)
+        total = np.zeros((self.ydim, self.xdim), dtype=np.float32)
+        corrected = np.empty_like(total)
+        previous = np.empty_like(total)
+        max_saturated = SATURATED_FRACTION * total.size
+
+        frames = 0
+        snr = None
+        reason = None
+        start = time.perf_counter()
+        writer = imageio.get_writer(self.filename, format='TIFF')
+        try:
+            while frames < self.max_frames and reason is None and not self._stop:
+                n = min(self.chunk, self.max_frames - frames)
+                received = self.engine.capture_sequence(buffer, self.exposure, n)
+                if not received:
+                    break
+                for i in range(received):
+                    frame = buffer.Frame2Array(i)
+                    if np.count_nonzero(frame >= SATURATION_LEVEL) > max_saturated:
+                        logger.warning('Frame %d is saturated, use a shorter frame exposure', frames + 1)
+                        reason = FRAME_SATURATED
+                        break
+                    np.subtract(frame, self.dark, out=corrected)
+                    total += corrected
+                    frames += 1
+                    writer.append_data(total)
+
+                    snr = self.snr(total, corrected, previous if frames > 1 else None, frames)
+                    corrected, previous = previous, corrected
+                    level = float(np.percentile(total[self.region], LEVEL_PERCENTILE))
+                    if progress is not None:
+                        progress(frames, total, snr, level)
+
+                    if level >= self.target_level:
+                        reason = LEVEL_REACHED
+                        break
+                    if self.snr_target is not None and snr is not None and snr >= self.snr_target:
+                        reason = SNR_REACHED
+                        break
+        finally:
+            writer.close()
+        if reason is None:
+            reason = FRAME_LIMIT if frames == self.max_frames else STOPPED
+
+        if frames == 0:
+            logger.error('Cumulative exposure captured no frames')
+            return None
+        logger.info(
+            'Cumulative exposure: %d x %dms (%.1fs total) in %.1fs, stopped on %s, SNR %s',
+            frames, self.exposure, frames * self.exposure / 1000, time.perf_counter() - start,
+            reason, f'{snr:.1f}' if snr is not None else 'n/a'
+        )
+        return CumulativeResult(total, frames, self.exposure, reason, snr, self.filename)
@@ -1,6 +1,6 @@
 import os
-import glob
-import re
+import sys
+import logging
 
 
 import numpy as np
@@ -16,30 +16,25 @@ from SLDevicePythonWrapper import (
     SLBufferInfo,
 )
 
-def extract_exposure_time(filename):
-    """
-    Extract exposure time (in ms) from filename like '200ms_7196.tif'
-    Returns integer value in ms.
-    """
-    match = re.search(r"(\d+)ms", os.path.basename(filename))
-    if match:
-        return int(match.group(1))
-    else:
-        return float("inf")
-
-def plot_grid(files):
-    # Sort by exposure time
-    files.sort(key=extract_exposure_time)
-    files = files[:12]
+from log_config import setup_logging
+from catalogue import Catalogue, CAPTURE
+from dark_library import DarkLibrary
+from storage import Storage
+
+logger = logging.getLogger('dark_correction')
+
+def plot_grid(records):
+    # Catalogue records, already sorted by exposure time
+    records = records[:12]
 
     fig, axes = plt.subplots(3, 4, figsize=(12, 9))
     axes = axes.ravel()
 
-    for i, file in enumerate(files):
-        img = imageio.imread(file)  # 16-bit TIFF
+    for i, record in enumerate(records):
+        img = imageio.imread(record['path'])  # 16-bit TIFF
         img_norm = img.astype(np.float32) / np.max(img)  # normalize 0–1
         axes[i].imshow(img_norm, cmap="gray", vmin=0, vmax=1)
-        axes[i].set_title(f"{extract_exposure_time(file)} ms", fontsize=9)
+        axes[i].set_title(f"{record['exposure']} ms", fontsize=9)
         axes[i].axis("off")
 
     plt.tight_layout()
@@ -49,47 +44,53 @@ def invert_image(image: SLImage):
     return SLImage.Array2Frame(2**14 - 1 - image.Frame2Array(0))
 
 if __name__ == '__main__':
-    print('Applying dark correction')
+    setup_logging()
+    logger.info('Applying dark correction')
 
     xdim, ydim = 1031, 1536
 
     fig, axes = plt.subplots(3, 4, figsize=(12, 9))
     axes = axes.ravel()
 
-    # Load images
-    folder_path = r'C:\programming\pyside6-practice\Images\York\single-capture'
-    files = glob.glob(os.path.join(folder_path, "*.tif"))
-    files.sort(key=extract_exposure_time)
+    # Load images, from the York data set in the Images folder unless given
+    root = sys.argv[1] if len(sys.argv) > 1 else Storage().base / 'York'
+    folder_path = os.path.join(root, 'single-capture')
+    output_path = os.path.join(root, 'corrected_images')
+    os.makedirs(output_path, exist_ok=True)
+    catalogue = Catalogue(root)
+    catalogue.import_legacy(folder_path)
+    darks = DarkLibrary(os.path.join(root, 'correction_images'), catalogue)
+    records = catalogue.query(kind=CAPTURE, folder=folder_path, order_by='exposure')
 
 
-    for i, file in enumerate(files):
+    for i, record in enumerate(records):
         image = SLImage(xdim, ydim)
-        SLImage.ReadTiffImage(file, image)
-        exp_time = extract_exposure_time(file)
-        print(f'Exposure time: {exp_time}ms')
+        SLImage.ReadTiffImage(record['path'], image)
+        exp_time = record['exposure']
+        logger.info('Exposure time: %sms', exp_time)
 
         # Initialise dark image object 
         dark_image = SLImage(xdim, ydim)
 
-        # If dark image doesn't exist in directory, capture one
-        filename_dark = f'C:\programming\pyside6-practice\Images\York\correction_images\\dark_frame_{exp_time}.tif'
-        if not os.path.exists(filename_dark):
+        # If no dark was taken at this exposure, skip the image
+        filename_dark = darks.find(exp_time, record['temperature'])
+        if filename_dark is None:
             # Try and capture dark image
-            print('No dark image found.')
+            logger.warning('No dark image found for %sms', exp_time)
             continue
 
         # Load dark image
         err = SLImage.ReadTiffImage(filename_dark, dark_image)
         if err != True:
-            print(f'Failed to read dark image')
+            logger.error('Failed to read dark image %s', filename_dark)
             continue
 
         # Apply offset correction
         err = SLImage.OffsetCorrection(image, dark_image, darkOffset=50)
         if err != SLError.SL_ERROR_SUCCESS:
-            print(f'Failed to apply dark correction with error: {err}')
+            logger.error('Failed to apply dark correction with error: %s', err)
             continue    
-        print('Offset correction applied')
+        logger.info('Offset correction applied')
         
         # Crop image
         cropped_image = SLImage(xdim, ydim)
@@ -99,7 +100,7 @@ if __name__ == '__main__':
         inverted_image = invert_image(cropped_image)
 
         # Save image
-        inverted_image.WriteTiffImage(f'C:\programming\pyside6-practice\Images\York\corrected_images\cropped_{exp_time}ms.tif')
+        inverted_image.WriteTiffImage(os.path.join(output_path, f'cropped_{exp_time}ms.tif'))
 
         img = inverted_image.Frame2Array(0)
         img_norm = img.astype(np.float32) / np.max(img)  # normalize 0–1
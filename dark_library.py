@@ -0,0 +1,45 @@
+"""
+Dark frames keyed by exposure time and sensor temperature.
+
+Dark current grows quickly with temperature, so a dark is only reused when it
+was taken at the same exposure and close to the current sensor temperature.
+Darks are rows of kind 'dark' in the capture catalogue, so picking one is a
+single indexed query. Darks saved before the catalogue, including bare
+dark_frame_<exp>.tif files, are imported from their names on reload.
+"""
+import logging
+import os
+
+from catalogue import DARK
+
+logger = logging.getLogger(__name__)
+
+
+class DarkLibrary:
+    def __init__(self, folder, catalogue, max_temperature_delta=2.0):
+        self.folder = folder
+        self.catalogue = catalogue
+        self.max_temperature_delta = max_temperature_delta
+        self.reload()
+
+    def reload(self):
+        # Pick up darks captured before the catalogue, forget deleted ones
+        self.catalogue.import_legacy(self.folder)
+        removed = self.catalogue.remove_missing(self.folder)
+        if removed:
+            logger.info('Forgot %d deleted darks', removed)
+
+    def filename_for(self, exposure, temperature=None):
+        if temperature is None:
+            return os.path.join(self.folder, f'dark_frame_{exposure}.tif')
+        return os.path.join(self.folder, f'dark_frame_{exposure}ms_{temperature:.1f}C.tif')
+
+    def add(self, filename, exposure, temperature=None, device_id=None):
+        self.catalogue.add(filename, DARK, exposure, temperature=temperature, device_id=device_id)
+
+    def find(self, exposure, temperature=None):
+        """
+        Return the path of the best dark for this exposure, or None if there is
+        no dark within max_temperature_delta of the given temperature.
+        """
+        return self.catalogue.find_dark(exposure, temperature, self.max_temperature_delta, self.folder)
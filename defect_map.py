@@ -0,0 +1,186 @@
+"""
+Defect maps: generation with the SDK and a compiled form for fast correction.
+
+The SDK marks hot pixels from a dark and dead/weak pixels from a bright (flat)
+image. The union is cached as a TIFF in the defect map folder. For correction the map
+is compiled once into the flat indices of the defective pixels plus, for each
+one, the indices of its nearest good neighbours and their weights. Correcting
+a frame is then a single gather and weighted sum over the defects only, rather
+than a kernel pass over the whole image.
+"""
+import logging
+import os
+
+import numpy as np
+import imageio.v2 as imageio
+
+from SLDevicePythonWrapper import (
+    SLImage,
+    SLError,
+    FullWellModes,
+    CalibrationImageType,
+)
+
+logger = logging.getLogger(__name__)
+
+MAP_NAME = 'defect_map.tif'
+COMPILED_NAME = 'defect_map.npz'
+# Good neighbours averaged per defect
+NEIGHBOURS = 8
+# Search grows out to this radius for defects inside a cluster
+MAX_RADIUS = 3
+
+
+def generate_defect_map(dark=None, bright=None, full_well=FullWellModes.High):
+    """
+    Defect mask (uint8, nonzero = defective) from a dark and/or bright frame,
+    each an (ydim, xdim) uint16 array. Returns None if the SDK fails.
+    """
+    mask = None
+    for frame, image_type in ((dark, CalibrationImageType.Dark), (bright, CalibrationImageType.Bright)):
+        if frame is None:
+            continue
+        image = SLImage.Array2Frame(np.ascontiguousarray(frame, dtype=np.uint16))
+        defect_map = SLImage(frame.shape[1], frame.shape[0])
+        err = image.GenerateDefectMap(defect_map, full_well, image_type)
+        if err != SLError.SL_ERROR_SUCCESS:
+            logger.error('Failed to generate %s defect map with error: %s', image_type, err)
+            return None
+        found = defect_map.Frame2Array(0) != 0
+        logger.info('%s frame marks %d defective pixels', image_type, np.count_nonzero(found))
+        mask = found if mask is None else mask | found
+    if mask is None:
+        raise ValueError('Need a dark or a bright frame to build a defect map')
+    return mask.astype(np.uint8)
+
+
+class CompiledDefectMap:
+    """Sparse defect list with precomputed neighbour indices and weights"""
+
+    def __init__(self, shape, targets, neighbours, weights):
+        self.shape = tuple(shape)
+        self.targets = targets          # (n,) flat indices of the defects
+        self.neighbours = neighbours    # (n, NEIGHBOURS) flat indices to average
+        self.weights = weights          # (n, NEIGHBOURS) float32, rows sum to 1
+
+    def __len__(self):
+        return len(self.targets)
+
+    @classmethod
+    def compile(cls, mask, neighbours=NEIGHBOURS, max_radius=MAX_RADIUS):
+        mask = np.asarray(mask) != 0
+        h, w = mask.shape
+        ys, xs = np.nonzero(mask)
+
+        # Every offset out to max_radius, nearest first
+        r = np.arange(-max_radius, max_radius + 1)
+        dy, dx = (a.ravel() for a in np.meshgrid(r, r, indexing='ij'))
+        keep = (dy != 0) | (dx != 0)
+        dy, dx = dy[keep], dx[keep]
+        order = np.argsort(dy * dy + dx * dx, kind='stable')
+        dy, dx = dy[order], dx[order]
+
+        ny = ys[:, None] + dy
+        nx = xs[:, None] + dx
+        inside = (ny >= 0) & (ny < h) & (nx >= 0) & (nx < w)
+        ny, nx = np.clip(ny, 0, h - 1), np.clip(nx, 0, w - 1)
+        good = inside & ~mask[ny, nx]
+
+        # First `neighbours` good candidates of each row, i.e. the nearest ones
+        rank = np.cumsum(good, axis=1)
+        chosen = good & (rank <= neighbours)
+        counts = chosen.sum(axis=1)
+
+        fixable = counts > 0
+        if not fixable.all():
+            logger.warning('%d defects have no good pixel within %d, left as is', np.count_nonzero(~fixable), max_radius)
+        chosen, counts = chosen[fixable], counts[fixable]
+        ny, nx = ny[fixable], nx[fixable]
+        targets = ys[fixable] * w + xs[fixable]
+
+        # Pack the chosen candidates to the left, padding with the defect itself at weight 0
+        rows, cols = np.nonzero(chosen)
+        index = np.repeat(targets[:, None], neighbours, axis=1)
+        index[rows, rank[fixable][rows, cols] - 1] = (ny * w + nx)[rows, cols]
+        weights = (np.arange(neighbours) < counts[:, None]) / counts[:, None]
+
+        return cls(mask.shape, targets.astype(np.intp), index.astype(np.intp), weights.astype(np.float32))
+
+    def correct(self, frame, out=None):
+        """
+        Replace each defect with the mean of its good neighbours. Works in
+        place when out is frame (the default when out is None).
+        """
+        if frame.shape != self.shape:
+            raise ValueError(f'Frame is {frame.shape}, defect map is {self.shape}')
+        if out is None:
+            out = frame
+        elif out is not frame:
+            np.copyto(out, frame)
+        flat = frame.reshape(-1)
+        values = np.einsum('ij,ij->i', flat[self.neighbours], self.weights)
+        out.reshape(-1)[self.targets] = np.rint(values).astype(out.dtype)
+        return out
+
+    def write_back(self, frame, image):
+        """
+        Copy the corrected defect pixels of frame into the SLImage it was
+        read from, leaving the image's other pixels as they are. Only the
+        defects are set, so the image keeps its buffer. False on an SDK error.
+        """
+        flat = frame.reshape(-1)
+        width = self.shape[1]
+        for target in self.targets.tolist():
+            y, x = divmod(target, width)
+            err = image.SetPixelVal(int(flat[target]), x, y)
+            if err != SLError.SL_ERROR_SUCCESS:
+                logger.error('Failed to write corrected pixel (%d, %d) with error: %s', x, y, err)
+                return False
+        return True
+
+    def save(self, filename):
+        with open(filename, 'wb') as f:
+            np.savez(f, shape=self.shape, targets=self.targets, neighbours=self.neighbours, weights=self.weights)
+
+    @classmethod
+    def load(cls, filename):
+        with np.load(filename) as data:
+            return cls(data['shape'], data['targets'], data['neighbours'], data['weights'])
+
+
+def load_defect_map(folder):
+    """
+    Compiled defect map for the map cached in folder, or None if there is no
+    map. The compiled form is cached alongside and rebuilt when the map is newer.
+    """
+    map_path = os.path.join(folder, MAP_NAME)
+    compiled_path = os.path.join(folder, COMPILED_NAME)
+    if not os.path.exists(map_path):
+        return None
+    if os.path.exists(compiled_path) and os.path.getmtime(compiled_path) >= os.path.getmtime(map_path):
+        return CompiledDefectMap.load(compiled_path)
+
+    try:
+        mask = imageio.imread(map_path)
+    except OSError:
+        logger.exception('Failed to read defect map %s', map_path)
+        return None
+    compiled = CompiledDefectMap.compile(mask)
+    compiled.save(compiled_path)
+    logger.info('Compiled defect map with %d defects', len(compiled))
+    return compiled
+
+
+def save_defect_map(mask, folder):
+    """Cache a defect mask as folder/defect_map.tif and return its compiled form"""
+    os.makedirs(folder, exist_ok=True)
+    map_path = os.path.join(folder, MAP_NAME)
+    try:
+        imageio.imwrite(map_path, mask.astype(np.uint8))
+    except OSError:
+        logger.exception('Failed to save defect map as %s', map_path)
+        return None
+    compiled = CompiledDefectMap.compile(mask)
+    compiled.save(os.path.join(folder, COMPILED_NAME))
+    logger.info('Saved defect map with %d defects to %s', len(compiled), map_path)
+    return compiled
@@ -0,0 +1,149 @@
+"""
+Median denoising for hot pixels and shot noise.
+
+Three implementations of a window x window median:
+
+  sdk        SLImage.MedianFilter on the whole frame
+  opencv     cv2.medianBlur, exact, but only windows 3 and 5 for 16-bit data
+  separable  a 1-D median along rows and then along columns. This is not
+             the exact 2-D median but it removes the same impulse noise, it
+             works at any window and it is cheaper per pixel
+
+'auto' picks opencv where it can and separable otherwise. The NumPy/OpenCV
+paths split the frame into row bands. Each band is filtered together with a
+halo of window // 2 rows on either side, and only its interior is written to
+the output. Bands run on a thread pool (both libraries release the GIL), and
+the output buffers are allocated once and reused.
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from SLDevicePythonWrapper import SLImage, SLError
+
+logger = logging.getLogger(__name__)
+
+METHODS = ('auto', 'sdk', 'opencv', 'separable')
+BAND_ROWS = 128
+# cv2.medianBlur only takes 16-bit input for these windows
+OPENCV_WINDOWS = (3, 5)
+
+
+def median_sdk(frame, window, out):
+    image = SLImage.Array2Frame(np.ascontiguousarray(frame))
+    output = SLImage(frame.shape[1], frame.shape[0])
+    err = image.MedianFilter(output, window)
+    if err != SLError.SL_ERROR_SUCCESS:
+        logger.error('Median filter failed with error: %s', err)
+        return None
+    out[...] = output.Frame2Array(0)
+    return out
+
+
+def median_opencv(band, window, out):
+    import cv2
+    out[...] = cv2.medianBlur(np.ascontiguousarray(band), window)
+    return out
+
+
+def _median_1d(a, window, axis):
+    """
+    Running median of window values along axis. The shifted copies go through
+    a partial bubble sort of np.minimum/np.maximum compare-exchanges, only as
+    many passes as it takes to settle the middle value. That is a few
+    whole-array ops per value, where np.median over a sliding window view
+    sorts each tiny window separately.
+    """
+    half = window // 2
+    n = a.shape[axis]
+    # Edge rows/columns repeat so the output keeps its shape
+    pad = [(0, 0)] * a.ndim
+    pad[axis] = (half, half)
+    padded = np.pad(a, pad, mode='edge')
+    values = [np.take(padded, np.arange(i, i + n), axis=axis) for i in range(window)]
+    low = np.empty_like(a)
+    for settled in range(half + 1):
+        for i in range(window - 1 - settled):
+            np.minimum(values[i], values[i + 1], out=low)
+            np.maximum(values[i], values[i + 1], out=values[i + 1])
+            values[i], low = low, values[i]
+    return values[window - 1 - half]
+
+
+def median_separable(band, window, out):
+    rows = _median_1d(band, window, axis=1)
+    out[...] = _median_1d(rows, window, axis=0)
+    return out
+
+
+_FILTERS = {
+    'sdk': median_sdk,
+    'opencv': median_opencv,
+    'separable': median_separable,
+}
+
+
+class Denoiser:
+    def __init__(self, window=3, method='auto', workers=None, band_rows=BAND_ROWS):
+        if window < 3 or window % 2 == 0:
+            raise ValueError('Window must be odd and at least 3')
+        if method not in METHODS:
+            raise ValueError(f'Unknown denoise method {method!r}')
+        if method == 'auto':
+            method = 'opencv' if window in OPENCV_WINDOWS else 'separable'
+        elif method == 'opencv' and window not in OPENCV_WINDOWS:
+            raise ValueError(f'OpenCV can only median 16-bit images with windows {OPENCV_WINDOWS}')
+        self.window = window
+        self.method = method
+        self.band_rows = band_rows
+        self.workers = workers or os.cpu_count() or 1
+        self._pool = ThreadPoolExecutor(max_workers=self.workers) if self.workers > 1 else None
+        # Two outputs, used in turn, so the caller can hold the last result while the next is made
+        self._outputs = []
+        self._next = 0
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+
+    def _output(self, frame):
+        if not self._outputs or self._outputs[0].shape != frame.shape or self._outputs[0].dtype != frame.dtype:
+            self._outputs = [np.empty_like(frame), np.empty_like(frame)]
+        out = self._outputs[self._next]
+        self._next ^= 1
+        return out
+
+    def bands(self, rows):
+        """(start, stop, halo_start, halo_stop) for each band of rows"""
+        halo = self.window // 2
+        return [
+            (a, min(a + self.band_rows, rows), max(a - halo, 0), min(a + self.band_rows + halo, rows))
+            for a in range(0, rows, self.band_rows)
+        ]
+
+    def _run_band(self, frame, out, band):
+        a, b, ha, hb = band
+        filtered = np.empty((hb - ha, frame.shape[1]), dtype=frame.dtype)
+        _FILTERS[self.method](frame[ha:hb], self.window, filtered)
+        out[a:b] = filtered[a - ha:b - ha]
+
+    def apply(self, frame, out=None):
+        """
+        Denoised copy of frame, in out if given or else in one of the reused
+        buffers. None if the SDK filter fails.
+        """
+        if out is None:
+            out = self._output(frame)
+        if self.method == 'sdk':
+            return median_sdk(frame, self.window, out)
+
+        bands = self.bands(frame.shape[0])
+        if self._pool is None or len(bands) == 1:
+            for band in bands:
+                self._run_band(frame, out, band)
+        else:
+            for future in [self._pool.submit(self._run_band, frame, out, band) for band in bands]:
+                future.result()
+        return out
@@ -0,0 +1,173 @@
+"""
+Exposure ladder: the same scene at a list of exposure times, in one session.
+
+The camera stays open and in seq_mode for the whole ladder. Frames for each
+exposure come from one hardware-timed sequence, so the only work between
+exposures is a SetExposureTime. The total time therefore approaches the sum of
+the exposures. The ETA comes from the overhead measured on the steps already
+run. All frames go into a single LadderResult keyed by exposure and saved as
+one .npz file.
+"""
+import json
+import logging
+import time
+
+import numpy as np
+
+from SLDevicePythonWrapper import (
+    ExposureModes,
+    SLImage,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EXPOSURES = [10, 20, 50, 100, 200, 300, 400, 500, 1000, 2000, 5000, 10000]
+
+# Starting guesses for the ETA, replaced by measurements after the first step
+DEFAULT_STEP_OVERHEAD = 0.2     # s per exposure change (stream stop/start, trigger)
+DEFAULT_FRAME_OVERHEAD = 0.1    # s per frame (readout and transfer)
+
+
+def plan_ladder(exposures, frames_per_exposure=1):
+    """
+    Order the ladder to minimise reconfiguration. Duplicate exposures are
+    merged so each exposure time is set once, and steps run shortest first so
+    early frames arrive quickly. Returns a list of (exposure_ms, frames).
+    """
+    if isinstance(frames_per_exposure, int):
+        frames = {e: frames_per_exposure for e in exposures}
+    else:
+        frames = {}
+        for e, n in zip(exposures, frames_per_exposure):
+            frames[e] = frames.get(e, 0) + n
+    return [(e, frames[e]) for e in sorted(frames)]
+
+
+class OverheadModel:
+    """Running mean of the time spent outside the exposures themselves"""
+
+    def __init__(self):
+        self.step_overhead = DEFAULT_STEP_OVERHEAD
+        self.frame_overhead = DEFAULT_FRAME_OVERHEAD
+        self._steps = 0
+        self._frames = 0
+
+    def update(self, reconfigure_time, sequence_time, exposure, frames):
+        self._steps += 1
+        self.step_overhead += (reconfigure_time - self.step_overhead) / self._steps
+
+        readout = max(sequence_time - frames * exposure / 1000, 0.0)
+        self._frames += frames
+        self.frame_overhead += (readout - frames * self.frame_overhead) / self._frames
+
+    def estimate(self, steps):
+        """Seconds needed to run the given (exposure_ms, frames) steps"""
+        return sum(
+            self.step_overhead + n * (e / 1000 + self.frame_overhead)
+            for e, n in steps
+        )
+
+
+class LadderResult:
+    """Frames of a ladder keyed by exposure, each a (frames, ydim, xdim) uint16 stack"""
+
+    def __init__(self, metadata=None):
+        self.frames = {}
+        self.metadata = metadata or {}
+
+    def add(self, exposure, stack):
+        self.frames[exposure] = stack
+
+    def exposures(self):
+        return sorted(self.frames)
+
+    def __getitem__(self, exposure):
+        return self.frames[exposure]
+
+    def __len__(self):
+        return len(self.frames)
+
+    def save(self, filename):
+        arrays = {f'exp_{e}': self.frames[e] for e in self.exposures()}
+        with open(filename, 'wb') as f:
+            np.savez(f, metadata=json.dumps(self.metadata), **arrays)
+
+    @classmethod
+    def load(cls, filename):
+        with np.load(filename) as data:
+            result = cls(json.loads(str(data['metadata'])))
+            for key in data.files:
+                if key.startswith('exp_'):
+                    result.add(int(key[4:]), data[key])
+        return result
+
+
+class ExposureLadder:
+    def __init__(self, engine, xdim, ydim, exposures=None, frames_per_exposure=1, dds=False):
+        self.engine = engine
+        self.xdim, self.ydim = xdim, ydim
+        self.dds = dds
+        self.plan = plan_ladder(exposures or DEFAULT_EXPOSURES, frames_per_exposure)
+        self.overhead = OverheadModel()
+        self._stop = False
+
+    def eta(self, step=0):
+        """Seconds left from the given step to the end of the ladder"""
+        return self.overhead.estimate(self.plan[step:])
+
+    def stop(self):
+        self._stop = True
+
+    def run(self, progress=None):
+        """
+        Run the planned ladder. progress(step, total, exposure, eta) is called
+        before each step. Expects the camera open and not streaming. Returns a
+        LadderResult, which is partial if a step failed or stop() was called.
+        """
+        result = LadderResult({
+            'plan': self.plan,
+            'dds': self.dds,
+            'started': time.time(),
+        })
+        stack = SLImage(self.xdim, self.ydim, max(n for _, n in self.plan))
+        start = time.perf_counter()
+
+        for step, (exposure, frames) in enumerate(self.plan):
+            if self._stop:
+                logger.info('Ladder stopped after %d of %d steps', step, len(self.plan))
+                break
+            eta = self.eta(step)
+            logger.info('Ladder step %d/%d: %d x %dms, ETA %.1fs', step + 1, len(self.plan), frames, exposure, eta)
+            if progress is not None:
+                progress(step, len(self.plan), exposure, eta)
+
+            t0 = time.perf_counter()
+            if step == 0:
+                ok = self.engine.configure(ExposureModes.seq_mode, exposure, self.dds)
+            else:
+                ok = self.engine.set_exposure(exposure)
+            if not ok:
+                break
+
+            t1 = time.perf_counter()
+            received = self.engine.capture_sequence(stack, exposure, frames)
+            t2 = time.perf_counter()
+            if not received:
+                break
+
+            result.add(exposure, np.stack([stack.Frame2Array(i) for i in range(received)]))
+            self.overhead.update(t1 - t0, t2 - t1, exposure, frames)
+
+        elapsed = time.perf_counter() - start
+        exposure_total = sum(e * len(result[e]) for e in result.exposures()) / 1000
+        result.metadata.update({
+            'elapsed': elapsed,
+            'exposure_total': exposure_total,
+            'step_overhead': self.overhead.step_overhead,
+            'frame_overhead': self.overhead.frame_overhead,
+        })
+        logger.info(
+            'Ladder finished in %.2fs for %.2fs of exposure (%d of %d steps)',
+            elapsed, exposure_total, len(result), len(self.plan)
+        )
+        return result
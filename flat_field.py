@@ -0,0 +1,116 @@
+"""
+Flat-field (gain map) calibration from our own detector.
+
+M frames of a uniform flat are streamed through a small reusable frame buffer
+a few at a time. Each frame is dark-corrected against a dark loaded once up
+front and added into a float64 running sum, so memory stays the same for any
+M. The mean flat, with the same dark offset that capture_image adds, is what
+GainCorrection expects. It is flagged with SetAsGainMap and saved as a TIFF.
+The normalised gain (mean flat / its mean) is kept on the result for NumPy
+use and to report the pixel response non-uniformity.
+"""
+import logging
+import time
+
+import numpy as np
+
+from SLDevicePythonWrapper import (
+    ExposureModes,
+    SLImage,
+    SLError,
+)
+
+from acquisition import SATURATION_LEVEL
+
+logger = logging.getLogger(__name__)
+
+# Added back after dark subtraction so noise below the dark isn't clipped; matches capture_image
+DARK_OFFSET = 50
+# Frames per hardware sequence; the buffer holds this many whatever M is
+CHUNK_FRAMES = 4
+
+
+class FlatFieldResult:
+    def __init__(self, mean, frames, saturated, exposure):
+        self.mean = mean            # (ydim, xdim) float64 dark-corrected mean flat
+        self.frames = frames
+        self.saturated = saturated  # pixels saturated in at least one frame
+        self.exposure = exposure
+
+    @property
+    def gain(self):
+        """Relative gain per pixel, mean 1"""
+        level = self.mean.mean()
+        return (self.mean / level).astype(np.float32) if level > 0 else np.ones(self.mean.shape, np.float32)
+
+    def prnu(self):
+        """Pixel response non-uniformity, percent"""
+        return float(self.gain.std() * 100)
+
+    def gain_image(self, dark_offset=DARK_OFFSET):
+        """Mean flat as an SLImage flagged as a gain map, or None on error"""
+        flat = np.clip(np.rint(self.mean) + dark_offset, 0, 2**16 - 1).astype(np.uint16)
+        image = SLImage.Array2Frame(flat)
+        err = image.SetAsGainMap()
+        if err != SLError.SL_ERROR_SUCCESS:
+            logger.error('Failed to set gain map with error: %s', err)
+            return None
+        return image
+
+
+class FlatFieldCalibration:
+    def __init__(self, engine, xdim, ydim, exposure, num_frames, dark, chunk=CHUNK_FRAMES):
+        self.engine = engine
+        self.xdim, self.ydim = xdim, ydim
+        self.exposure = exposure
+        self.num_frames = num_frames
+        # Converted once so each frame is a single in-place subtract
+        self.dark = np.asarray(dark, dtype=np.float64)
+        self.chunk = min(chunk, num_frames)
+        self._stop = False
+
+    def stop(self):
+        self._stop = True
+
+    def run(self, progress=None):
+        """
+        Capture and accumulate the flats. progress(done, total) is called
+        after each chunk. Returns a FlatFieldResult, or None if nothing was
+        captured. Expects the camera open and not streaming.
+        """
+        if not self.engine.configure(ExposureModes.seq_mode, self.exposure):
+            return None
+
+        buffer = SLImage(self.xdim, self.ydim, self.chunk)
+        total = np.zeros((self.ydim, self.xdim), dtype=np.float64)
+        corrected = np.empty_like(total)
+        saturated = np.zeros((self.ydim, self.xdim), dtype=bool)
+
+        done = 0
+        start = time.perf_counter()
+        while done < self.num_frames and not self._stop:
+            n = min(self.chunk, self.num_frames - done)
+            received = self.engine.capture_sequence(buffer, self.exposure, n)
+            if not received:
+                break
+            for i in range(received):
+                frame = buffer.Frame2Array(i)
+                saturated |= frame >= SATURATION_LEVEL
+                np.subtract(frame, self.dark, out=corrected)
+                total += corrected
+            done += received
+            if progress is not None:
+                progress(done, self.num_frames)
+
+        if done == 0:
+            logger.error('Flat-field calibration captured no frames')
+            return None
+        total /= done
+        result = FlatFieldResult(total, done, np.count_nonzero(saturated), self.exposure)
+        logger.info(
+            'Flat field: %d x %dms in %.1fs, mean %.0f ADU, PRNU %.2f%%, %d saturated pixels',
+            done, self.exposure, time.perf_counter() - start, total.mean(), result.prnu(), result.saturated
+        )
+        if result.saturated:
+            logger.warning('Flat has %d saturated pixels, use a shorter exposure or dimmer source', result.saturated)
+        return result
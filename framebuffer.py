@@ -0,0 +1,74 @@
+"""
+The frame on screen and its display adjustments.
+
+Each frame is held as one owned array. Frame2Array's result is adopted as is
+when it owns its data, and is only copied when it is a view into an SLImage
+that will be read into again. The raw frame is never modified after that, so
+anything holding it (denoise, quantification, a save) sees a stable image.
+
+Invert and contrast write into a scratch buffer, which is allocated once
+and reused for every frame of the same shape. The first adjustment reads
+the raw frame and later ones work in place, so adjustments allocate nothing
+per click. Reset just points the display back at the raw frame. Orientation
+for the view is np.rot90, which is a view, not a copy.
+"""
+import numpy as np
+
+# 14-bit sensor full scale, what invert reflects about
+FULL_SCALE = 2**14
+
+
+class FrameBuffer:
+    def __init__(self):
+        self.raw = None
+        self._scratch = None
+        self._adjusted = False
+        self.inverted = False
+        # Bumped on every change so caches keyed on the frame know to rebuild
+        self.version = 0
+
+    @property
+    def current(self):
+        """The frame as displayed, adjustments included"""
+        return self._scratch if self._adjusted else self.raw
+
+    def set(self, array):
+        """Make array the current frame, taking ownership where possible"""
+        if array is not None and not (array.flags.owndata and array.flags.writeable):
+            array = array.copy()
+        self.raw = array
+        self._adjusted = False
+        self.inverted = False
+        self.version += 1
+
+    def reset(self):
+        """Drop display adjustments"""
+        self._adjusted = False
+        self.inverted = False
+        self.version += 1
+
+    def _target(self):
+        """Buffer an adjustment writes into, and the one it reads from"""
+        source = self.current
+        if self._scratch is None or self._scratch.shape != source.shape or self._scratch.dtype != source.dtype:
+            self._scratch = np.empty_like(source)
+        return self._scratch, source
+
+    def invert(self, full_scale=FULL_SCALE):
+        out, source = self._target()
+        # Kept in the frame's own dtype, written into the scratch buffer
+        np.subtract(out.dtype.type(full_scale), source, out=out)
+        self._adjusted = True
+        self.inverted = not self.inverted
+        self.version += 1
+
+    def apply(self, fn):
+        """Run fn(source, out) for an adjustment that writes into out, e.g. CLAHE"""
+        out, source = self._target()
+        fn(source, out)
+        self._adjusted = True
+        self.version += 1
+
+    def oriented(self):
+        """Current frame turned for the image view, as a view"""
+        return np.rot90(self.current)
@@ -1,11 +1,14 @@
 import sys
 import time
 import os
+import logging
+import threading
+
+import importlib
 
 import numpy as np
-import cv2
 
-from PySide6.QtCore import Qt, Signal, QTranslator, QLocale, QLibraryInfo
+from PySide6.QtCore import Qt, Signal, QTranslator, QLocale, QLibraryInfo, QTimer, QObject, QThread
 from PySide6.QtWidgets import (
     QMainWindow, 
     QApplication, 
@@ -18,7 +21,15 @@ from PySide6.QtWidgets import (
     QDialog,
     QDialogButtonBox,
     QCheckBox,
-    QFileDialog
+    QFileDialog,
+    QDockWidget,
+    QTableWidget,
+    QTableWidgetItem,
+    QHeaderView,
+    QComboBox,
+    QSpinBox,
+    QProgressDialog,
+    QInputDialog,
 )
 from PySide6.QtGui import (
     QIntValidator, 
@@ -34,11 +45,51 @@ from SLDevicePythonWrapper import (
     ExposureModes,
     SLImage,
     SLBufferInfo,
+    BinningModes,
+)
+
+from instrumentation import metrics, STAGES
+from log_config import setup_logging, RateLimitedLogger
+from telemetry import TelemetrySampler
+from dark_library import DarkLibrary
+from catalogue import Catalogue, CAPTURE, BURST, DARK, LADDER, HDR, DEFECT_MAP, GAIN_MAP, CUMULATIVE
+from flat_field import FlatFieldCalibration, DARK_OFFSET
+from housekeeping import Housekeeper, DELETE, ARCHIVE
+from acquisition import (
+    AcquisitionEngine,
+    SOFTWARE_TRIGGER,
+    SOFTWARE_SERIES,
+    FIRMWARE_AVERAGE,
+    HOT_SEQUENCE,
+    EXTERNAL_TRIGGER,
+    HOT_EDGE_TRIGGER,
+    HOT_DURATION_TRIGGER,
+    SEQUENCE,
+    EXPOSURE_MODES,
+    BURST_MODES,
+    READ_MARGIN_MS,
+    SATURATION_LEVEL,
 )
+from exposure_ladder import ExposureLadder, LadderResult, DEFAULT_EXPOSURES
+from storage import Storage, CAPTURES, DARKS, GAINS, DEFECTS
+from framebuffer import FrameBuffer
+from bufferpool import BufferPool, BufferCache
+from auto_exposure import AutoExposure
+
+logger = logging.getLogger('gui_test')
+# Per-frame messages, throttled so xfps streaming can't flood the log
+frame_log = RateLimitedLogger(logger, interval=1.0)
 
 deviceInterface = DeviceInterface.USB
+# Auto-exposure previews are read 2x2 binned. Binned reads average each block,
+# so levels keep the full-resolution ADU scale at a quarter of the transfer.
+PREVIEW_BINNING = BinningModes.x22
+# pyqtgraph's colour-map menu imports matplotlib when an ImageView is built, so
+# import it in the background and build the view once it has landed
+VIEW_MODULES = ('matplotlib.pyplot',)
+# Only needed by individual actions; imported in the background once the window is up
+DEFERRED_MODULES = ('cv2', 'imageio.v2', 'hdr', 'defect_map', 'denoise')
 basedir = os.path.dirname(__file__)
-imageSaveDirectory = os.path.join(basedir, "Images") 
 
 try:
     from ctypes import windll 
@@ -92,6 +143,236 @@ class ExposureControl(QWidget):
             value = int(self.input.text())
             self.exposureChanged.emit(value)
 
+class AcquisitionModeControl(QWidget):
+    modeChanged = Signal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+
+        layout = QHBoxLayout()
+
+        # Mode
+        self.mode_box = QComboBox(self)
+        self.mode_box.addItem(self.tr('Software Trigger'), SOFTWARE_TRIGGER)
+        self.mode_box.addItem(self.tr('Software Trigger Series (Pipelined)'), SOFTWARE_SERIES)
+        self.mode_box.addItem(self.tr('Firmware Average (Auto-Trigger)'), FIRMWARE_AVERAGE)
+        self.mode_box.addItem(self.tr('Hot Sequence Burst'), HOT_SEQUENCE)
+        self.mode_box.addItem(self.tr('External Trigger Burst'), EXTERNAL_TRIGGER)
+        self.mode_box.addItem(self.tr('Hot Edge Trigger Burst'), HOT_EDGE_TRIGGER)
+        self.mode_box.addItem(self.tr('Hot Duration Trigger Burst'), HOT_DURATION_TRIGGER)
+        self.mode_box.currentIndexChanged.connect(self.emit_mode)
+        layout.addWidget(self.mode_box)
+
+        # Frames averaged on the detector, or frames per burst or series
+        self.frames_label = QLabel(self.tr('Frames:'))
+        layout.addWidget(self.frames_label)
+        self.frames_input = QSpinBox(self)
+        self.frames_input.setRange(1, 256)
+        self.frames_input.setValue(4)
+        layout.addWidget(self.frames_input)
+
+        # Auto-trigger threshold
+        self.threshold_label = QLabel(self.tr('Trigger Threshold (ADU):'))
+        layout.addWidget(self.threshold_label)
+        self.threshold_input = QSpinBox(self)
+        self.threshold_input.setRange(0, 2**14 - 1)
+        self.threshold_input.setValue(0)
+        layout.addWidget(self.threshold_input)
+
+        # Force trigger
+        self.force_button = QPushButton(self.tr('Force Trigger'))
+        self.force_button.setEnabled(False)
+        layout.addWidget(self.force_button)
+
+        self.setLayout(layout)
+        self.emit_mode()
+
+    def mode(self):
+        return self.mode_box.currentData()
+
+    def emit_mode(self):
+        self.set_streaming(False)
+        self.modeChanged.emit(self.mode())
+
+    def set_streaming(self, streaming):
+        # Settings are applied when the stream starts, so lock them while it runs
+        self.mode_box.setEnabled(not streaming)
+        firmware = self.mode() == FIRMWARE_AVERAGE
+        multi_frame = firmware or self.mode() in BURST_MODES or self.mode() == SOFTWARE_SERIES
+        self.frames_input.setEnabled(multi_frame and not streaming)
+        self.threshold_input.setEnabled(firmware and not streaming)
+        self.force_button.setEnabled(firmware and streaming)
+
+
+class LadderWorker(QObject):
+    progress = Signal(int, int, int, float)
+    finished = Signal(object)
+
+    def __init__(self, ladder):
+        super().__init__()
+        self.ladder = ladder
+
+    def run(self):
+        result = self.ladder.run(progress=self.progress.emit)
+        self.finished.emit(result)
+
+
+class HdrWorker(QObject):
+    finished = Signal(object)
+
+    def __init__(self, ladder_path, dark_library):
+        super().__init__()
+        self.ladder_path = ladder_path
+        self.dark_library = dark_library
+
+    def run(self):
+        import hdr
+        try:
+            ladder = LadderResult.load(self.ladder_path)
+            darks = hdr.load_darks(self.dark_library, ladder.exposures(), ladder.metadata.get('temperature'))
+            start = time.perf_counter()
+            radiance = hdr.merge_ladder(ladder.frames, darks)
+            logger.info('Merged %d exposures in %.3fs', len(ladder), time.perf_counter() - start)
+            paths = hdr.save_hdr(radiance, os.path.splitext(self.ladder_path)[0] + '_hdr')
+        except Exception:
+            logger.exception('Failed to merge %s', self.ladder_path)
+            self.finished.emit(None)
+            return
+        logger.info('Saved HDR image to %s', paths[0])
+        self.finished.emit((radiance, paths[0], bool(darks), ladder.metadata, len(ladder)))
+
+
+class FlatFieldWorker(QObject):
+    progress = Signal(int, int)
+    finished = Signal(object)
+
+    def __init__(self, calibration):
+        super().__init__()
+        self.calibration = calibration
+
+    def run(self):
+        self.finished.emit(self.calibration.run(progress=self.progress.emit))
+
+
+class DenoiseWorker(QObject):
+    finished = Signal(object, int)
+
+    def __init__(self):
+        super().__init__()
+        self.denoiser = None
+
+    def process(self, frame, frame_number, window):
+        if self.denoiser is None or self.denoiser.window != window:
+            from denoise import Denoiser
+            if self.denoiser is not None:
+                self.denoiser.close()
+            self.denoiser = Denoiser(window)
+        with metrics.span('denoise', frame_number):
+            result = self.denoiser.apply(frame)
+        self.finished.emit(result, frame_number)
+
+    def close(self):
+        if self.denoiser is not None:
+            self.denoiser.close()
+
+
+class CumulativeWorker(QObject):
+    progress = Signal(int, object, object, float)
+    finished = Signal(object)
+
+    def __init__(self, cumulative):
+        super().__init__()
+        self.cumulative = cumulative
+
+    def run(self):
+        # The sum keeps growing on this thread, so the GUI gets a copy of it
+        try:
+            result = self.cumulative.run(
+                progress=lambda frames, total, snr, level: self.progress.emit(frames, total.copy(), snr, level)
+            )
+        except Exception:
+            logger.exception('Cumulative exposure failed')
+            self.finished.emit(None)
+            return
+        self.finished.emit(result)
+
+
+class SeriesWorker(QObject):
+    frame_ready = Signal(object, int)
+    finished = Signal(int, float)
+
+    def __init__(self, pipeline, num_frames, first_frame):
+        super().__init__()
+        self.pipeline = pipeline
+        self.num_frames = num_frames
+        self.first_frame = first_frame
+        # Frames arriving while the GUI is still drawing the last one are skipped
+        self.display_pending = False
+        pipeline.display = self.display
+
+    def display(self, array, frame):
+        if not self.display_pending:
+            self.display_pending = True
+            self.frame_ready.emit(array, frame)
+
+    def run(self):
+        read, elapsed = self.pipeline.run(self.num_frames, self.first_frame)
+        self.finished.emit(read, elapsed)
+
+
+class HousekeepingWorker(QObject):
+    progress = Signal(int, int)
+    finished = Signal(int, int)
+
+    def __init__(self, housekeeper):
+        super().__init__()
+        self.housekeeper = housekeeper
+
+    def run(self):
+        done, failed = self.housekeeper.run(progress=self.progress.emit)
+        self.finished.emit(done, failed)
+
+
+def preload(modules):
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            logger.exception('Could not import %s', name)
+
+
+class StartupWorker(QObject):
+    view_ready = Signal()
+    connected = Signal(object)
+    finished = Signal()
+
+    def __init__(self, catalogue, captures):
+        super().__init__()
+        self.catalogue = catalogue
+        self.captures = captures
+
+    def run(self):
+        preload(VIEW_MODULES)
+        self.view_ready.emit()
+
+        # Constructing the device loads the native driver, which is slow
+        start = time.perf_counter()
+        try:
+            device = SLDevice(deviceInterface)
+        except Exception:
+            logger.exception('Failed to construct device')
+            device = None
+        else:
+            logger.info('Device ready in %.2fs', time.perf_counter() - start)
+        self.connected.emit(device)
+
+        # Warm the modules that only some actions need so first use doesn't stall
+        preload(DEFERRED_MODULES)
+
+        self.catalogue.import_legacy(self.captures)
+        self.finished.emit()
+
+
 class DeleteDialog(QDialog):
     def __init__(self, target):
         super().__init__()
@@ -154,7 +435,189 @@ class DarkDialog(QDialog):
             self.exposureChanged.emit(value)
 
 
+class TimingStatsPanel(QWidget):
+    """Rolling p50/p95/max per stage from the shared instrumentation ring"""
+    columns = ('Count', 'p50 (ms)', 'p95 (ms)', 'Max (ms)')
+
+    def __init__(self, window=500, refresh_ms=500, parent=None):
+        super().__init__(parent)
+        self.window = window
+
+        layout = QVBoxLayout()
+
+        self.table = QTableWidget(0, len(self.columns), self)
+        self.table.setHorizontalHeaderLabels([self.tr(c) for c in self.columns])
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        layout.addWidget(self.table)
+
+        self.setLayout(layout)
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(refresh_ms)
+
+    def refresh(self):
+        if not self.isVisible():
+            return
+        stats = metrics.stats(window=self.window)
+        # Known stages in pipeline order, then anything else that was recorded
+        stages = [s for s in STAGES if s in stats] + [s for s in stats if s not in STAGES]
+
+        self.table.setRowCount(len(stages))
+        self.table.setVerticalHeaderLabels(stages)
+        for row, stage in enumerate(stages):
+            s = stats[stage]
+            values = (str(s['count']), f"{s['p50']:.2f}", f"{s['p95']:.2f}", f"{s['max']:.2f}")
+            for col, value in enumerate(values):
+                self.table.setItem(row, col, QTableWidgetItem(value))
+
+
+class QuantificationPanel(QWidget):
+    """Lane and band ROIs on the image view with their integrated densities"""
+    columns = ('Density', 'Background', 'Area')
+    pens = ('y', 'c', 'm', 'g', 'r', 'b', 'w')
+
+    def __init__(self, window, parent=None):
+        super().__init__(parent)
+        from quantification import Quantifier
+        self.window = window
+        self.quantifier = Quantifier()
+        # Each entry is [name, roi, is_lane]
+        self.rois = []
+
+        layout = QVBoxLayout()
+
+        buttons = QHBoxLayout()
+        for text, slot in (
+            (self.tr('Add Lane'), lambda: self.add_roi(lane=True)),
+            (self.tr('Add Band'), lambda: self.add_roi(lane=False)),
+            (self.tr('Clear'), self.clear),
+            (self.tr('Export CSV'), self.export),
+        ):
+            button = QPushButton(text)
+            button.clicked.connect(slot)
+            buttons.addWidget(button)
+        layout.addLayout(buttons)
+
+        self.table = QTableWidget(0, len(self.columns), self)
+        self.table.setHorizontalHeaderLabels([self.tr(c) for c in self.columns])
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        layout.addWidget(self.table)
+
+        self.plot = pg.PlotWidget()
+        self.plot.setLabel('bottom', self.tr('Row'))
+        self.plot.setLabel('left', self.tr('Mean intensity'))
+        self.plot.addLegend()
+        self.curves = {}
+        layout.addWidget(self.plot)
+
+        self.setLayout(layout)
+
+    def set_frame(self, frame):
+        # Measured on the raw frame, whatever adjustments the display shows
+        self.quantifier.set_frame(frame, self.window.frame_integral())
+        self.refresh()
+
+    def roi_rect(self, roi):
+        return self.quantifier.integral.clip(self.window.roi_rect(roi))
+
+    def add_roi(self, lane):
+        if self.quantifier.integral is None:
+            logger.warning('Capture or load an image before adding ROIs')
+            return
+        height, width = self.quantifier.integral.shape
+        count = sum(1 for entry in self.rois if entry[2] == lane) + 1
+        name = self.tr('Lane %d') % count if lane else self.tr('Band %d') % count
+        # Lanes run the height of the image; new ROIs are staggered so they don't stack
+        offset = 20 * (len(self.rois) % 10)
+        if lane:
+            roi = pg.RectROI([offset, 0], [40, height], pen=self.pens[len(self.rois) % len(self.pens)])
+        else:
+            roi = pg.RectROI([offset, height // 2 + offset], [40, 20], pen='r')
+        self.window.image_view.getView().addItem(roi)
+        row = len(self.rois)
+        self.rois.append([name, roi, lane])
+        self.table.setRowCount(len(self.rois))
+        self.table.setVerticalHeaderLabels([entry[0] for entry in self.rois])
+        if lane:
+            self.curves[row] = self.plot.plot(name=name, pen=self.pens[row % len(self.pens)])
+        roi.sigRegionChanged.connect(lambda _, row=row: self.update_roi(row))
+        self.update_roi(row)
+
+    def clear(self):
+        for _, roi, _ in self.rois:
+            self.window.image_view.getView().removeItem(roi)
+        self.rois = []
+        self.curves = {}
+        self.plot.clear()
+        self.table.setRowCount(0)
+
+    def set_row(self, row, density, background, area):
+        values = (f'{density:.0f}', f'{background:.1f}', str(area))
+        for col, value in enumerate(values):
+            self.table.setItem(row, col, QTableWidgetItem(value))
+
+    def update_roi(self, row):
+        """Re-measure one ROI as it moves; a few integral-image lookups"""
+        _, roi, lane = self.rois[row]
+        rect = self.roi_rect(roi)
+        m = self.quantifier.measure(rect)
+        self.set_row(row, m['density'], m['background'], m['area'])
+        if lane:
+            y0, y1, x0, x1 = rect
+            self.curves[row].setData(np.arange(y0, y1), self.quantifier.lane_profile((x0, x1), y0, y1))
+
+    def refresh(self):
+        """Re-measure everything against a new frame"""
+        if not self.rois:
+            return
+        rects = np.array([self.roi_rect(roi) for _, roi, _ in self.rois])
+        m = self.quantifier.measure_many(rects)
+        for row in range(len(self.rois)):
+            self.set_row(row, m['density'][row], m['background'][row], m['area'][row])
+
+        lanes = [row for row, entry in enumerate(self.rois) if entry[2]]
+        if not lanes:
+            return
+        # One reduceat pass over the rows the lanes cover
+        y0, y1 = rects[lanes, 0].min(), rects[lanes, 1].max()
+        try:
+            profiles = self.quantifier.lane_profiles(rects[lanes][:, 2:], y0, y1)
+        except ValueError:
+            # Overlapping lanes can't share a pass, profile them one at a time
+            for row in lanes:
+                self.update_roi(row)
+            return
+        for row, profile in zip(lanes, profiles):
+            r0, r1 = rects[row, :2]
+            self.curves[row].setData(np.arange(r0, r1), profile[r0 - y0:r1 - y0])
+
+    def export(self):
+        from quantification import export_csv
+        if not self.rois:
+            return
+        path, _ = QFileDialog.getSaveFileName(
+            self,
+            self.tr('Export Band Densities'),
+            str(self.window.storage.base / 'band_densities.csv'),
+            self.tr('CSV Files (*.csv)')
+        )
+        if not path:
+            return
+        rects = [self.roi_rect(roi) for _, roi, _ in self.rois]
+        try:
+            export_csv(path, [entry[0] for entry in self.rois], rects, self.quantifier.measure_many(rects))
+        except OSError:
+            logger.exception('Failed to export band densities to %s', path)
+            return
+        logger.info('Exported band densities to %s', path)
+
+
 class MainWindow(QMainWindow):
+    denoise_requested = Signal(object, int, int)
+
     def __init__(self):
         super().__init__()
 
@@ -175,23 +638,56 @@ class MainWindow(QMainWindow):
         self.camera_open = False
         self.streaming = False
 
-        # Identify device
-        self.device = SLDevice(deviceInterface)
+        # Identify device; built on a worker thread once the window is up, see connect_device
+        self.device = None
+        # Held for every device call so the telemetry sampler never interleaves with a readout
+        self.device_lock = threading.Lock()
+        self.engine = None
+        self.acquisition_mode = SOFTWARE_TRIGGER
+        self.telemetry = None
+        self.current_temperature = None
+        # The wrapper exposes no serial number, the interface is the best device identity available
+        self.device_id = getattr(deviceInterface, 'name', str(deviceInterface))
+        # Roots for each kind of file, see storage for how to move them
+        self.storage = Storage(on_moved=self.file_moved)
+        self.catalogue = Catalogue(self.storage.base)
+        # Older versions kept the defect and gain maps with the darks, which "Delete all dark images" empties
+        self.catalogue.relocate(self.storage.adopt(DEFECTS, 'defect_map.*'))
+        self.catalogue.relocate(self.storage.adopt(GAINS, 'gain_map_*'))
+        self.dark_library = DarkLibrary(self.storage.folder(DARKS), self.catalogue)
         self.exposureTime = 10
         self.exposureMode = ExposureModes.seq_mode
         self.dds = False
         self.frame_count = 0
-        self.current_img = None
+        # Owns the frame on screen, see current_img
+        self.frame = FrameBuffer()
+        # Integral image of the raw frame, see frame_integral
+        self.integral = None
+        self.integral_source = None
+        self.stats_roi = None
+        self.defect_map = None
+        self.gain_map = None
         self.last_save = None
+        self.housekeeping_thread = None
+        self.startup_thread = None
+        self.denoise_thread = None
+        self.hdr_thread = None
+        self.denoise_busy = False
+        self.denoise_pending = None
         self.xdim, self.ydim = 1031, 1536 # Hard code sensor resolution, not ideal if there's any chance of using different sensors
+        # Every long-lived SLImage is checked out of here, see bufferpool
+        self.pool = BufferPool(self.xdim, self.ydim)
+        # Darks read from disk, keyed by path and modification time so a recaptured dark is reread
+        self.dark_cache = BufferCache(self.pool, 'dark')
         # note: WB imager given to Belinda in York has xdim 1031 vs 1030 for ones in london - dead columns? 
         # --------------- Central Widget --------------
                 
         layout = QVBoxLayout()
 
         # Camera on
-        self.camera_on_button = QPushButton(self.tr('Camera off'))
+        self.camera_on_button = QPushButton(self.tr('Connecting...'))
         self.camera_on_button.setCheckable(True)
+        self.camera_on_button.setEnabled(False)
         layout.addWidget(self.camera_on_button)
         self.camera_on_button.clicked.connect(self.on_button_toggled)
 
@@ -204,6 +700,18 @@ class MainWindow(QMainWindow):
         self.exposure_control.exposureChanged.connect(self.set_exposure_time)
         layout.addWidget(self.exposure_control)
 
+        # Auto exposure
+        self.auto_exposure_button = QPushButton(self.tr('Auto Exposure'))
+        self.auto_exposure_button.setEnabled(False)
+        self.auto_exposure_button.clicked.connect(self.auto_exposure)
+        layout.addWidget(self.auto_exposure_button)
+
+        # Acquisition mode
+        self.mode_control = AcquisitionModeControl(parent=self)
+        self.mode_control.modeChanged.connect(self.set_acquisition_mode)
+        self.mode_control.force_button.clicked.connect(lambda: self.engine.force_trigger())
+        layout.addWidget(self.mode_control)
+
         # Streaming
         self.stream_button = QPushButton(self.tr('Start stream'))
         self.stream_button.setEnabled(False)
@@ -219,18 +727,46 @@ class MainWindow(QMainWindow):
 
         # Multi-capture
         self.multi_capture_button = QPushButton(self.tr("Capture Sequence of Images"))
-        self.multi_capture_button.setEnabled(True)
+        self.multi_capture_button.setEnabled(False)
         self.multi_capture_button.clicked.connect(self.multi_capture_button_clicked)
         layout.addWidget(self.multi_capture_button)
 
+        # Cumulative exposure; checked while a run is going, unchecking stops it
+        self.cumulative_button = QPushButton(self.tr('Cumulative Exposure'))
+        self.cumulative_button.setToolTip(self.tr('Stack dark-corrected frames at the current exposure until a target is reached'))
+        self.cumulative_button.setCheckable(True)
+        self.cumulative_button.setEnabled(False)
+        self.cumulative_button.clicked.connect(self.cumulative_button_toggled)
+        layout.addWidget(self.cumulative_button)
+        self.cumulative_thread = None
+        self.series_thread = None
+
         # Correction settings
         self.dark_subtraction_box = QCheckBox(text=self.tr('Dark Subtraction'))
         settings_layout = QHBoxLayout()
         settings_layout.addWidget(self.dark_subtraction_box)
+        self.gain_correction_box = QCheckBox(text=self.tr('Gain Correction'))
+        self.gain_correction_box.setToolTip(self.tr('Applied after dark subtraction'))
+        self.gain_correction_box.toggled.connect(self.set_gain_correction)
+        settings_layout.addWidget(self.gain_correction_box)
+        self.defect_correction_box = QCheckBox(text=self.tr('Defect Correction'))
+        self.defect_correction_box.toggled.connect(self.set_defect_correction)
+        settings_layout.addWidget(self.defect_correction_box)
+        self.denoise_box = QCheckBox(text=self.tr('Denoise'))
+        self.denoise_box.setToolTip(self.tr('Median filter the displayed image; saved files stay raw'))
+        settings_layout.addWidget(self.denoise_box)
+        self.denoise_window_input = QSpinBox(self)
+        self.denoise_window_input.setRange(3, 15)
+        self.denoise_window_input.setSingleStep(2)
+        self.denoise_window_input.setValue(3)
+        self.denoise_window_input.setPrefix(self.tr('Window '))
+        settings_layout.addWidget(self.denoise_window_input)
         layout.addLayout(settings_layout)
 
-        self.image_view = pg.ImageView(self)
-        layout.addWidget(self.image_view)
+        # Filled by build_image_view once the window is showing
+        self.image_view = None
+        self.view_layout = QVBoxLayout()
+        layout.addLayout(self.view_layout, stretch=1)
 
         # ------------------- Image Adjustments -----------------
         adj_layout = QHBoxLayout()
@@ -245,7 +781,6 @@ class MainWindow(QMainWindow):
         self.invert_button = QPushButton(self.tr('Invert'))
         self.invert_button.setEnabled(False)
         self.invert_button.clicked.connect(self.invert)
-        self.inverted = False
         adj_layout.addWidget(self.invert_button)
 
         # Highlight saturated pixels
@@ -281,9 +816,14 @@ class MainWindow(QMainWindow):
 
         empty_action = QAction(self.tr("Delete all captures"), self)
         empty_action.setStatusTip(self.tr("Deletes all captured images"))
-        empty_action.triggered.connect(lambda _: self.delete_dialog(self.tr('captured_images')))
+        empty_action.triggered.connect(lambda _: self.delete_dialog(CAPTURES))
         file_menu.addAction(empty_action)
 
+        archive_action = QAction(self.tr("Archive all captures"), self)
+        archive_action.setStatusTip(self.tr("Moves all captured images into a dated archive folder"))
+        archive_action.triggered.connect(lambda _: self.empty_captured(CAPTURES, ARCHIVE))
+        file_menu.addAction(archive_action)
+
         # Corrections
         corrections_menu = menu.addMenu(self.tr('Corrections'))
 
@@ -297,9 +837,85 @@ class MainWindow(QMainWindow):
         
         empty_dark_action = QAction(self.tr("Delete all dark images"), self)
         empty_dark_action.setStatusTip(self.tr("Deletes all dark images"))
-        empty_dark_action.triggered.connect(lambda _: self.delete_dialog(self.tr('correction_images')))
+        empty_dark_action.triggered.connect(lambda _: self.delete_dialog(DARKS))
         corrections_menu.addAction(empty_dark_action)
 
+        flat_field_action = QAction(self.tr('Calibrate Flat Field'), self)
+        flat_field_action.setStatusTip(self.tr('Average flat frames at the current exposure into a gain map'))
+        flat_field_action.triggered.connect(self.calibrate_flat_field)
+        corrections_menu.addAction(flat_field_action)
+
+        defect_map_action = QAction(self.tr('Build Defect Map'), self)
+        defect_map_action.setStatusTip(self.tr('Find hot and dead pixels from the longest dark and an optional flat image'))
+        defect_map_action.triggered.connect(self.build_defect_map)
+        corrections_menu.addAction(defect_map_action)
+
+        # Processing
+        processing_menu = menu.addMenu(self.tr('Processing'))
+
+        hdr_action = QAction(self.tr('Merge HDR from Ladder'), self)
+        hdr_action.setStatusTip(self.tr('Merge a captured exposure ladder into one HDR image'))
+        hdr_action.triggered.connect(self.merge_hdr)
+        processing_menu.addAction(hdr_action)
+
+        quantify_action = QAction(self.tr('Quantify Bands'), self)
+        quantify_action.setStatusTip(self.tr('Measure background-subtracted band densities and lane profiles'))
+        quantify_action.triggered.connect(self.show_quantification)
+        processing_menu.addAction(quantify_action)
+        self.quantification_dock = None
+
+        roi_stats_action = QAction(self.tr('ROI Statistics'), self)
+        roi_stats_action.setCheckable(True)
+        roi_stats_action.setStatusTip(self.tr('Show the mean, standard deviation and sum inside a draggable rectangle'))
+        roi_stats_action.toggled.connect(self.set_roi_stats)
+        processing_menu.addAction(roi_stats_action)
+
+        # Diagnostics
+        diagnostics_menu = menu.addMenu(self.tr('Diagnostics'))
+
+        record_metrics_action = QAction(self.tr('Record Timing Metrics'), self)
+        record_metrics_action.setCheckable(True)
+        record_metrics_action.setChecked(metrics.enabled)
+        record_metrics_action.toggled.connect(self.set_metrics_enabled)
+        diagnostics_menu.addAction(record_metrics_action)
+
+        show_stats_action = QAction(self.tr('Show Timing Stats'), self)
+        show_stats_action.triggered.connect(self.show_timing_stats)
+        diagnostics_menu.addAction(show_stats_action)
+
+        export_metrics_action = QAction(self.tr('Export Timing Metrics'), self)
+        export_metrics_action.triggered.connect(self.export_metrics)
+        diagnostics_menu.addAction(export_metrics_action)
+
+        export_gantt_action = QAction(self.tr('Export Timing Gantt Chart'), self)
+        export_gantt_action.setStatusTip(self.tr('Plot recorded stages against time, one row per thread'))
+        export_gantt_action.triggered.connect(self.export_gantt)
+        diagnostics_menu.addAction(export_gantt_action)
+
+        memory_budget_action = QAction(self.tr('Memory Budget...'), self)
+        memory_budget_action.setStatusTip(self.tr('Limit the memory held in frame buffers and caches'))
+        memory_budget_action.triggered.connect(self.set_memory_budget)
+        diagnostics_menu.addAction(memory_budget_action)
+
+        self.stats_dock = None
+
+        self.fan_action = QAction(self.tr('Detector Fan'), self)
+        self.fan_action.setCheckable(True)
+        self.fan_action.setEnabled(False)
+        self.fan_action.toggled.connect(self.set_fan)
+        diagnostics_menu.addAction(self.fan_action)
+
+        # --------------- Status Bar --------------
+        self.telemetry_label = QLabel()
+        self.statusBar().addPermanentWidget(self.telemetry_label)
+        self.memory_label = QLabel()
+        self.statusBar().addPermanentWidget(self.memory_label)
+        self.telemetry_timer = QTimer(self)
+        self.telemetry_timer.timeout.connect(self.update_telemetry_label)
+        self.telemetry_timer.timeout.connect(self.update_memory_label)
+        self.telemetry_timer.start(1000)
+        self.statusBar().showMessage(self.tr('Connecting to detector...'))
+
         # Language
         language_menu = menu.addMenu(self.tr('Language'))
 
@@ -315,11 +931,11 @@ class MainWindow(QMainWindow):
         # Load the new one
         if self.app_translator.load(f"translations/{code}.qm"):
             QApplication.instance().installTranslator(self.app_translator)
-            print(f"Switched to {code}")
+            logger.info('Switched to %s', code)
             # Retranslate the UI
             self.retranslateUi()
         else:
-            print(f'Could not load translator {code}.qm')
+            logger.warning('Could not load translator %s.qm', code)
 
     def retranslateUi(self):
         # Update dynamic UI text after switching languages
@@ -331,23 +947,25 @@ class MainWindow(QMainWindow):
         """Load your app-specific translation, e.g. de.qm, fr.qm"""
         if self.app_translator.load(f"translations/{locale_name}.qm"):
             QApplication.instance().installTranslator(self.app_translator)
-            print(f"Loaded translation: {locale_name}")
+            logger.info('Loaded translation: %s', locale_name)
         else:
-            print(f"No translation found for {locale_name}")
+            logger.info('No translation found for %s', locale_name)
 
     def load_image(self):
         img_path, _ = QFileDialog.getOpenFileName(
             self, 
             self.tr('Open File'),
-            imageSaveDirectory,
+            str(self.storage.base),
             self.tr('Tiff Files (*.tif);;All Files (*)')
         )
         if img_path:
-            self.image = SLImage(self.xdim, self.ydim)
-            if not SLImage.ReadTiffImage(img_path, self.image):
-                print(f'Failed to load image from path {img_path}')
+            image = self.pool.acquire()
+            if not SLImage.ReadTiffImage(img_path, image):
+                logger.error('Failed to load image from path %s', img_path)
+                self.pool.release(image)
                 return
-            
+            self.set_image_buffer(image)
+
             self.last_save = img_path
             # Convert the image to an array
             self.current_img = self.image.Frame2Array(0)
@@ -355,23 +973,405 @@ class MainWindow(QMainWindow):
             self.display_img()
 
     
-    def delete_dialog(self, target):
-        dialog = DeleteDialog(target)
-        dialog.accepted.connect(lambda: self.empty_captured(target))
-        dialog.exec()
+    def merge_hdr(self):
+        ladder_path, _ = QFileDialog.getOpenFileName(
+            self,
+            self.tr('Open Exposure Ladder'),
+            str(self.storage.root(CAPTURES)),
+            self.tr('Exposure Ladders (*.npz)')
+        )
+        if not ladder_path:
+            return
+        if self.hdr_thread is not None:
+            logger.warning('Already merging a ladder')
+            return
+
+        # Loading, merging and saving a full ladder takes seconds, so it runs on a worker thread
+        self.statusBar().showMessage(self.tr('Merging HDR image...'))
+        self.hdr_thread = QThread(self)
+        self.hdr_worker = HdrWorker(ladder_path, self.dark_library)
+        self.hdr_worker.moveToThread(self.hdr_thread)
+        self.hdr_thread.started.connect(self.hdr_worker.run)
+        self.hdr_worker.finished.connect(self.hdr_finished)
+        self.hdr_worker.finished.connect(self.hdr_thread.quit)
+        self.hdr_thread.start()
+
+    def hdr_finished(self, result):
+        self.hdr_thread = None
+        self.statusBar().clearMessage()
+        if result is None:
+            return
+        radiance, filename, corrected, metadata, frames = result
+        self.catalogue.add(
+            filename, HDR,
+            corrections=('offset',) if corrected else (),
+            temperature=metadata.get('temperature'),
+            frames=frames,
+            captured_at=metadata.get('started'),
+        )
+
+        # Float radiance has no raw file behind it, so the 14-bit adjustments don't apply
+        self.reset_view()
+        self.build_image_view()
+        self.image_view.setImage(np.rot90(radiance))
+        self.enable_adjustment_buttons(False)
+
+    def build_defect_map(self):
+        import imageio.v2 as imageio
+        import defect_map
+
+        # Hot pixels stand out most in the longest dark
+        darks = self.catalogue.query(kind=DARK, folder=self.storage.root(DARKS))
+        if not darks:
+            logger.warning('Capture a dark image before building a defect map')
+            return
+        dark = imageio.imread(darks[-1]['path'])
+        logger.info('Building defect map from %dms dark', darks[-1]['exposure'])
+
+        # A flat image finds dead and weak pixels; optional
+        flat_path, _ = QFileDialog.getOpenFileName(
+            self,
+            self.tr('Open Flat Image (cancel to use the dark only)'),
+            str(self.storage.root(CAPTURES)),
+            self.tr('TIFF Images (*.tif *.tiff)')
+        )
+        flat = imageio.imread(flat_path) if flat_path else None
+
+        mask = defect_map.generate_defect_map(dark, flat)
+        if mask is None:
+            return
+        folder = self.storage.folder(DEFECTS)
+        self.defect_map = defect_map.save_defect_map(mask, folder)
+        if self.defect_map is not None:
+            self.catalogue.add(
+                os.path.join(folder, defect_map.MAP_NAME), DEFECT_MAP,
+                exposure=darks[-1]['exposure'],
+                temperature=darks[-1]['temperature'],
+                device_id=self.device_id,
+            )
+
+    def calibrate_flat_field(self):
+        if self.streaming:
+            self.stop_stream()
+        if not self.camera_open:
+            self.open_camera()
+            if not self.camera_open:
+                return
+
+        # Loaded once for the whole run rather than per frame
+        filename_dark = self.dark_library.find(self.exposureTime, self.current_temperature)
+        if filename_dark is None:
+            logger.warning('Capture a %dms dark before calibrating the flat field', self.exposureTime)
+            self.dark_dialog()
+            return
+        import imageio.v2 as imageio
+        dark = imageio.imread(filename_dark)
+
+        num_frames, ok = QInputDialog.getInt(
+            self, self.tr('Calibrate Flat Field'),
+            self.tr('Point the detector at a uniform source. Flat frames to average:'),
+            32, 1, 4096
+        )
+        if not ok:
+            return
+
+        self.flat_field = FlatFieldCalibration(self.engine, self.xdim, self.ydim, self.exposureTime, num_frames, dark)
+        self.set_controls_enabled(False)
+        self.flat_field_thread = QThread(self)
+        self.flat_field_worker = FlatFieldWorker(self.flat_field)
+        self.flat_field_worker.moveToThread(self.flat_field_thread)
+        self.flat_field_thread.started.connect(self.flat_field_worker.run)
+        self.flat_field_worker.progress.connect(self.flat_field_progress)
+        self.flat_field_worker.finished.connect(self.flat_field_finished)
+        self.flat_field_worker.finished.connect(self.flat_field_thread.quit)
+        self.flat_field_thread.start()
+
+    def flat_field_progress(self, done, total):
+        self.statusBar().showMessage(self.tr('Flat frames: ') + f'{done}/{total}')
+
+    def flat_field_finished(self, result):
+        self.set_controls_enabled(True)
+        self.statusBar().clearMessage()
+        self.engine.configure(self.exposureMode, self.exposureTime, self.dds)
+        if result is None:
+            return
+
+        gain_map = result.gain_image(DARK_OFFSET)
+        if gain_map is None:
+            return
+        filename = self.storage.new_path(GAINS, f'gain_map_{result.exposure}ms', '.tif', self.xdim * self.ydim * 2)
+        if filename is None:
+            return
+        if not gain_map.WriteTiffImage(filename):
+            logger.error('Failed to save gain map as %s', filename)
+            self.storage.discard(filename)
+            return
+        logger.info('Saved gain map to %s', filename)
+        self.catalogue.add(
+            filename, GAIN_MAP,
+            exposure=result.exposure,
+            corrections=('offset',),
+            temperature=self.current_temperature,
+            device_id=self.device_id,
+            frames=result.frames,
+        )
+        # The map held for correction lives in the pool, so read it back from the file just saved
+        if self.gain_map is not None:
+            self.pool.release(self.gain_map)
+            self.gain_map = None
+        self.load_gain_map(filename)
+
+    def load_gain_map(self, filename):
+        """Read a gain map into a pooled buffer and use it. False on error"""
+        image = self.pool.acquire()
+        if SLImage.ReadTiffImage(filename, image) and image.SetAsGainMap() == SLError.SL_ERROR_SUCCESS:
+            self.gain_map = image
+            logger.info('Using gain map %s', filename)
+            return True
+        self.pool.release(image)
+        logger.error('Failed to load gain map %s', filename)
+        return False
+
+    def set_gain_correction(self, enabled):
+        if not enabled or self.gain_map is not None:
+            return
+        # Most recent calibration wins
+        gain_maps = self.catalogue.query(kind=GAIN_MAP, order_by='captured_at')
+        if gain_maps:
+            if self.load_gain_map(gain_maps[-1]['path']):
+                return
+        else:
+            logger.warning('No gain map found, calibrate one from the Corrections menu')
+        self.gain_correction_box.setChecked(False)
+
+    def set_defect_correction(self, enabled):
+        if not enabled:
+            return
+        if self.defect_map is None:
+            import defect_map
+            self.defect_map = defect_map.load_defect_map(self.storage.root(DEFECTS))
+        if self.defect_map is None:
+            logger.warning('No defect map found, build one from the Corrections menu')
+            self.defect_correction_box.setChecked(False)
+
+    def set_metrics_enabled(self, enabled):
+        metrics.enabled = enabled
+        logger.info('Timing metrics %s', 'enabled' if enabled else 'disabled')
+
+    @property
+    def current_img(self):
+        """The frame as displayed. Assigning a new frame clears display adjustments"""
+        return self.frame.current
+
+    @current_img.setter
+    def current_img(self, array):
+        self.frame.set(array)
+
+    @property
+    def inverted(self):
+        return self.frame.inverted
+
+    def frame_integral(self):
+        """Integral image of the raw frame, built once per frame and shared by every ROI"""
+        if self.integral_source is not self.frame.raw:
+            from integral import IntegralImage
+            self.integral = IntegralImage(self.frame.raw, squares=True)
+            self.integral_source = self.frame.raw
+        return self.integral
+
+    def roi_rect(self, roi):
+        """(y0, y1, x0, x1) of an ROI in current_img; the view shows it rotated by np.rot90"""
+        pos, size = roi.pos(), roi.size()
+        width = self.current_img.shape[1]
+        return (
+            int(round(pos.y())),
+            int(round(pos.y() + size.y())),
+            width - int(round(pos.x() + size.x())),
+            width - int(round(pos.x())),
+        )
+
+    def set_roi_stats(self, enabled):
+        self.build_image_view()
+        view = self.image_view.getView()
+        if not enabled:
+            if self.stats_roi is not None:
+                view.removeItem(self.stats_roi)
+                view.removeItem(self.stats_text)
+                self.stats_roi = None
+            return
+        self.stats_roi = pg.RectROI([100, 100], [200, 200], pen='c')
+        self.stats_text = pg.TextItem(color='c', anchor=(0, 1))
+        view.addItem(self.stats_roi)
+        view.addItem(self.stats_text)
+        self.stats_roi.sigRegionChanged.connect(self.update_roi_stats)
+        self.update_roi_stats()
+
+    def update_roi_stats(self):
+        # Four lookups in each integral table, so dragging stays smooth on full frames
+        if self.stats_roi is None:
+            return
+        self.stats_text.setPos(self.stats_roi.pos())
+        if self.current_img is None:
+            self.stats_text.setText(self.tr('No image'))
+            return
+        s = self.frame_integral().stats(self.roi_rect(self.stats_roi))
+        self.stats_text.setText(
+            self.tr('Mean %.1f  Std %.1f\nSum %.4g  Area %d px') % (s['mean'], s['std'], s['sum'], s['area'])
+        )
+
+    def show_quantification(self):
+        if self.quantification_dock is None:
+            self.build_image_view()
+            self.quantification_dock = QDockWidget(self.tr('Quantification'), self)
+            self.quantification_panel = QuantificationPanel(self, parent=self.quantification_dock)
+            self.quantification_dock.setWidget(self.quantification_panel)
+            self.addDockWidget(Qt.RightDockWidgetArea, self.quantification_dock)
+        # Frames displayed while the dock was hidden weren't measured
+        if self.frame.raw is not None:
+            self.quantification_panel.set_frame(self.frame.raw)
+        self.quantification_dock.show()
+
+    def show_timing_stats(self):
+        if self.stats_dock is None:
+            self.stats_dock = QDockWidget(self.tr('Timing Stats'), self)
+            self.stats_dock.setWidget(TimingStatsPanel(parent=self.stats_dock))
+            self.addDockWidget(Qt.RightDockWidgetArea, self.stats_dock)
+        self.stats_dock.show()
+
+    def export_metrics(self):
+        path, selected = QFileDialog.getSaveFileName(
+            self,
+            self.tr('Export Timing Metrics'),
+            str(self.storage.base / 'timing_metrics.json'),
+            self.tr('JSON Files (*.json);;CSV Files (*.csv)')
+        )
+        if not path:
+            return
+        if path.endswith('.csv') or (not path.endswith('.json') and 'csv' in selected.lower()):
+            metrics.export_csv(path)
+        else:
+            metrics.export_json(path)
+        logger.info('Exported timing metrics to %s', path)
+
+    def export_gantt(self):
+        path, _ = QFileDialog.getSaveFileName(
+            self,
+            self.tr('Export Timing Gantt Chart'),
+            str(self.storage.base / 'timing_gantt.png'),
+            self.tr('PNG Files (*.png);;SVG Files (*.svg)')
+        )
+        if not path:
+            return
+        if not metrics.export_gantt(path):
+            logger.warning('No timing records to plot, turn on Record Timing Metrics first')
+            return
+        logger.info('Exported timing Gantt chart to %s (%.2fx overlap)', path, metrics.overlap())
+
+    def update_telemetry_label(self):
+        if self.telemetry is None or self.telemetry.latest.temperature is None:
+            self.telemetry_label.setText('')
+            return
+        latest = self.telemetry.latest
+        fan = self.tr('on') if latest.fan_on else self.tr('off')
+        self.telemetry_label.setText(self.tr('Sensor: ') + f'{latest.temperature:.1f} °C, ' + self.tr('fan ') + fan)
+
+    def update_memory_label(self):
+        usage = self.pool.usage()
+        self.memory_label.setText(
+            self.tr('Buffers: ') + f"{(usage['in_use'] + usage['free']) / 2**20:.0f}/{usage['budget'] / 2**20:.0f} MB"
+        )
+        self.memory_label.setToolTip(
+            self.tr('In use %.0f MB (cached %.0f MB), idle %.0f MB')
+            % (usage['in_use'] / 2**20, usage['cached'] / 2**20, usage['free'] / 2**20)
+        )
 
-    def empty_captured(self, target):
-        folder = os.path.join(imageSaveDirectory, target)
-        i = 0
+    def set_memory_budget(self):
+        budget, ok = QInputDialog.getInt(
+            self, self.tr('Memory Budget'),
+            self.tr('Memory for frame buffers and caches (MB):'),
+            self.pool.budget // 2**20, 64, 65536
+        )
+        if not ok:
+            return
+        self.pool.set_budget(budget * 2**20)
+        self.update_memory_label()
+
+    def set_image_buffer(self, image):
+        """Make image the SLImage frames are read into and saved from, handing the last one back"""
+        previous = getattr(self, 'image', None)
+        self.image = image
+        if previous is not None and previous is not image:
+            # The displayed frame is its own array, never a view of this buffer
+            self.pool.release(previous)
+
+    def load_dark(self, filename):
+        """Dark for filename from the cache, read from disk if it isn't there or the file changed"""
         try:
-            for filename in os.listdir(folder):
-                file_path = os.path.join(folder, filename)
-                if os.path.isfile(file_path):
-                    os.remove(file_path)
-                    i += 1
-            print(f'Deleted {i} captures')
-        except:
-            print(f'Encountered an error when emptying captured_images. Succesfully deleted {i} captures.')
+            key = (filename, os.path.getmtime(filename))
+        except OSError:
+            key = None
+        image = None
+        if key is not None:
+            image = self.dark_cache.load(key, lambda image: SLImage.ReadTiffImage(filename, image))
+        if image is None:
+            logger.error('Failed to read dark image %s', filename)
+        return image
+
+    def set_fan(self, on):
+        if self.telemetry is not None and self.telemetry.latest.fan_on != on:
+            if not self.telemetry.set_fan(on):
+                # Show the fan as it still is
+                self.fan_action.blockSignals(True)
+                self.fan_action.setChecked(not on)
+                self.fan_action.blockSignals(False)
+                self.statusBar().showMessage(self.tr('Detector busy, fan not switched'), 5000)
+
+    def delete_dialog(self, kind):
+        dialog = DeleteDialog(self.storage.root(kind).name)
+        dialog.accepted.connect(lambda: self.empty_captured(kind))
+        dialog.exec()
+
+    def empty_captured(self, kind, action=DELETE):
+        if self.housekeeping_thread is not None:
+            logger.warning('Already emptying a folder')
+            return
+
+        # Runs on a worker thread so tens of thousands of files don't freeze the UI
+        target = self.storage.root(kind)
+        self.housekeeper = Housekeeper(
+            target, action,
+            archive_root=self.storage.base / 'archive',
+            catalogue=self.catalogue,
+        )
+        label = self.tr('Deleting ') if action == DELETE else self.tr('Archiving ')
+        self.housekeeping_progress = QProgressDialog(label + target.name, self.tr('Cancel'), 0, 0, self)
+        self.housekeeping_progress.setMinimumDuration(500)
+        self.housekeeping_progress.canceled.connect(self.housekeeper.stop)
+
+        self.housekeeping_thread = QThread(self)
+        self.housekeeping_worker = HousekeepingWorker(self.housekeeper)
+        self.housekeeping_worker.moveToThread(self.housekeeping_thread)
+        self.housekeeping_thread.started.connect(self.housekeeping_worker.run)
+        self.housekeeping_worker.progress.connect(self.housekeeping_step)
+        self.housekeeping_worker.finished.connect(self.housekeeping_finished)
+        self.housekeeping_worker.finished.connect(self.housekeeping_thread.quit)
+        self.housekeeping_thread.start()
+
+    def housekeeping_step(self, done, total):
+        self.housekeeping_progress.setMaximum(total)
+        self.housekeeping_progress.setValue(done)
+
+    def housekeeping_finished(self, done, failed):
+        self.housekeeping_progress.reset()
+        self.housekeeping_thread = None
+        if failed:
+            logger.error('%d files could not be removed from %s', failed, self.housekeeper.folder)
+        self.statusBar().showMessage(self.tr('Files handled: ') + f'{done}', 5000)
+        self.dark_library.reload()
+
+    def file_moved(self, old, new):
+        # Called on the storage mover thread; the catalogue has its own lock
+        self.catalogue.relocate([(old, new)])
 
     def dark_dialog(self):
         dialog = DarkDialog(default_val=self.exposureTime)
@@ -382,15 +1382,82 @@ class MainWindow(QMainWindow):
 
     def set_exposure_time(self, value: int):
         self.exposureTime = value
-        print(f'Exposure time set to {value}ms')
+        logger.info('Exposure time set to %dms', value)
         if self.camera_open and not self.streaming:
             # Set Exposure time
-            err = self.device.SetExposureTime(value)
-            print('Device exposure time updated')
-            if err != SLError.SL_ERROR_SUCCESS:
-                print(f'Failed to set exposure time to {value} with error: {err}')
+            if self.engine.set_exposure(value):
+                logger.debug('Device exposure time updated')
+
+    def auto_exposure(self):
+        if not self.camera_open:
+            logger.warning('Camera must be on to run auto exposure')
+            return
+        was_streaming = self.streaming
+        if was_streaming:
+            self.stop_stream()
+
+        # Previews are short, binned, single seq_mode frames
+        if self.engine.configure(ExposureModes.seq_mode, self.exposureTime, self.dds):
+            self.engine.set_binning(PREVIEW_BINNING)
+            exposure = AutoExposure(self.engine.capture_preview).run()
+            self.engine.set_binning(BinningModes.x11)
+        else:
+            exposure = None
+
+        self.engine.configure(self.exposureMode, self.exposureTime, self.dds)
+        if exposure is not None:
+            # Goes through set_exposure_time via the input's textChanged
+            self.exposure_control.input.setText(str(exposure))
+
+        if was_streaming:
+            self.start_stream()
+
+    def set_acquisition_mode(self, mode):
+        self.acquisition_mode = mode
+        self.exposureMode = EXPOSURE_MODES[mode]
+        logger.info('Acquisition mode set to %s', mode)
+        if self.camera_open and not self.streaming:
+            self.engine.configure(self.exposureMode, self.exposureTime, self.dds)
+
+    def ensure_buffer_depth(self, num_frames):
+        # Frame-grabber memory is sized when the camera opens, so reopen if a burst won't fit
+        if self.engine.buffer_depth is None or self.engine.buffer_depth < num_frames:
+            logger.info('Reopening camera with buffer depth %d', num_frames)
+            self.close_camera()
+            self.open_camera()
 
 
+    def connect_device(self):
+        # Called once the window is showing so the driver load doesn't hold up the first paint
+        self.startup_thread = QThread(self)
+        self.startup_worker = StartupWorker(self.catalogue, self.storage.root(CAPTURES))
+        self.startup_worker.moveToThread(self.startup_thread)
+        self.startup_thread.started.connect(self.startup_worker.run)
+        self.startup_worker.view_ready.connect(self.build_image_view)
+        self.startup_worker.connected.connect(self.device_connected)
+        self.startup_worker.finished.connect(self.startup_thread.quit)
+        # After the legacy import, so files moved out of scratch are already catalogued
+        self.startup_worker.finished.connect(self.storage.recover)
+        self.startup_thread.start()
+
+    def build_image_view(self):
+        if self.image_view is None:
+            self.image_view = pg.ImageView(self)
+            self.view_layout.addWidget(self.image_view)
+
+    def device_connected(self, device):
+        if device is None:
+            self.camera_on_button.setText(self.tr('No detector'))
+            self.statusBar().showMessage(self.tr('Could not connect to detector'))
+            return
+        self.device = device
+        self.engine = AcquisitionEngine(self.device, self.device_lock)
+        self.camera_on_button.setText(self.tr('Camera off'))
+        self.camera_on_button.setEnabled(True)
+        self.multi_capture_button.setEnabled(True)
+        self.cumulative_button.setEnabled(True)
+        self.statusBar().showMessage(self.tr('Detector connected'), 3000)
+
     def on_button_toggled(self, checked):
         if checked:
             self.open_camera()
@@ -403,50 +1470,59 @@ class MainWindow(QMainWindow):
             self.close_camera()
             
     def open_camera(self):
-        # Open camera
-        err = self.device.OpenCamera()
-        if err != SLError.SL_ERROR_SUCCESS:
-            print('Failed to open camera with error: ', err)
+        # Open camera, with enough frame-grabber memory for a full burst in burst modes
+        buffer_depth = None
+        if self.acquisition_mode in BURST_MODES:
+            buffer_depth = self.mode_control.frames_input.value()
+        if not self.engine.open(buffer_depth):
             return -1
-        print('Successfuly opened camera')
+        logger.info('Successfuly opened camera')
         self.camera_open = True
 
         self.camera_on_button.setText('Camera on')
         self.stream_button.setEnabled(True)
+        self.auto_exposure_button.setEnabled(True)
         self.camera_on_button.setChecked(True)
 
-        print(self.device.GetImageXDim(), self.device.GetImageYDim())
-
-        print('Intialising Software Trigger')
+        logger.debug('Device dims: %dx%d', self.device.GetImageXDim(), self.device.GetImageYDim())
 
         # Configure the device
-        err = self.device.SetExposureMode(self.exposureMode)
-        if err != SLError.SL_ERROR_SUCCESS:
-            print(f'Failed to set exposure mode to {self.exposureMode} with error: {err}')
-            return  
-        
-        # Set Exposure time
-        self.set_exposure_time(self.exposureTime)
-    
-        err = self.device.SetDDS(self.dds)
-        if err != SLError.SL_ERROR_SUCCESS:
-            print(f'Failed to set DDS to {self.dds} with error: {err}')
+        if not self.engine.configure(self.exposureMode, self.exposureTime, self.dds):
             return
-        
-        print(f'Set DDS to {self.dds}')
+
+        self.start_telemetry()
+
+    def start_telemetry(self):
+        if self.telemetry is not None:
+            return
+        self.telemetry = TelemetrySampler(self.device, self.device_lock)
+        # Take the first reading now so the next frame can be stamped
+        self.telemetry.sample()
+        self.telemetry.start()
+        self.fan_action.setEnabled(True)
+        self.fan_action.setChecked(bool(self.telemetry.latest.fan_on))
+
+    def stop_telemetry(self):
+        if self.telemetry is None:
+            return
+        self.telemetry.stop()
+        self.telemetry.join()
+        self.telemetry = None
+        self.fan_action.setEnabled(False)
     
     def close_camera(self):
+        self.stop_telemetry()
+
         # Close camera
-        err = self.device.CloseCamera()
-        if err != SLError.SL_ERROR_SUCCESS:
-            print('Failed to CloseCamera with error: ', err)
+        if not self.engine.close():
             return -2
 
-        print('Successfully closed camera')
+        logger.info('Successfully closed camera')
         self.camera_open = False
         self.camera_on_button.setText('Camera off')
         self.camera_on_button.setChecked(False)
         self.stream_button.setEnabled(False)
+        self.auto_exposure_button.setEnabled(False)
         
         
 
@@ -458,8 +1534,14 @@ class MainWindow(QMainWindow):
         
     def start_stream(self):
         if not self.camera_open:
-            print('Open camera before starting stream')
+            logger.warning('Open camera before starting stream')
             return
+
+        if self.acquisition_mode in BURST_MODES:
+            num_frames = self.mode_control.frames_input.value()
+            self.ensure_buffer_depth(num_frames)
+            if not self.engine.arm_burst(num_frames):
+                return
         
         self.stream_button.setText('Stop stream')
         self.stream_button.setChecked(True)
@@ -467,26 +1549,33 @@ class MainWindow(QMainWindow):
         self.capture_button.setEnabled(True)
         self.exposure_control.input.setEnabled(False)
         self.exposure_control.button.setEnabled(False)
+        self.mode_control.set_streaming(True)
 
-         # Build SLImage object to read frames into
-        self.image = SLImage(self.xdim, self.ydim)
+        # Check out a buffer to read frames into
+        self.set_image_buffer(self.pool.acquire())
         self.bufferInfo: SLBufferInfo = None
         
         # Start Stream
-        err = self.device.StartStream()
-        if err != SLError.SL_ERROR_SUCCESS:
-            print(f'Failed to start stream with error: {err}')
+        if self.acquisition_mode == FIRMWARE_AVERAGE:
+            # The detector goes live and averages on board, in place of a host stream
+            started = self.engine.go_live_auto_trigger(
+                self.exposureTime,
+                self.mode_control.frames_input.value(),
+                self.mode_control.threshold_input.value(),
+            )
+        else:
+            started = self.engine.start_stream()
+        if not started:
             return
 
-        print('Started stream')
+        logger.info('Started stream')
         self.streaming = True
 
     
     def stop_stream(self):
         # Stop stream
-        err = self.device.StopStream()
-        if err != SLError.SL_ERROR_SUCCESS:
-            print(f'Failed to stop stream with error: {err}')
+        stopped = self.engine.go_unlive() if self.engine.live else self.engine.stop_stream()
+        if not stopped:
             return
         
         self.stream_button.setText('Start stream')
@@ -495,13 +1584,13 @@ class MainWindow(QMainWindow):
         self.capture_button.setEnabled(False)
         self.exposure_control.input.setEnabled(True)
         self.exposure_control.button.setEnabled(True)
+        self.mode_control.set_streaming(False)
         
-        print('Stopped stream')
+        logger.info('Stopped stream')
         self.streaming = False
 
     def capture_dark_image(self):
-        print('-'*50)
-        print('Capturing dark image')
+        logger.info('Capturing dark image')
 
         # Set exposure time input to new exposure time
         self.exposure_control.input.setText(str(self.exposureTime))
@@ -516,11 +1605,12 @@ class MainWindow(QMainWindow):
         self.open_camera()
         self.start_stream()
 
-        # Capture image
-        filename = f"{imageSaveDirectory}\\correction_images\\dark_frame_{self.exposureTime}.tif"
+        # Capture image, then name it by the temperature it was taken at
         self.capture_image()
+        filename = self.dark_library.filename_for(self.exposureTime, self.current_temperature)
         self.save_image(filename)
-        print('-'*50)
+        if self.last_save == filename:
+            self.dark_library.add(filename, self.exposureTime, self.current_temperature, self.device_id)
     
     def capture_many_darks(self):
         if self.camera_open:
@@ -539,134 +1629,550 @@ class MainWindow(QMainWindow):
 
     def capture_button_clicked(self):
         if not self.camera_open:
-            print("Camera must be on to capture an image")
+            logger.warning('Camera must be on to capture an image')
             return
         if not self.streaming:
-            print("Camera must be streaming to capture an image")
+            logger.warning('Camera must be streaming to capture an image')
             return
 
+        if self.acquisition_mode in BURST_MODES:
+            self.capture_burst()
+            return
+        if self.acquisition_mode == SOFTWARE_SERIES:
+            self.capture_series()
+            return
+
+        stem = f'corr_{self.exposureTime}ms' if self.dark_subtraction_box.isChecked() else f'{self.exposureTime}ms'
+        filename = self.storage.new_path(CAPTURES, stem, '.tif', self.xdim * self.ydim * 2)
+        if filename is None:
+            return
         self.frame_count += 1
-        rand_id = np.random.randint(0, 10000)
-        if self.dark_subtraction_box.isChecked():
-            filename = f"{imageSaveDirectory}\\captured_images\\corr_{self.exposureTime}ms_{rand_id}.tif"
-        else:
-            filename = f"{imageSaveDirectory}\\captured_images\\{self.exposureTime}ms_{rand_id}.tif"
         self.capture_image(offset_correction=self.dark_subtraction_box.isChecked())
         self.reset_view()
         self.display_img()
         self.save_image(filename)
+        if self.last_save != filename:
+            self.storage.discard(filename)
+        else:
+            self.record_capture_metadata(filename)
+            self.storage.done(filename)
+        if self.denoise_box.isChecked() and self.frame.raw is not None:
+            # The raw frame is owned and never modified, so it can be shared without a copy
+            self.denoise(self.frame.raw, self.frame_count)
+
+    def denoise(self, frame, frame_number):
+        # Filtered on a worker thread; while one frame is in flight only the newest waiting one is kept
+        if self.denoise_busy:
+            self.denoise_pending = (frame, frame_number)
+            return
+        if self.denoise_thread is None:
+            self.denoise_thread = QThread(self)
+            self.denoise_worker = DenoiseWorker()
+            self.denoise_worker.moveToThread(self.denoise_thread)
+            self.denoise_requested.connect(self.denoise_worker.process)
+            self.denoise_worker.finished.connect(self.denoise_finished)
+            self.denoise_thread.start()
+        self.denoise_busy = True
+        # An even window is rounded up, the median needs a centre pixel
+        self.denoise_requested.emit(frame, frame_number, self.denoise_window_input.value() | 1)
+
+    def denoise_finished(self, result, frame_number):
+        self.denoise_busy = False
+        if self.denoise_pending is not None:
+            self.denoise(*self.denoise_pending)
+            self.denoise_pending = None
+        # Drop results for frames that have since been replaced
+        if result is None or frame_number != self.frame_count:
+            return
+        self.current_img = result
+        self.display_img()
+
+    def capture_series(self):
+        from pipeline import CapturePipeline
+        num_frames = self.mode_control.frames_input.value()
+        dark = self.dark_subtraction_box.isChecked()
+        if not self.storage.has_space(CAPTURES, num_frames * self.xdim * self.ydim * 2):
+            return
+
+        # Settings are read here, the pipeline threads mustn't touch widgets
+        dark_image = None
+        if dark:
+            filename_dark = self.dark_library.find(self.exposureTime, self.current_temperature)
+            if filename_dark is None:
+                logger.warning('No matching dark image found. Prompting user to capture dark image.')
+                self.dark_dialog()
+                return
+            with metrics.span('dark_load', self.frame_count + 1):
+                dark_image = self.load_dark(filename_dark)
+            if dark_image is None:
+                return
+        gain = dark and self.gain_correction_box.isChecked()
+        defect = self.defect_correction_box.isChecked()
+        corrections = [c for c, applied in (('offset', dark), ('gain', gain), ('defect', defect)) if applied]
+        prefix = f'corr_{self.exposureTime}ms' if dark else f'{self.exposureTime}ms'
+        exposure = self.exposureTime
+        temperature = self.current_temperature
+
+        def process(image, frame):
+            array = self.correct_frame(image, dark_image, frame, gain=gain, defect=defect)
+            # The SLImage goes back in the ring, so keep a copy of its pixels
+            if array is not None and not array.flags.owndata:
+                array = array.copy()
+            return array
+
+        def save(array, frame):
+            filename = self.storage.new_path(CAPTURES, prefix, '.tif', array.nbytes)
+            if filename is None:
+                return
+            if SLImage.Array2Frame(array).WriteTiffImage(filename) is False:
+                logger.error('Failed to save image as %s', filename)
+                self.storage.discard(filename)
+                return
+            self.catalogue.add(
+                filename, CAPTURE,
+                exposure=exposure,
+                corrections=corrections,
+                mode=SOFTWARE_SERIES,
+                temperature=temperature,
+                device_id=self.device_id,
+                frame_number=frame,
+            )
+            self.storage.done(filename)
+
+        self.series_pipeline = CapturePipeline(self.engine, self.xdim, self.ydim, exposure, process, save, pool=self.pool)
+        self.set_controls_enabled(False)
+        self.capture_button.setEnabled(False)
+        self.series_thread = QThread(self)
+        self.series_worker = SeriesWorker(self.series_pipeline, num_frames, self.frame_count + 1)
+        self.series_worker.moveToThread(self.series_thread)
+        self.series_thread.started.connect(self.series_worker.run)
+        self.series_worker.frame_ready.connect(self.series_frame)
+        self.series_worker.finished.connect(self.series_finished)
+        self.series_worker.finished.connect(self.series_thread.quit)
+        self.series_thread.start()
+
+    def series_frame(self, array, frame):
+        self.current_img = array
+        self.reset_view()
+        self.display_img()
+        self.series_worker.display_pending = False
+
+    def series_finished(self, read, elapsed):
+        self.series_thread = None
+        self.frame_count += read
+        # Frames were saved from arrays, not self.image
+        self.last_save = None
+        self.set_controls_enabled(True)
+        self.capture_button.setEnabled(self.streaming)
+        if read:
+            self.statusBar().showMessage(
+                self.tr('Captured %d frames in %.1fs (%.1f ms per frame)') % (read, elapsed, elapsed * 1000 / read), 5000
+            )
+
+    def capture_burst(self):
+        num_frames = self.mode_control.frames_input.value()
+        stack = self.engine.capture_burst(
+            self.acquisition_mode, self.exposureTime, num_frames, self.xdim, self.ydim
+        )
+        if stack is None or len(stack) == 0:
+            return
+        self.current_temperature = self.telemetry.temperature if self.telemetry is not None else None
+
+        self.frame_count += len(stack)
+        self.current_stack = stack
+        self.current_img = stack[-1]
+        self.reset_view()
+        self.display_img()
+
+        filename = self.storage.new_path(CAPTURES, f'burst_{self.exposureTime}ms', '.tif', stack.nbytes)
+        if filename is None:
+            return
+        self.save_stack(stack, filename)
+        if self.last_save != filename:
+            self.storage.discard(filename)
+        else:
+            # Bursts are saved raw
+            self.record_capture_metadata(filename, BURST, frames=len(stack), corrections=())
+            self.storage.done(filename)
+
+    def save_stack(self, stack, filename):
+        # Whole burst as one multi-page TIFF
+        import imageio.v2 as imageio
+        with metrics.span('save', self.frame_count):
+            try:
+                imageio.mimwrite(filename, stack)
+            except OSError:
+                logger.exception('Failed to save image stack as %s', filename)
+                return
+        self.last_save = filename
+
+    def record_capture_metadata(self, filename, kind=CAPTURE, frames=1, corrections=None):
+        if corrections is None:
+            dark = self.dark_subtraction_box.isChecked()
+            corrections = [c for c, applied in (
+                ('offset', dark),
+                ('gain', dark and self.gain_correction_box.isChecked()),
+                ('defect', self.defect_correction_box.isChecked()),
+            ) if applied]
+        self.catalogue.add(
+            filename, kind,
+            exposure=self.exposureTime,
+            corrections=corrections,
+            mode=self.acquisition_mode,
+            temperature=self.current_temperature,
+            device_id=self.device_id,
+            frames=frames,
+            frame_number=self.frame_count,
+        )
 
     def multi_capture_button_clicked(self):
-        if self.camera_open:
-            self.close_camera()
-        tmp = self.exposureTime
-        exposure_times = [10, 20, 50, 100, 200, 300, 400, 500, 1000, 2000, 5000, 10000]
-        remaining_time = np.sum(exposure_times)
-        for e in exposure_times:
-            print(f'Capturing frame with exposure time {e}ms')
-            print(f'Time remaining: {remaining_time/1000}s')
-            self.exposureTime = e
-            self.open_camera()
+        if self.streaming:
+            self.stop_stream()
+        if not self.camera_open:
             self.open_camera()
-            self.start_stream()
-            self.capture_button_clicked()
+            if not self.camera_open:
+                return
+
+        ladder = ExposureLadder(self.engine, self.xdim, self.ydim, DEFAULT_EXPOSURES, dds=self.dds)
+        logger.info('Capturing exposure ladder, estimated %.1fs', ladder.eta())
+
+        # Run the ladder off the GUI thread; the device lock keeps telemetry out of its way
+        self.set_controls_enabled(False)
+        self.ladder_thread = QThread(self)
+        self.ladder_worker = LadderWorker(ladder)
+        self.ladder_worker.moveToThread(self.ladder_thread)
+        self.ladder_thread.started.connect(self.ladder_worker.run)
+        self.ladder_worker.progress.connect(self.ladder_progress)
+        self.ladder_worker.finished.connect(self.ladder_finished)
+        self.ladder_worker.finished.connect(self.ladder_thread.quit)
+        self.ladder_thread.start()
+
+    def ladder_progress(self, step, total, exposure, eta):
+        self.statusBar().showMessage(
+            self.tr('Ladder step ') + f'{step + 1}/{total}: {exposure} ms, ' + self.tr('time remaining: ') + f'{eta:.1f} s'
+        )
+
+    def ladder_finished(self, result):
+        self.set_controls_enabled(True)
+        self.statusBar().clearMessage()
+
+        # Put the device back how the GUI left it
+        self.engine.configure(self.exposureMode, self.exposureTime, self.dds)
+
+        if len(result) == 0:
+            logger.error('Exposure ladder captured no frames')
+            return
+
+        result.metadata['temperature'] = self.telemetry.temperature if self.telemetry is not None else None
+        frames = sum(len(result[e]) for e in result.exposures())
+        filename = self.storage.new_path(CAPTURES, 'ladder', '.npz', frames * self.xdim * self.ydim * 2)
+        if filename is None:
+            return
+        try:
+            result.save(filename)
+        except OSError:
+            logger.exception('Failed to save exposure ladder as %s', filename)
+            self.storage.discard(filename)
+            return
+        logger.info('Saved exposure ladder to %s', filename)
+        self.catalogue.add(
+            filename, LADDER,
+            mode=self.acquisition_mode,
+            temperature=result.metadata['temperature'],
+            device_id=self.device_id,
+            frames=frames,
+            captured_at=result.metadata.get('started'),
+        )
+        self.storage.done(filename)
+
+        self.current_img = result[result.exposures()[-1]][-1]
+        # Not saved as a single TIFF, the ladder lives in the .npz
+        self.last_save = None
+        self.reset_view()
+        self.display_img()
+
+    def cumulative_button_toggled(self, checked):
+        if checked:
+            self.start_cumulative()
+        elif self.cumulative_thread is not None:
+            self.cumulative.stop()
+
+    def start_cumulative(self):
+        from cumulative import CumulativeExposure
+        self.cumulative_button.setChecked(False)
+        if self.streaming:
             self.stop_stream()
-            self.close_camera()
-            print('Frame captured')
-            remaining_time -= e
+        if not self.camera_open:
+            self.open_camera()
+            if not self.camera_open:
+                return
 
-        self.exposureTime = tmp
-        
-        
-    def capture_image(self, offset_correction=False):    
-        print("Capturing Image")
+        # Every frame is dark-corrected against one dark loaded up front
+        filename_dark = self.dark_library.find(self.exposureTime, self.current_temperature)
+        if filename_dark is None:
+            logger.warning('Capture a %dms dark before a cumulative exposure', self.exposureTime)
+            self.dark_dialog()
+            return
+        import imageio.v2 as imageio
+        dark = imageio.imread(filename_dark)
 
-        err = self.device.SoftwareTrigger()
-        if err != SLError.SL_ERROR_SUCCESS:
-            print(f'Failed to send software trigger with error: {err}')
+        max_frames, ok = QInputDialog.getInt(
+            self, self.tr('Cumulative Exposure'),
+            self.tr('Most frames of %d ms to stack:') % self.exposureTime,
+            60, 2, 10000
+        )
+        if not ok:
             return
-        
-        print('Sent software trigger')
+        snr_target, ok = QInputDialog.getDouble(
+            self, self.tr('Cumulative Exposure'),
+            self.tr('Stop at this signal-to-noise ratio (0 to stop only at saturation):'),
+            0, 0, 10000, 1
+        )
+        if not ok:
+            return
+
+        # Targets are measured in the ROI statistics rectangle when it is showing
+        region = None
+        if self.stats_roi is not None and self.current_img is not None and self.current_img.shape == (self.ydim, self.xdim):
+            region = self.frame_integral().clip(self.roi_rect(self.stats_roi))
+            y0, y1, x0, x1 = region
+            if y1 == y0 or x1 == x0:
+                logger.warning('Move the ROI onto the image before a cumulative exposure')
+                return
+        # A float32 page per frame
+        filename = self.storage.new_path(CAPTURES, f'cumulative_{self.exposureTime}ms', '.tif', max_frames * self.xdim * self.ydim * 4)
+        if filename is None:
+            return
+        self.cumulative = CumulativeExposure(
+            self.engine, self.xdim, self.ydim, self.exposureTime, max_frames, dark, filename,
+            snr_target=snr_target or None, region=region,
+        )
+
+        self.set_controls_enabled(False)
+        self.cumulative_button.setEnabled(True)
+        self.cumulative_button.setChecked(True)
+        self.cumulative_button.setText(self.tr('Stop Cumulative Exposure'))
+        self.cumulative_thread = QThread(self)
+        self.cumulative_worker = CumulativeWorker(self.cumulative)
+        self.cumulative_worker.moveToThread(self.cumulative_thread)
+        self.cumulative_thread.started.connect(self.cumulative_worker.run)
+        self.cumulative_worker.progress.connect(self.cumulative_progress)
+        self.cumulative_worker.finished.connect(self.cumulative_finished)
+        self.cumulative_worker.finished.connect(self.cumulative_thread.quit)
+        self.cumulative_thread.start()
+
+    def cumulative_progress(self, frames, total, snr, level):
+        self.statusBar().showMessage(
+            self.tr('Cumulative: ') + f'{frames}/{self.cumulative.max_frames} x {self.cumulative.exposure} ms, '
+            + self.tr('level ') + f'{level:.0f}/{self.cumulative.target_level}'
+            + (', SNR ' + f'{snr:.1f}' if snr is not None else '')
+        )
+        self.current_img = total
+        self.display_img()
+        # The float32 sum isn't a 14-bit frame, so the adjustments (CLAHE in particular) can't take it
+        self.enable_adjustment_buttons(False)
+
+    def cumulative_finished(self, result):
+        self.cumulative_thread = None
+        self.cumulative_button.setChecked(False)
+        self.cumulative_button.setText(self.tr('Cumulative Exposure'))
+        self.set_controls_enabled(True)
+        self.statusBar().clearMessage()
+        self.engine.configure(self.exposureMode, self.exposureTime, self.dds)
+        if result is None:
+            # Nothing was captured into the file reserved for the run
+            self.storage.discard(self.cumulative.filename)
+            return
+
+        self.statusBar().showMessage(
+            self.tr('Cumulative exposure of %d frames stopped: %s') % (result.frames, result.reason), 5000
+        )
+        logger.info('Saved %d cumulative images to %s', result.frames, result.filename)
+        self.catalogue.add(
+            result.filename, CUMULATIVE,
+            exposure=result.exposure,
+            corrections=('offset',),
+            mode=SEQUENCE,
+            temperature=self.current_temperature,
+            device_id=self.device_id,
+            frames=result.frames,
+        )
+        self.storage.done(result.filename)
+        self.current_img = result.image
+        # Saved as float pages of the run's TIFF, not a single image
+        self.last_save = None
+        self.reset_view()
+        self.display_img()
+        self.enable_adjustment_buttons(False)
+
+    def set_controls_enabled(self, enabled):
+        connected = self.engine is not None
+        self.camera_on_button.setEnabled(enabled and connected)
+        self.stream_button.setEnabled(enabled and self.camera_open)
+        self.multi_capture_button.setEnabled(enabled and connected)
+        self.cumulative_button.setEnabled(enabled and connected)
+        self.auto_exposure_button.setEnabled(enabled and self.camera_open)
+        self.mode_control.setEnabled(enabled)
+
+    def capture_image(self, offset_correction=False):    
+        frame_log.debug('Capturing Image')
 
         if not hasattr(self, "image"):
-            print("Image buffer not initialized. Start the stream first.")
+            logger.warning('Image buffer not initialized. Start the stream first.')
             return
-        
-        time.sleep(self.exposureTime / 1000) 
-        bufferInfo = self.device.AcquireImage(self.image)
+
+        frame = self.frame_count
+        if self.engine.live:
+            # Detector triggers itself on signal and sends one averaged frame
+            timeout = self.exposureTime * self.mode_control.frames_input.value() + READ_MARGIN_MS
+            bufferInfo = self.engine.acquire_auto_triggered(self.image, timeout, frame=frame)
+        else:
+            bufferInfo = self.engine.capture(self.image, self.exposureTime, frame=frame)
+        if bufferInfo is None:
+            return
+
+        # Stamp the frame with the most recent sensor temperature
+        self.current_temperature = self.telemetry.temperature if self.telemetry is not None else None
 
         if bufferInfo.error == SLError.SL_ERROR_SUCCESS:
             # Frame acquired successfully
-            print(f"Read new frame #{bufferInfo.frameCount} with dims: {bufferInfo.width}x{bufferInfo.height}")
+            frame_log.info('Read new frame #%d with dims: %dx%d', bufferInfo.frameCount, bufferInfo.width, bufferInfo.height)
 
             # Apply dark correction if specified
             if offset_correction:
-                # Initialise dark image object 
-                self.dark_image = SLImage(self.xdim, self.ydim)
-
-                # If dark image doesn't exist in directory, capture one
-                filename_dark = f'{imageSaveDirectory}\\correction_images\\dark_frame_{self.exposureTime}.tif'
-                if not os.path.exists(filename_dark):
+                # Reuse a dark taken at this exposure and a similar temperature, otherwise capture one
+                filename_dark = self.dark_library.find(self.exposureTime, self.current_temperature)
+                if filename_dark is None:
                     # Try and capture dark image
-                    print('No dark image found. Prompting user to capture dark image.')
+                    logger.warning('No matching dark image found. Prompting user to capture dark image.')
                     self.dark_dialog()
                     return
                 else:
-                    print('Dark image already exists')
+                    frame_log.debug('Using dark image %s', filename_dark)
 
-                # Load dark image
-                err = SLImage.ReadTiffImage(filename_dark, self.dark_image)
-                if err != True:
-                    print(f'Failed to read dark image')
+                # Load dark image, from the cache after the first capture
+                with metrics.span('dark_load', frame):
+                    self.dark_image = self.load_dark(filename_dark)
+                if self.dark_image is None:
                     return
 
-                # Apply offset correction
-                err = SLImage.OffsetCorrection(self.image, self.dark_image, darkOffset=50)
-                if err != SLError.SL_ERROR_SUCCESS:
-                    print(f'Failed to apply dark correction with error: {err}')
-                    return    
-                print('Offset correction applied')
-            # Convert the image to an array
-            self.current_img = self.image.Frame2Array(0)
+            corrected = self.correct_frame(
+                self.image,
+                self.dark_image if offset_correction else None,
+                frame,
+                gain=offset_correction and self.gain_correction_box.isChecked(),
+                defect=self.defect_correction_box.isChecked(),
+            )
+            if corrected is None:
+                return
+            self.current_img = corrected
+            if self.defect_correction_box.isChecked() and corrected.flags.owndata:
+                # Saves are written from the SLImage, so carry the fixed pixels back into it
+                self.defect_map.write_back(corrected, self.image)
 
         elif bufferInfo.error == SLError.SL_ERROR_MISSING_PACKETS:
             # Frame aquired with missing packets
-            print(f"Read new frame #{bufferInfo.frameCount} with dims: {bufferInfo.width}x{bufferInfo.height}")
+            frame_log.warning('Read new frame #%d with dims: %dx%d, missing packets: %d', bufferInfo.frameCount, bufferInfo.width, bufferInfo.height, bufferInfo.missingPackets)
         elif bufferInfo.error == SLError.SL_ERROR_TIMEOUT:
-                print("Timed out whilst waiting for frame")
+                logger.warning('Timed out whilst waiting for frame')
         else:
-            print(f'Failed to acquire image with error: {bufferInfo.error}')
+            logger.error('Failed to acquire image with error: %s', bufferInfo.error)
+
+    def correct_frame(self, image, dark_image, frame, gain=False, defect=False):
+        """
+        Offset-correct image in place against dark_image (if any), then gain
+        correct, convert to an array and fix defects as asked. Returns the
+        array or None on error. Reads no widgets, so pipelined series can run
+        it off the GUI thread.
+        """
+        if dark_image is not None:
+            with metrics.span('offset_correction', frame):
+                err = SLImage.OffsetCorrection(image, dark_image, darkOffset=DARK_OFFSET)
+            if err != SLError.SL_ERROR_SUCCESS:
+                logger.error('Failed to apply dark correction with error: %s', err)
+                return None
+            frame_log.debug('Offset correction applied')
+
+            # Gain correction works on the offset-corrected frame
+            if gain:
+                with metrics.span('gain_correction', frame):
+                    err = image.GainCorrection(self.gain_map, DARK_OFFSET)
+                if err != SLError.SL_ERROR_SUCCESS:
+                    logger.error('Failed to apply gain correction with error: %s', err)
+                    return None
+
+        # Convert the image to an array
+        with metrics.span('frame2array', frame):
+            array = image.Frame2Array(0)
+
+        if defect:
+            with metrics.span('defect_correction', frame):
+                if not array.flags.writeable:
+                    array = array.copy()
+                self.defect_map.correct(array)
+        return array
 
     def display_img(self):
-        self.image_view.setImage(np.rot90(self.current_img))
+        self.build_image_view()
+        with metrics.span('display', self.frame_count):
+            self.image_view.setImage(self.frame.oriented())
+        if self.quantification_dock is not None and self.quantification_dock.isVisible():
+            self.quantification_panel.set_frame(self.frame.raw)
+        self.update_roi_stats()
         self.enable_adjustment_buttons(True)
-        print('Displaying new capture')
+        frame_log.debug('Displaying new capture')
 
     def save_image(self, filename):
-        if self.image.WriteTiffImage(filename) is False:
-            print(f'Failed to save image as {filename}')
+        with metrics.span('save', self.frame_count):
+            saved = self.image.WriteTiffImage(filename)
+        if saved is False:
+            logger.error('Failed to save image as %s', filename)
         else:
             self.last_save = filename
     
     def closeEvent(self, event):
+        if self.startup_thread is not None and self.startup_thread.isRunning():
+            self.startup_thread.quit()
+            self.startup_thread.wait()
+        if self.housekeeping_thread is not None:
+            # Finish the current batch so the catalogue matches what's on disk
+            self.housekeeper.stop()
+            self.housekeeping_thread.quit()
+            self.housekeeping_thread.wait()
+        if self.series_thread is not None:
+            # Frames already read are still processed and saved
+            self.series_pipeline.stop()
+            self.series_thread.quit()
+            self.series_thread.wait()
+        if self.cumulative_thread is not None:
+            # Stops after the frame being read; the TIFF so far stays usable
+            self.cumulative.stop()
+            self.cumulative_thread.quit()
+            self.cumulative_thread.wait()
+        if self.hdr_thread is not None:
+            self.hdr_thread.quit()
+            self.hdr_thread.wait()
+        if self.denoise_thread is not None:
+            self.denoise_thread.quit()
+            self.denoise_thread.wait()
+            self.denoise_worker.close()
         if self.streaming:
             self.stop_stream()
         if self.camera_open:
             self.close_camera()
+        self.storage.close()
         event.accept()
 
     def auto_contrast(self):
-        print('Applying auto-contrast')
+        logger.info('Applying auto-contrast')
+        import cv2
         clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-        cl1 = clahe.apply(self.current_img)
-
-        self.current_img = cl1
+        self.frame.apply(lambda source, out: clahe.apply(source, dst=out))
         self.display_img()
 
     def invert(self):
-        print('Inverting image')
-        self.inverted = not self.inverted
-        self.current_img = 2**14 - self.current_img
+        logger.info('Inverting image')
+        self.frame.invert()
         self.display_img()
 
     def enable_adjustment_buttons(self, enable):    
@@ -683,15 +2189,12 @@ class MainWindow(QMainWindow):
 
 
     def highlight_saturation(self):
-        if self.current_img is None:
+        if self.frame.raw is None:
             return
         
         overlay = np.zeros((self.ydim, self.xdim, 4), dtype=np.ubyte)
-        print(self.inverted)
-        if self.inverted:
-            mask = self.current_img <= 51
-        else:
-            mask = self.current_img >= 2**14 - 51
+        # From the raw frame, so it holds after invert or contrast
+        mask = self.frame.raw >= SATURATION_LEVEL
 
         overlay[mask] = (255, 0, 0, 255)
         n = np.count_nonzero(mask)
@@ -700,7 +2203,7 @@ class MainWindow(QMainWindow):
 
         self.saturation_overlay = pg.ImageItem(overlay, opacity=1.0)
         self.image_view.getView().addItem(self.saturation_overlay)
-        print(f'Highlighted {n} saturated pixels')
+        logger.info('Highlighted %d saturated pixels', n)
 
     def remove_sat_highlights(self):
         # If we already have an overlay, remove it
@@ -708,28 +2211,31 @@ class MainWindow(QMainWindow):
             self.image_view.getView().removeItem(self.saturation_overlay)
             self.saturation_overlay = None
             self.saturation_button.setChecked(False)
-            print('Removed highlights')
+            logger.debug('Removed highlights')
 
     def reset_corrections(self):
-        print('Resetting corrections')
+        if self.frame.raw is None:
+            return
+        logger.info('Resetting corrections')
+        # The raw frame is still held, so there's nothing to read back from disk
         self.reset_view()
-        image_og = SLImage(self.xdim, self.ydim)
-        SLImage.ReadTiffImage(self.last_save, image_og)
-        self.current_img = image_og.Frame2Array(0)
         self.display_img()
 
     def reset_view(self):
         self.remove_sat_highlights()
-        self.inverted = False
+        self.frame.reset()
         
         
 
 
 if __name__ == '__main__':
+    setup_logging()
+
     app = QApplication(sys.argv)
     app.setWindowIcon(QIcon(os.path.join(basedir, 'favicon.ico')))
 
     window = MainWindow()
     window.show()
+    window.connect_device()
 
     app.exec()
\ No newline at end of file
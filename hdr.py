@@ -0,0 +1,160 @@
+"""
+High-dynamic-range merge of a dark-corrected exposure ladder.
+
+Every exposure is turned into a rate estimate (dark-subtracted ADU per ms).
+The estimates are combined with weights that fall to zero near saturation and
+near the noise floor, scaled by exposure time since longer exposures carry
+more signal per unit of read noise:
+
+    radiance = sum(w * (raw - dark)) / sum(w * t)
+
+The merge runs over row bands, slicing each band out of the ladder as it
+goes, so the working set stays bounded. Bands can be spread over a thread or
+process pool.
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import numpy as np
+import imageio.v2 as imageio
+
+from acquisition import SATURATION_LEVEL
+
+logger = logging.getLogger(__name__)
+
+# Dark-subtracted signal below this is faded out as read noise (ADU)
+NOISE_RAMP = 50
+# Weight starts to fall this far below the saturation level (ADU)
+SATURATION_RAMP = 2000
+# Rows per band
+TILE_ROWS = 256
+
+
+def _merge_band(raw, dark, exposures):
+    """raw: (n, rows, w) uint16, dark: (n, rows, w) float32, exposures: (n,) ms, shortest first"""
+    numerator = np.zeros(raw.shape[1:], dtype=np.float32)
+    denominator = np.zeros(raw.shape[1:], dtype=np.float32)
+    weight = np.empty(raw.shape[1:], dtype=np.float32)
+    signal = np.empty(raw.shape[1:], dtype=np.float32)
+    headroom = np.empty(raw.shape[1:], dtype=np.float32)
+
+    for i, t in enumerate(exposures):
+        np.subtract(raw[i], dark[i], out=signal, dtype=np.float32)
+
+        # Fade in above the noise floor...
+        np.divide(signal, NOISE_RAMP, out=weight)
+        np.clip(weight, 0, 1, out=weight)
+        # ...and out again approaching saturation
+        np.subtract(SATURATION_LEVEL, raw[i], out=headroom, dtype=np.float32)
+        np.divide(headroom, SATURATION_RAMP, out=headroom)
+        np.clip(headroom, 0, 1, out=headroom)
+        weight *= headroom
+
+        numerator += weight * signal
+        weight *= t
+        denominator += weight
+
+    radiance = np.empty_like(numerator)
+    np.divide(numerator, denominator, out=radiance, where=denominator > 0)
+
+    # Pixels no exposure could weigh in on: saturated everywhere or lost in noise
+    missing = denominator <= 0
+    if missing.any():
+        saturated = raw[0] >= SATURATION_LEVEL
+        shortest = (raw[0] - dark[0]) / exposures[0]
+        longest = (raw[-1] - dark[-1]) / exposures[-1]
+        radiance[missing] = np.where(saturated, shortest, longest)[missing]
+    return radiance
+
+
+def _band(frames, darks, exposures, a, b):
+    """Rows a:b of every exposure as (n, rows, w) uint16, with the matching float32 darks"""
+    raw = np.stack([
+        band if band.ndim == 2 else band.mean(axis=0).astype(np.uint16)
+        for band in (np.asarray(frames[e])[..., a:b, :] for e in exposures)
+    ])
+    dark = np.zeros(raw.shape, dtype=np.float32)
+    for i, e in enumerate(exposures):
+        if e in darks:
+            dark[i] = darks[e][a:b]
+    return raw, dark
+
+
+def _merge_rows(frames, darks, exposures, a, b):
+    raw, dark = _band(frames, darks, exposures, a, b)
+    return _merge_band(raw, dark, np.asarray(exposures, dtype=np.float32))
+
+
+def merge_ladder(frames, darks=None, tile_rows=TILE_ROWS, workers=None, use_processes=False):
+    """
+    frames: {exposure_ms: (ydim, xdim) or (n, ydim, xdim) array}, darks: the
+    same keyed by exposure. Multi-frame exposures are averaged first. Missing
+    darks count as zero. Returns a float32 radiance map in ADU per ms.
+
+    Each band's rows are sliced out of the frames and darks only when it is
+    merged, so the working set grows with tile_rows, not with the ladder.
+    """
+    exposures = sorted(frames)
+    darks = darks or {}
+    for e in exposures:
+        if e not in darks:
+            logger.warning('No dark for %dms, merging it uncorrected', e)
+
+    shape = np.shape(frames[exposures[0]])[-2:]
+    rows = shape[0]
+    bands = [(r, min(r + tile_rows, rows)) for r in range(0, rows, tile_rows)]
+    radiance = np.empty(shape, dtype=np.float32)
+
+    if workers:
+        pool_type = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        with pool_type(max_workers=workers) as pool:
+            # A few bands in flight per worker; processes get only their band's rows
+            pending = {}
+            for a, b in bands:
+                if use_processes:
+                    band_frames = {e: np.asarray(frames[e])[..., a:b, :] for e in exposures}
+                    band_darks = {e: darks[e][a:b] for e in exposures if e in darks}
+                    pending[a, b] = pool.submit(_merge_rows, band_frames, band_darks, exposures, 0, b - a)
+                else:
+                    pending[a, b] = pool.submit(_merge_rows, frames, darks, exposures, a, b)
+                if len(pending) >= 2 * workers:
+                    (a0, b0), future = next(iter(pending.items()))
+                    radiance[a0:b0] = future.result()
+                    del pending[a0, b0]
+            for (a, b), future in pending.items():
+                radiance[a:b] = future.result()
+    else:
+        for a, b in bands:
+            radiance[a:b] = _merge_rows(frames, darks, exposures, a, b)
+
+    return radiance
+
+
+def load_darks(library, exposures, temperature=None):
+    """Darks for each exposure from a DarkLibrary, as float32 arrays"""
+    darks = {}
+    for e in exposures:
+        filename = library.find(e, temperature)
+        if filename is not None:
+            darks[e] = imageio.imread(filename).astype(np.float32)
+    return darks
+
+
+def tone_map(radiance, low=0.5, high=99.9):
+    """8-bit log tone-mapped preview, stretched between two percentiles"""
+    sample = radiance[::4, ::4]
+    lo, hi = np.percentile(sample, [low, high])
+    scaled = np.log1p(np.clip(radiance - lo, 0, None))
+    top = np.log1p(max(hi - lo, 1e-6))
+    return (np.clip(scaled / top, 0, 1) * 255).astype(np.uint8)
+
+
+def save_hdr(radiance, stem):
+    """Write stem.tif (float32), stem.npy and stem_preview.png. Returns the paths."""
+    paths = (stem + '.tif', stem + '.npy', stem + '_preview.png')
+    os.makedirs(os.path.dirname(stem) or '.', exist_ok=True)
+    imageio.imwrite(paths[0], radiance.astype(np.float32))
+    np.save(paths[1], radiance)
+    imageio.imwrite(paths[2], tone_map(radiance))
+    return paths
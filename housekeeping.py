@@ -0,0 +1,105 @@
+"""
+Bulk delete or archive of a capture folder, meant to run off the GUI thread.
+
+Files are listed once with os.scandir, which returns the file type with each
+entry and so needs no extra stat per file. They are then handled in batches.
+After each batch the catalogue is updated in a single transaction, progress is
+reported and the stop flag is checked, so cancelling leaves the remaining
+files untouched and the catalogue in step with the disk. Archiving moves files
+into a dated folder with os.replace, a rename when the archive is on the same
+volume.
+"""
+import logging
+import os
+import threading
+from datetime import datetime
+
+from log_config import RateLimitedLogger
+
+logger = logging.getLogger(__name__)
+error_log = RateLimitedLogger(logger)
+
+DELETE = 'delete'
+ARCHIVE = 'archive'
+BATCH_SIZE = 500
+
+
+def archive_folder(archive_root, folder):
+    """Dated destination for an archive of folder, e.g. archive/captured_images_20250101-120000"""
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    return os.path.join(archive_root, f'{os.path.basename(os.path.normpath(folder))}_{stamp}')
+
+
+class Housekeeper:
+    def __init__(self, folder, action=DELETE, archive_root=None, catalogue=None, batch_size=BATCH_SIZE):
+        if action == ARCHIVE and archive_root is None:
+            raise ValueError('Archiving needs an archive_root')
+        self.folder = folder
+        self.action = action
+        self.destination = archive_folder(archive_root, folder) if action == ARCHIVE else None
+        self.catalogue = catalogue
+        self.batch_size = batch_size
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    def scan(self):
+        """Paths of the regular files directly in the folder (sub-folders are left alone)"""
+        try:
+            with os.scandir(self.folder) as entries:
+                return [entry.path for entry in entries if entry.is_file(follow_symlinks=False)]
+        except FileNotFoundError:
+            return []
+
+    def _handle(self, path):
+        if self.action == DELETE:
+            os.remove(path)
+            return None
+        target = os.path.join(self.destination, os.path.basename(path))
+        os.replace(path, target)
+        return target
+
+    def run(self, progress=None):
+        """
+        Delete or archive every file in the folder. progress(done, total) is
+        called after each batch. Returns (done, failed).
+        """
+        paths = self.scan()
+        total = len(paths)
+        if self.action == ARCHIVE and total:
+            os.makedirs(self.destination, exist_ok=True)
+        logger.info('%s %d files in %s', self.action.capitalize(), total, self.folder)
+        if progress is not None:
+            progress(0, total)
+
+        done = failed = 0
+        for start in range(0, total, self.batch_size):
+            if self._stop.is_set():
+                logger.info('%s cancelled after %d of %d files', self.action.capitalize(), done, total)
+                break
+
+            removed, moved = [], []
+            for path in paths[start:start + self.batch_size]:
+                try:
+                    target = self._handle(path)
+                except OSError as e:
+                    error_log.warning('Could not %s %s: %s', self.action, path, e)
+                    failed += 1
+                    continue
+                done += 1
+                if target is None:
+                    removed.append(path)
+                else:
+                    moved.append((path, target))
+
+            if self.catalogue is not None:
+                if removed:
+                    self.catalogue.remove_many(removed)
+                if moved:
+                    self.catalogue.relocate(moved)
+            if progress is not None:
+                progress(done + failed, total)
+
+        logger.info('%s %d files in %s, %d failed', 'Deleted' if self.action == DELETE else 'Archived', done, self.folder, failed)
+        return done, failed
@@ -0,0 +1,244 @@
+"""
+Per-frame timing instrumentation.
+
+Spans are timed with the monotonic perf_counter_ns clock and written into a
+fixed size ring of records. Writers claim a slot with a single atomic counter
+increment, so recording never takes a lock. When disabled, `span` hands back a
+shared no-op context manager and nothing is timed or stored. Each record also
+notes the thread it ran on, so export_gantt() can draw which stages overlap.
+"""
+import csv
+import itertools
+import json
+import threading
+import time
+
+import numpy as np
+
+# Stages recorded by the GUI capture path, in pipeline order
+STAGES = (
+    'trigger',
+    'exposure_wait',
+    'acquire',
+    'drain',
+    'dark_load',
+    'offset_correction',
+    'gain_correction',
+    'defect_correction',
+    'frame2array',
+    'denoise',
+    'display',
+    'save',
+    'buffer_wait',
+)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('recorder', 'stage', 'frame', 'start')
+
+    def __init__(self, recorder, stage, frame):
+        self.recorder = recorder
+        self.stage = stage
+        self.frame = frame
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.recorder.record(self.stage, self.start, time.perf_counter_ns(), self.frame)
+        return False
+
+
+class Instrumentation:
+    def __init__(self, capacity=4096, enabled=False):
+        self.capacity = capacity
+        self.enabled = enabled
+
+        self._stage_ids = {}
+        self._stage_names = []
+        self._thread_ids = {}
+        self._thread_names = []
+        self._register_lock = threading.Lock()
+        for stage in STAGES:
+            self._stage_id(stage)
+
+        self._stage = np.zeros(capacity, dtype=np.int16)
+        self._thread = np.zeros(capacity, dtype=np.int16)
+        self._frame = np.zeros(capacity, dtype=np.int64)
+        self._start = np.zeros(capacity, dtype=np.int64)
+        self._end = np.zeros(capacity, dtype=np.int64)
+        self._counter = itertools.count()
+        self._written = 0
+
+    def _stage_id(self, stage):
+        stage_id = self._stage_ids.get(stage)
+        if stage_id is None:
+            # Only taken the first time a stage name is seen
+            with self._register_lock:
+                stage_id = self._stage_ids.get(stage)
+                if stage_id is None:
+                    stage_id = len(self._stage_names)
+                    self._stage_names.append(stage)
+                    self._stage_ids[stage] = stage_id
+        return stage_id
+
+    def _thread_id(self):
+        ident = threading.get_ident()
+        thread_id = self._thread_ids.get(ident)
+        if thread_id is None:
+            with self._register_lock:
+                thread_id = self._thread_ids.get(ident)
+                if thread_id is None:
+                    thread_id = len(self._thread_names)
+                    self._thread_names.append(threading.current_thread().name)
+                    self._thread_ids[ident] = thread_id
+        return thread_id
+
+    def span(self, stage, frame=-1):
+        """Context manager timing one stage of one frame"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, stage, frame)
+
+    def record(self, stage, start_ns, end_ns, frame=-1):
+        # next() on itertools.count is atomic under the GIL, so each writer gets its own slot
+        n = next(self._counter)
+        i = n % self.capacity
+        self._stage[i] = self._stage_id(stage)
+        self._thread[i] = self._thread_id()
+        self._frame[i] = frame
+        self._start[i] = start_ns
+        self._end[i] = end_ns
+        self._written = n + 1
+
+    def clear(self):
+        self._counter = itertools.count()
+        self._written = 0
+
+    def _ordered_slots(self):
+        written = self._written
+        if written <= self.capacity:
+            return np.arange(written)
+        # Ring has wrapped, oldest record sits just after the newest
+        return (np.arange(written - self.capacity, written)) % self.capacity
+
+    def records(self):
+        """Return the buffered records, oldest first, as a list of dicts"""
+        slots = self._ordered_slots()
+        names = self._stage_names
+        threads = self._thread_names
+        return [
+            {
+                'stage': names[self._stage[i]],
+                'thread': threads[self._thread[i]],
+                'frame': int(self._frame[i]),
+                'start_ns': int(self._start[i]),
+                'end_ns': int(self._end[i]),
+                'duration_ms': (int(self._end[i]) - int(self._start[i])) / 1e6,
+            }
+            for i in slots
+        ]
+
+    def stats(self, window=None):
+        """
+        Rolling p50/p95/max (ms) per stage over the last `window` records.
+        Stages with no records are left out.
+        """
+        slots = self._ordered_slots()
+        if window is not None:
+            slots = slots[-window:]
+        if len(slots) == 0:
+            return {}
+
+        stage_ids = self._stage[slots]
+        durations = (self._end[slots] - self._start[slots]) / 1e6
+
+        summary = {}
+        for stage_id, name in enumerate(self._stage_names):
+            d = durations[stage_ids == stage_id]
+            if d.size == 0:
+                continue
+            p50, p95 = np.percentile(d, [50, 95])
+            summary[name] = {
+                'count': int(d.size),
+                'p50': float(p50),
+                'p95': float(p95),
+                'max': float(d.max()),
+            }
+        return summary
+
+    def export_json(self, filename):
+        with open(filename, 'w') as f:
+            json.dump({'records': self.records(), 'stats': self.stats()}, f, indent=2)
+
+    def export_csv(self, filename):
+        with open(filename, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=['stage', 'thread', 'frame', 'start_ns', 'end_ns', 'duration_ms'])
+            writer.writeheader()
+            writer.writerows(self.records())
+
+    def overlap(self, records=None):
+        """
+        Sum of all span durations over the wall time they cover. Above 1 means
+        stages ran concurrently; a strictly serial loop can't exceed 1.
+        """
+        records = self.records() if records is None else records
+        if not records:
+            return 0.0
+        busy = sum(r['end_ns'] - r['start_ns'] for r in records)
+        wall = max(r['end_ns'] for r in records) - min(r['start_ns'] for r in records)
+        return busy / wall if wall else 0.0
+
+    def export_gantt(self, filename, records=None, title=None):
+        """Timeline of the records, one row per thread, bars coloured by stage"""
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        records = self.records() if records is None else records
+        if not records:
+            return False
+        origin = min(r['start_ns'] for r in records)
+        threads = list(dict.fromkeys(r['thread'] for r in records))
+        stages = [s for s in self._stage_names if any(r['stage'] == s for r in records)]
+        colours = {stage: f'C{i % 10}' for i, stage in enumerate(stages)}
+
+        fig = Figure(figsize=(12, 1 + 0.6 * len(threads)))
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
+        for row, thread in enumerate(threads):
+            for stage in stages:
+                bars = [
+                    ((r['start_ns'] - origin) / 1e6, (r['end_ns'] - r['start_ns']) / 1e6)
+                    for r in records if r['thread'] == thread and r['stage'] == stage
+                ]
+                if bars:
+                    ax.broken_barh(bars, (row - 0.4, 0.8), facecolors=colours[stage])
+        ax.set_yticks(range(len(threads)), threads)
+        ax.invert_yaxis()
+        ax.set_xlabel('ms')
+        ax.set_title(title or f'Stage timeline, {self.overlap(records):.2f}x overlap')
+        ax.legend(
+            handles=[ax.barh(0, 0, color=colours[s], label=s) for s in stages],
+            loc='upper left', bbox_to_anchor=(1, 1), fontsize='small',
+        )
+        fig.tight_layout()
+        fig.savefig(filename, dpi=100)
+        return True
+
+
+# Shared recorder used across the app
+metrics = Instrumentation()
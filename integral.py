@@ -0,0 +1,92 @@
+"""
+Integral images (summed-area tables) for constant-time rectangle sums.
+
+The table has a leading row and column of zeros, so entry [y, x] is the sum
+of frame[:y, :x] and any rectangle is four lookups. With squares=True a
+second table of squared pixels gives the standard deviation too. Both are
+float64. A full frame of 14-bit pixels overflows float32's exact integer
+range, and its sum of squares (under 2**49) is still exact in float64.
+Rectangles are (y0, y1, x0, x1) in frame coordinates, half-open, and are
+clipped to the frame.
+"""
+import numpy as np
+
+
+class IntegralImage:
+    def __init__(self, frame, squares=False):
+        frame = np.asarray(frame)
+        h, w = frame.shape
+        self.shape = (h, w)
+        self.table = np.zeros((h + 1, w + 1), dtype=np.float64)
+        inner = self.table[1:, 1:]
+        np.cumsum(frame, axis=0, dtype=np.float64, out=inner)
+        np.cumsum(inner, axis=1, out=inner)
+
+        self.squares = None
+        if squares:
+            self.squares = np.zeros((h + 1, w + 1), dtype=np.float64)
+            inner = self.squares[1:, 1:]
+            np.square(frame, out=inner, dtype=np.float64)
+            np.cumsum(inner, axis=0, out=inner)
+            np.cumsum(inner, axis=1, out=inner)
+
+    def clip(self, rect):
+        h, w = self.shape
+        y0, y1, x0, x1 = rect
+        y0, y1 = min(max(int(y0), 0), h), min(max(int(y1), 0), h)
+        x0, x1 = min(max(int(x0), 0), w), min(max(int(x1), 0), w)
+        return y0, max(y1, y0), x0, max(x1, x0)
+
+    def area(self, rect):
+        y0, y1, x0, x1 = self.clip(rect)
+        return (y1 - y0) * (x1 - x0)
+
+    def sum(self, rect):
+        y0, y1, x0, x1 = self.clip(rect)
+        t = self.table
+        return t[y1, x1] - t[y0, x1] - t[y1, x0] + t[y0, x0]
+
+    def mean(self, rect):
+        area = self.area(rect)
+        return self.sum(rect) / area if area else float('nan')
+
+    def stats(self, rect):
+        """Sum, mean, standard deviation and area of a rectangle; needs squares=True"""
+        if self.squares is None:
+            raise ValueError('Integral image was built without squares')
+        y0, y1, x0, x1 = self.clip(rect)
+        area = (y1 - y0) * (x1 - x0)
+        total = self.sum((y0, y1, x0, x1))
+        if not area:
+            return {'sum': 0.0, 'mean': float('nan'), 'std': float('nan'), 'area': 0}
+        q = self.squares
+        squares = q[y1, x1] - q[y0, x1] - q[y1, x0] + q[y0, x0]
+        mean = total / area
+        # Rounding can leave a flat region a hair below zero
+        std = np.sqrt(max(squares / area - mean * mean, 0.0))
+        return {'sum': float(total), 'mean': float(mean), 'std': float(std), 'area': area}
+
+    def clip_many(self, rects):
+        h, w = self.shape
+        rects = np.asarray(rects, dtype=np.intp).reshape(-1, 4)
+        y = np.clip(rects[:, :2], 0, h)
+        x = np.clip(rects[:, 2:], 0, w)
+        y[:, 1] = np.maximum(y[:, 1], y[:, 0])
+        x[:, 1] = np.maximum(x[:, 1], x[:, 0])
+        return y[:, 0], y[:, 1], x[:, 0], x[:, 1]
+
+    def sums(self, rects):
+        """Sums of an (n, 4) array of rectangles"""
+        y0, y1, x0, x1 = self.clip_many(rects)
+        t = self.table
+        return t[y1, x1] - t[y0, x1] - t[y1, x0] + t[y0, x0]
+
+    def areas(self, rects):
+        y0, y1, x0, x1 = self.clip_many(rects)
+        return (y1 - y0) * (x1 - x0)
+
+    def row_sums(self, rect):
+        """Sum of each row of a rectangle, e.g. the profile down a lane"""
+        y0, y1, x0, x1 = self.clip(rect)
+        t = self.table
+        return (t[y0 + 1:y1 + 1, x1] - t[y0 + 1:y1 + 1, x0]) - (t[y0:y1, x1] - t[y0:y1, x0])
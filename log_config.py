@@ -0,0 +1,122 @@
+"""
+Logging setup shared by the GUI and scripts.
+
+Every logger feeds a single queue. A QueueListener thread does the %-formatting
+and the console/file I/O, so the acquisition and GUI threads only pay for
+putting a record on the queue.
+"""
+import atexit
+import logging
+import os
+import queue
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(name)s - %(message)s'
+DATE_FORMAT = '%H:%M:%S'
+
+_listener = None
+
+
+class _DeferredQueueHandler(QueueHandler):
+    # The stock prepare() formats the message on the calling thread. The queue
+    # never leaves this process, so pass the record through untouched and let
+    # the listener format it.
+    def prepare(self, record):
+        return record
+
+
+def _parse_levels(spec):
+    """Parse 'gui_test=DEBUG,acquisition=WARNING' into a dict"""
+    levels = {}
+    for item in spec.split(','):
+        if '=' not in item:
+            continue
+        name, level = item.split('=', 1)
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging(level=logging.INFO, levels=None, filename=None):
+    """
+    Route all logging through a background listener thread.
+
+    levels maps logger names to levels, e.g. {'gui_test': 'DEBUG'}. Extra
+    per-module levels can also be given in the XVIEW_LOG_LEVELS environment
+    variable using the same 'name=LEVEL,...' form.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    formatter = logging.Formatter(LOG_FORMAT, datefmt=DATE_FORMAT)
+    handlers = [logging.StreamHandler()]
+    if filename is not None:
+        handlers.append(logging.FileHandler(filename))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_DeferredQueueHandler(log_queue))
+    root.setLevel(level)
+
+    module_levels = dict(levels or {})
+    module_levels.update(_parse_levels(os.environ.get('XVIEW_LOG_LEVELS', '')))
+    for name, module_level in module_levels.items():
+        logging.getLogger(name).setLevel(module_level)
+
+    atexit.register(shutdown_logging)
+    return _listener
+
+
+def shutdown_logging():
+    """Flush the queue and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class RateLimitedLogger:
+    """
+    Wraps a logger so each message template is emitted at most once per
+    interval. Suppressed calls only bump a counter; their arguments are never
+    formatted. The next emitted line reports how many were dropped.
+    """
+
+    def __init__(self, logger, interval=1.0):
+        self.logger = logger
+        self.interval = interval
+        self._next_emit = {}
+        self._suppressed = {}
+
+    def log(self, level, msg, *args):
+        if not self.logger.isEnabledFor(level):
+            return
+
+        now = time.monotonic()
+        if now < self._next_emit.get(msg, 0.0):
+            self._suppressed[msg] = self._suppressed.get(msg, 0) + 1
+            return
+        self._next_emit[msg] = now + self.interval
+
+        suppressed = self._suppressed.pop(msg, 0)
+        if suppressed:
+            self.logger.log(level, msg + ' (%d similar suppressed)', *args, suppressed)
+        else:
+            self.logger.log(level, msg, *args)
+
+    def debug(self, msg, *args):
+        self.log(logging.DEBUG, msg, *args)
+
+    def info(self, msg, *args):
+        self.log(logging.INFO, msg, *args)
+
+    def warning(self, msg, *args):
+        self.log(logging.WARNING, msg, *args)
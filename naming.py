@@ -0,0 +1,31 @@
+"""
+Collision-free capture file names.
+
+Names keep the '<exposure>ms' token the viewers parse, with a timestamp in
+place of the old random suffix. The file is created exclusively, so two
+captures in the same microsecond still get different names.
+"""
+import os
+from datetime import datetime
+
+
+def timestamp_id():
+    return datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+
+
+def unique_path(folder, stem, ext, makedirs=True):
+    """Reserve and return a new path folder/<stem>_<timestamp><ext>"""
+    if makedirs:
+        os.makedirs(folder, exist_ok=True)
+    stamp = timestamp_id()
+    n = 0
+    while True:
+        suffix = f'_{n}' if n else ''
+        path = os.path.join(folder, f'{stem}_{stamp}{suffix}{ext}')
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            n += 1
+            continue
+        os.close(fd)
+        return path
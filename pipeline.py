@@ -0,0 +1,136 @@
+"""
+Pipelined software-trigger capture.
+
+A serial loop triggers, waits out the exposure, reads, corrects, converts,
+displays and saves each frame before triggering the next, so the sensor sits
+idle for everything after the read. Here the calling thread only triggers and
+reads. Once a frame is read the sensor is free and the next trigger goes
+straight out. Meanwhile a processing thread corrects and converts the frame
+before it, and a save thread writes the one before that.
+
+Frames are read into a small ring of SLImage buffers. The processing thread
+hands each buffer back once it has turned the frame into an array. If
+processing falls behind, the trigger loop waits for a free buffer (recorded as
+'buffer_wait'), so nothing grows without bound. With processing and saving
+each shorter than exposure plus readout, throughput is set by the sensor.
+Given a BufferPool, the ring is checked out of it and returned at the end.
+"""
+import logging
+import queue
+import threading
+import time
+
+from SLDevicePythonWrapper import SLError, SLImage
+
+from instrumentation import metrics
+
+logger = logging.getLogger(__name__)
+
+# SLImage buffers in flight: one being read, one being processed, one spare
+DEPTH = 3
+
+
+class CapturePipeline:
+    def __init__(self, engine, xdim, ydim, exposure, process, save=None, display=None, depth=DEPTH, pool=None):
+        """
+        process(image, frame) runs on the processing thread and returns the
+        frame as an array it owns (the SLImage is reused), or None to drop it.
+        save(array, frame) runs on the save thread. display(array, frame) is
+        called from the processing thread and must only hand the frame off.
+        """
+        self.engine = engine
+        self.xdim, self.ydim = xdim, ydim
+        self.exposure = exposure
+        self.process = process
+        self.save = save
+        self.display = display
+        self.depth = depth
+        self.pool = pool
+        self._stop = False
+
+    def stop(self):
+        self._stop = True
+
+    def _process_loop(self, free, to_process, to_save):
+        while True:
+            item = to_process.get()
+            if item is None:
+                break
+            image, frame = item
+            try:
+                array = self.process(image, frame)
+            except Exception:
+                logger.exception('Failed to process frame %d', frame)
+                array = None
+            finally:
+                free.put(image)
+            if array is None:
+                continue
+            if self.display is not None:
+                self.display(array, frame)
+            if self.save is not None:
+                to_save.put((array, frame))
+        to_save.put(None)
+
+    def _save_loop(self, to_save):
+        while True:
+            item = to_save.get()
+            if item is None:
+                break
+            array, frame = item
+            try:
+                with metrics.span('save', frame):
+                    self.save(array, frame)
+            except Exception:
+                logger.exception('Failed to save frame %d', frame)
+
+    def run(self, num_frames, first_frame=0):
+        """
+        Capture num_frames. Expects the stream running in software trigger
+        mode. Returns (frames read, seconds from first trigger to last save).
+        """
+        free = queue.Queue()
+        for _ in range(self.depth):
+            free.put(self.pool.acquire(xdim=self.xdim, ydim=self.ydim) if self.pool is not None else SLImage(self.xdim, self.ydim))
+        to_process = queue.Queue()
+        to_save = queue.Queue()
+        workers = [
+            threading.Thread(target=self._process_loop, args=(free, to_process, to_save), name='process', daemon=True),
+            threading.Thread(target=self._save_loop, args=(to_save,), name='save', daemon=True),
+        ]
+        for worker in workers:
+            worker.start()
+
+        read = 0
+        start = time.perf_counter()
+        try:
+            for frame in range(first_frame, first_frame + num_frames):
+                if self._stop:
+                    break
+                with metrics.span('buffer_wait', frame):
+                    image = free.get()
+                bufferInfo = self.engine.capture(image, self.exposure, frame=frame)
+                if bufferInfo is None or bufferInfo.error not in (SLError.SL_ERROR_SUCCESS, SLError.SL_ERROR_MISSING_PACKETS):
+                    logger.error('Failed to read frame %d of %d', frame - first_frame + 1, num_frames)
+                    free.put(image)
+                    break
+                if bufferInfo.error == SLError.SL_ERROR_MISSING_PACKETS:
+                    logger.warning('Frame %d missing %d packets', frame, bufferInfo.missingPackets)
+                to_process.put((image, frame))
+                read += 1
+        finally:
+            # Let the frames already read finish
+            to_process.put(None)
+            for worker in workers:
+                worker.join()
+            if self.pool is not None:
+                # Every buffer is back in the ring once processing has finished
+                while not free.empty():
+                    self.pool.release(free.get())
+        elapsed = time.perf_counter() - start
+        if read:
+            logger.info(
+                'Pipelined %d x %dms in %.2fs: %.1f ms per frame',
+                read, self.exposure, elapsed, elapsed * 1000 / read
+            )
+        return read, elapsed
@@ -0,0 +1,162 @@
+"""
+Per-frame processing in worker processes.
+
+CLAHE, corrections and saving run on the GUI's interpreter compete for the
+GIL with the Qt event loop and SDK callbacks. ProcessingPool runs them in
+separate processes instead, one frame per task, so they spread across cores.
+
+Pixels never go through a queue. Input and output frames live in two
+FrameSlots rings in shared memory, and the task queue carries only the slot,
+its sequence number, the task function and its keyword arguments. A
+producer reserves a slot and writes the frame straight into it. A worker
+runs fn(frame, out, **kwargs) on views of the slot's input and output, and
+the parent reads the result from the output view. Neither side copies. A
+slot is only reused once the parent releases it, so there are never more
+frames in flight than slots.
+
+Task functions must be importable module-level functions, as they are
+pickled by name.
+
+    with ProcessingPool((ydim, xdim), workers=4) as pool:
+        pool.put(frame, clahe, clip_limit=2.0)
+        ticket, out, value = pool.get()
+        ...
+        pool.release(ticket)
+"""
+import logging
+import multiprocessing
+import os
+import queue
+
+import numpy as np
+
+from shared_frames import FrameSlots
+
+logger = logging.getLogger(__name__)
+
+
+# ------------------- Tasks -----------------
+
+def copy(frame, out):
+    """No processing, to measure the handoff itself"""
+    out[...] = frame
+
+
+def clahe(frame, out, clip_limit=2.0, tile=8):
+    import cv2
+    cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=(tile, tile)).apply(frame, dst=out)
+
+
+# ------------------- Pool -----------------
+
+def _work(inputs, outputs, tasks, results):
+    inputs, outputs = FrameSlots.attach(inputs), FrameSlots.attach(outputs)
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            slot, sequence, fn, kwargs = task
+            frame = inputs.read(slot, sequence, copy=False)
+            try:
+                if frame is None:
+                    raise RuntimeError(f'Slot {slot} was rewritten before it was processed')
+                value = fn(frame, outputs.frames[slot], **kwargs)
+                outputs.sequence[slot] = sequence
+                results.put((slot, sequence, value, None))
+            except Exception as e:
+                results.put((slot, sequence, None, f'{type(e).__name__}: {e}'))
+    finally:
+        inputs.close()
+        outputs.close()
+
+
+class ProcessingPool:
+    def __init__(self, shape, dtype=np.uint16, workers=None, slots=None):
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        # Enough to keep every worker busy while results are being read
+        self.slots = slots or 2 * self.workers
+        self.inputs = FrameSlots(self.slots, shape, dtype)
+        self.outputs = FrameSlots(self.slots, shape, dtype)
+        self._free = queue.Queue()
+        for slot in range(self.slots):
+            self._free.put(slot)
+        self._count = 0
+        self._pending = 0
+
+        # Spawned, as on Windows, so workers start the same way everywhere
+        context = multiprocessing.get_context('spawn')
+        self._tasks = context.Queue()
+        self._results = context.Queue()
+        self._processes = [
+            context.Process(
+                target=_work,
+                args=(self.inputs.describe(), self.outputs.describe(), self._tasks, self._results),
+                name=f'processing-{i}',
+                daemon=True,
+            )
+            for i in range(self.workers)
+        ]
+        for process in self._processes:
+            process.start()
+        logger.info('Started %d processing workers with %d slots', self.workers, self.slots)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def reserve(self, timeout=None):
+        """A free slot and a view of its input frame to write into. Blocks until one is free"""
+        slot = self._free.get(timeout=timeout)
+        # Marked as being written, so a stale task for this slot can't be taken for this one
+        self.inputs.sequence[slot] = -1
+        return slot, self.inputs.frames[slot]
+
+    def submit(self, slot, fn, **kwargs):
+        """Queue fn on the frame written into a reserved slot. Returns its ticket"""
+        sequence = self._count
+        self._count += 1
+        self.inputs.sequence[slot] = sequence
+        self._tasks.put((slot, sequence, fn, kwargs))
+        self._pending += 1
+        return slot, sequence
+
+    def put(self, frame, fn, **kwargs):
+        """reserve() and submit() in one, for a frame that's already an array"""
+        slot, view = self.reserve()
+        view[...] = frame
+        return self.submit(slot, fn, **kwargs)
+
+    def get(self, timeout=None):
+        """
+        The next finished task as (ticket, output view, fn's return value),
+        in completion order. The view stays valid until release(ticket).
+        The output is None if the task failed; release the ticket either way.
+        """
+        slot, sequence, value, error = self._results.get(timeout=timeout)
+        self._pending -= 1
+        if error is not None:
+            logger.error('Processing frame %d failed: %s', sequence, error)
+            return (slot, sequence), None, None
+        return (slot, sequence), self.outputs.frames[slot], value
+
+    def release(self, ticket):
+        slot, _ = ticket
+        self._free.put(slot)
+
+    @property
+    def pending(self):
+        """Tasks submitted and not yet collected with get()"""
+        return self._pending
+
+    def close(self):
+        for _ in self._processes:
+            self._tasks.put(None)
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self.inputs.close()
+        self.outputs.close()
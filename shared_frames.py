@@ -0,0 +1,94 @@
+"""
+Frames shared between processes without copying them through a pipe.
+
+FrameSlots is a ring of same-shaped frames in one multiprocessing
+shared_memory block. One process creates it and passes describe() to the
+others, which attach by name and see the same pixels as numpy views. Only
+slot numbers and small metadata need to cross between processes.
+
+Each slot has a sequence number in a header ahead of the pixels. The
+writer clears it while writing and sets a new one after, so a reader can
+tell that a slot it was told about has since been overwritten.
+"""
+import os
+import sys
+
+import numpy as np
+from multiprocessing import shared_memory
+
+# Header ahead of the frames: one int64 sequence number per slot
+HEADER_DTYPE = np.int64
+
+
+def _attach(name):
+    # Only the creator should unlink the block. Attaching registers it with
+    # the resource tracker, which unlinks it when this process exits, so
+    # attach untracked: directly from 3.13, by skipping registration before.
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    if os.name != 'posix':
+        return shared_memory.SharedMemory(name=name)
+    from multiprocessing import resource_tracker
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None if rtype == 'shared_memory' else register(name, rtype)
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+class FrameSlots:
+    def __init__(self, slots, shape, dtype=np.uint16, name=None):
+        """Create a new block, or attach to the existing one called name"""
+        self.slots = slots
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        header = slots * np.dtype(HEADER_DTYPE).itemsize
+        size = header + slots * int(np.prod(self.shape)) * self.dtype.itemsize
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = _attach(name)
+        self.sequence = np.ndarray((slots,), dtype=HEADER_DTYPE, buffer=self.shm.buf)
+        self.frames = np.ndarray((slots, *self.shape), dtype=self.dtype, buffer=self.shm.buf, offset=header)
+        if self.owner:
+            self.sequence[:] = -1
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def describe(self):
+        """What another process needs to attach"""
+        return {'name': self.name, 'slots': self.slots, 'shape': self.shape, 'dtype': self.dtype.str}
+
+    @classmethod
+    def attach(cls, description):
+        return cls(description['slots'], description['shape'], description['dtype'], name=description['name'])
+
+    def write(self, slot, array, sequence):
+        # Marked as being written first, so a reader copying it meanwhile sees the change
+        self.sequence[slot] = -1
+        self.frames[slot] = array
+        self.sequence[slot] = sequence
+
+    def read(self, slot, sequence, copy=True):
+        """
+        The frame in slot if it is still the one written as sequence, else
+        None. Without copy it is a view that the next write to the slot changes.
+        """
+        if self.sequence[slot] != sequence:
+            return None
+        frame = self.frames[slot].copy() if copy else self.frames[slot]
+        # Checked again, as the slot may have been rewritten during the copy
+        if self.sequence[slot] != sequence:
+            return None
+        return frame
+
+    def close(self):
+        # numpy views must go before the mapping can be closed
+        del self.sequence, self.frames
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
@@ -0,0 +1,265 @@
+"""
+Where captures, calibration files and recordings are kept.
+
+Each kind of file has its own root. By default they are under the Images
+folder next to the application, in the layout the GUI has always used:
+
+  captures     Images/captured_images
+  darks        Images/correction_images
+  gains        Images/gain_maps
+  defects      Images/defect_maps
+  recordings   Images/recordings
+
+The base folder can be moved with the XVIEW_DATA_DIR environment variable.
+Single roots can be moved with XVIEW_STORAGE, in the form
+'recordings=/mnt/bulk/recordings,darks=calibration'. Relative roots are
+taken under the base. Paths are pathlib paths joined part by part, so the
+layout is the same on Windows and Linux. The darks root is emptied by
+"Delete all dark images", so gains and defects may not share it.
+
+Before a name is reserved, new_path checks that the volume has room for the
+file plus MIN_FREE_MB to spare. If not, it logs an error and returns None.
+The name is reserved by creating an empty file, so a caller whose write
+fails must hand the path to discard().
+Folders are created the first time they are used, and the result is
+remembered.
+
+When a scratch folder is set, with XVIEW_SCRATCH_DIR or scratch=, captures
+and recordings are written to a fast local disk first. The caller passes
+each finished file to done(), and a background thread moves it to its
+root. on_moved(old, new) is called after each move so the catalogue can
+follow the file. Calibration files are always written in place, because
+they are looked up by folder straight after they are saved. recover()
+queues the files that an earlier session left in scratch.
+"""
+import logging
+import os
+import queue
+import shutil
+import threading
+from pathlib import Path
+
+from naming import unique_path
+
+logger = logging.getLogger(__name__)
+
+CAPTURES = 'captures'
+DARKS = 'darks'
+GAINS = 'gains'
+DEFECTS = 'defects'
+RECORDINGS = 'recordings'
+LAYOUT = {
+    CAPTURES: 'captured_images',
+    DARKS: 'correction_images',
+    GAINS: 'gain_maps',
+    DEFECTS: 'defect_maps',
+    RECORDINGS: 'recordings',
+}
+# Kinds written to scratch first when there is one
+STAGED = (CAPTURES, RECORDINGS)
+DEFAULT_BASE = Path(__file__).resolve().parent / 'Images'
+# Left free on a volume after every write
+MIN_FREE_MB = 512
+
+
+def _parse_roots(spec):
+    """Parse 'recordings=/mnt/bulk,darks=calibration' into a dict"""
+    roots = {}
+    for item in spec.split(','):
+        if '=' not in item:
+            continue
+        kind, path = item.split('=', 1)
+        roots[kind.strip()] = path.strip()
+    return roots
+
+
+class Storage:
+    def __init__(self, base=None, roots=None, scratch=None, min_free_mb=MIN_FREE_MB, on_moved=None):
+        self.base = Path(base or os.environ.get('XVIEW_DATA_DIR') or DEFAULT_BASE).expanduser()
+        # Roots given here win over the environment
+        configured = _parse_roots(os.environ.get('XVIEW_STORAGE', ''))
+        configured.update(roots or {})
+        for kind in set(configured) - set(LAYOUT):
+            logger.warning('Ignoring storage root for unknown kind %r', kind)
+        self.roots = {kind: self.base / Path(configured.get(kind, name)).expanduser() for kind, name in LAYOUT.items()}
+        # Every file in the darks root goes when the darks are emptied
+        for kind in (GAINS, DEFECTS):
+            if self.roots[kind].resolve() == self.roots[DARKS].resolve():
+                raise ValueError(f'The {kind} root must not be the darks root {self.roots[DARKS]}')
+        scratch = scratch or os.environ.get('XVIEW_SCRATCH_DIR')
+        self.scratch = Path(scratch).expanduser() if scratch else None
+        self.min_free = min_free_mb * 2**20
+        self.on_moved = on_moved
+        self._created = set()
+        self._lock = threading.Lock()
+        self._moves = queue.Queue()
+        self._mover = None
+        self._stop = threading.Event()
+
+    def root(self, kind):
+        """Where files of this kind end up"""
+        return self.roots[kind]
+
+    def _ensure(self, folder):
+        with self._lock:
+            if folder not in self._created:
+                folder.mkdir(parents=True, exist_ok=True)
+                self._created.add(folder)
+        return folder
+
+    def folder(self, kind):
+        """Where new files of this kind are written, created on first use"""
+        if self.scratch is not None and kind in STAGED:
+            return self._ensure(self.scratch / kind)
+        return self._ensure(self.roots[kind])
+
+    def has_space(self, kind, nbytes=0):
+        """True if the folder new files of kind go to has room for nbytes more"""
+        folder = self.folder(kind)
+        try:
+            free = shutil.disk_usage(folder).free
+        except OSError as e:
+            logger.error('Could not check free space in %s: %s', folder, e)
+            return False
+        if free - nbytes < self.min_free:
+            logger.error(
+                'Not enough space in %s: %.0f MB free, %.0f MB needed',
+                folder, free / 2**20, (nbytes + self.min_free) / 2**20,
+            )
+            return False
+        return True
+
+    def new_path(self, kind, stem, ext, nbytes=0):
+        """
+        Reserve a new file of kind as in naming.unique_path and return its
+        path as a string, which is what the SDK takes. Returns None if the
+        volume can't fit nbytes.
+        """
+        if not self.has_space(kind, nbytes):
+            return None
+        return unique_path(self.folder(kind), stem, ext, makedirs=False)
+
+    def discard(self, path):
+        """Remove a file from new_path whose write failed, so scans don't pick it up"""
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning('Could not remove %s: %s', path, e)
+
+    def adopt(self, kind, pattern, source=DARKS):
+        """
+        Move files matching pattern that older versions kept in the source
+        root into the root of kind. Returns the (old, new) pairs moved, for
+        the catalogue.
+        """
+        target = self.roots[kind]
+        moves = []
+        for path in sorted(self.roots[source].glob(pattern)):
+            if not path.is_file():
+                continue
+            new = target / path.name
+            if new.exists():
+                logger.warning('Not moving %s, %s already exists', path, new)
+                continue
+            try:
+                self._ensure(target)
+                shutil.move(path, new)
+            except OSError as e:
+                logger.error('Could not move %s to %s: %s', path, new, e)
+                continue
+            moves.append((str(path), str(new)))
+        if moves:
+            logger.info('Moved %d %s files from %s to %s', len(moves), kind, self.roots[source], target)
+        return moves
+
+    # ------------------- Scratch -----------------
+
+    def _target(self, path):
+        """Root path for a file or folder in scratch, None for anything written in place"""
+        if self.scratch is None:
+            return None
+        for kind in STAGED:
+            if path.parent == self.scratch / kind:
+                return self.roots[kind] / path.name
+        return None
+
+    def done(self, path):
+        """Hand a finished file or recording folder to the mover. Nothing to do if it was written in place"""
+        path = Path(path)
+        target = self._target(path)
+        if target is None:
+            return
+        self._moves.put((path, target))
+        with self._lock:
+            if self._mover is None:
+                self._mover = threading.Thread(target=self._run, name='storage-mover', daemon=True)
+                self._mover.start()
+
+    def recover(self):
+        """Queue the files an earlier session left in scratch. Returns how many"""
+        if self.scratch is None:
+            return 0
+        found = 0
+        for kind in STAGED:
+            try:
+                entries = sorted((self.scratch / kind).iterdir())
+            except FileNotFoundError:
+                continue
+            for entry in entries:
+                self.done(entry)
+                found += 1
+        if found:
+            logger.info('Moving %d files left in %s', found, self.scratch)
+        return found
+
+    def _move(self, source, target):
+        if target.exists():
+            logger.error('Not moving %s, %s already exists', source, target)
+            return False
+        size = source.stat().st_size if source.is_file() else sum(
+            f.stat().st_size for f in source.rglob('*') if f.is_file()
+        )
+        self._ensure(target.parent)
+        if shutil.disk_usage(target.parent).free - size < self.min_free:
+            logger.error('Not enough space in %s to move %s, leaving it in scratch', target.parent, source)
+            return False
+        # A rename within a volume, a copy and delete across volumes
+        shutil.move(source, target)
+        return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            item = self._moves.get()
+            if item is None:
+                break
+            source, target = item
+            try:
+                moved = self._move(source, target)
+            except OSError as e:
+                logger.error('Could not move %s to %s: %s', source, target, e)
+                continue
+            if not moved:
+                continue
+            logger.debug('Moved %s to %s', source, target)
+            if self.on_moved is not None:
+                try:
+                    self.on_moved(str(source), str(target))
+                except Exception:
+                    logger.exception('Failed to record move of %s', source)
+
+    def close(self, wait=False):
+        """
+        Stop the mover. With wait, every file already handed over is moved
+        first; otherwise it stops after the current one and the rest stay in
+        scratch for recover().
+        """
+        with self._lock:
+            mover, self._mover = self._mover, None
+        if mover is None:
+            return
+        if not wait:
+            self._stop.set()
+        self._moves.put(None)
+        mover.join()
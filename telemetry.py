@@ -0,0 +1,90 @@
+"""
+Background detector telemetry (sensor temperature and fan state).
+
+The sampler shares the device lock with acquisition but only ever tries it
+without blocking. If a trigger/readout is in progress the tick is skipped, so
+telemetry never delays a frame. set_fan waits at most FAN_TIMEOUT for the
+lock, as it is called from the GUI thread.
+"""
+import logging
+import threading
+import time
+
+from SLDevicePythonWrapper import SLError
+
+logger = logging.getLogger(__name__)
+
+# Seconds set_fan waits for a capture to release the device
+FAN_TIMEOUT = 0.5
+
+
+class TelemetrySample:
+    __slots__ = ('timestamp', 'temperature', 'fan_on')
+
+    def __init__(self, timestamp, temperature, fan_on):
+        self.timestamp = timestamp
+        self.temperature = temperature
+        self.fan_on = fan_on
+
+
+class TelemetrySampler(threading.Thread):
+    def __init__(self, device, device_lock, interval=5.0, sensor_num=0):
+        super().__init__(name='telemetry', daemon=True)
+        self.device = device
+        self.device_lock = device_lock
+        self.interval = interval
+        self.sensor_num = sensor_num
+
+        # Replaced wholesale on each sample so readers never see a half-updated value
+        self.latest = TelemetrySample(None, None, None)
+        self._stop_event = threading.Event()
+
+    @property
+    def temperature(self):
+        return self.latest.temperature
+
+    def run(self):
+        # Call sample() once before start() if a reading is needed straight away
+        logger.info('Telemetry sampler started (every %.1fs)', self.interval)
+        while not self._stop_event.wait(self.interval):
+            self.sample()
+        logger.info('Telemetry sampler stopped')
+
+    def stop(self):
+        self._stop_event.set()
+
+    def sample(self):
+        if not self.device_lock.acquire(blocking=False):
+            logger.debug('Device busy, skipping telemetry sample')
+            return
+        try:
+            err, temperature = self.device.MeasureTemperature(self.sensor_num)
+            fan_err, fan_on = self.device.GetFanControl()
+        finally:
+            self.device_lock.release()
+
+        if err != SLError.SL_ERROR_SUCCESS:
+            logger.warning('Failed to measure temperature with error: %s', err)
+            temperature = self.latest.temperature
+        if fan_err != SLError.SL_ERROR_SUCCESS:
+            logger.warning('Failed to read fan control with error: %s', fan_err)
+            fan_on = self.latest.fan_on
+
+        self.latest = TelemetrySample(time.time(), temperature, fan_on)
+        logger.debug('Sensor temperature %sC, fan %s', temperature, 'on' if fan_on else 'off')
+
+    def set_fan(self, on):
+        """Switch the fan, or return False if the device stays busy for FAN_TIMEOUT"""
+        if not self.device_lock.acquire(timeout=FAN_TIMEOUT):
+            logger.warning('Device busy, fan not switched %s', 'on' if on else 'off')
+            return False
+        try:
+            err = self.device.SetFanControl(on)
+        finally:
+            self.device_lock.release()
+        if err != SLError.SL_ERROR_SUCCESS:
+            logger.error('Failed to set fan control to %s with error: %s', on, err)
+            return False
+        latest = self.latest
+        self.latest = TelemetrySample(latest.timestamp, latest.temperature, on)
+        return True
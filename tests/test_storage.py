@@ -0,0 +1,79 @@
+"""
+Calibration files must survive "Delete all dark images", which empties the
+darks root with a Housekeeper.
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+import numpy as np
+import imageio.v2 as imageio
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalogue import Catalogue, DARK, DEFECT_MAP, GAIN_MAP
+from housekeeping import Housekeeper, DELETE
+from storage import Storage, DARKS, GAINS, DEFECTS
+
+XDIM, YDIM = 1031, 1536
+
+
+def save_calibration(storage, catalogue):
+    """A dark, a defect map and a gain map where the GUI saves them"""
+    dark = storage.new_path(DARKS, 'dark_100ms', '.tif')
+    imageio.imwrite(dark, np.full((YDIM, XDIM), 300, dtype=np.uint16))
+    catalogue.add(dark, DARK, exposure=100)
+
+    # As defect_map.save_defect_map, which needs the SDK to import
+    defect_map = str(storage.folder(DEFECTS) / 'defect_map.tif')
+    mask = np.zeros((YDIM, XDIM), dtype=np.uint8)
+    mask[10, 20] = 1
+    imageio.imwrite(defect_map, mask)
+    catalogue.add(defect_map, DEFECT_MAP, exposure=100)
+
+    gain_map = storage.new_path(GAINS, 'gain_map_100ms', '.tif')
+    imageio.imwrite(gain_map, np.full((YDIM, XDIM), 1000, dtype=np.uint16))
+    catalogue.add(gain_map, GAIN_MAP, exposure=100)
+    return dark, defect_map, gain_map
+
+
+def test_emptying_darks_keeps_calibration(tmp_path):
+    storage = Storage(base=tmp_path)
+    catalogue = Catalogue(tmp_path)
+    dark, defect_map, gain_map = save_calibration(storage, catalogue)
+
+    done, failed = Housekeeper(storage.root(DARKS), DELETE, catalogue=catalogue).run()
+
+    assert (done, failed) == (1, 0)
+    assert not os.path.exists(dark)
+    assert os.path.exists(defect_map)
+    assert os.path.exists(gain_map)
+    assert catalogue.query(kind=(DEFECT_MAP, GAIN_MAP)) != []
+
+
+def test_adopt_moves_old_calibration_out_of_darks(tmp_path):
+    storage = Storage(base=tmp_path)
+    catalogue = Catalogue(tmp_path)
+    darks = storage.folder(DARKS)
+    old_defect_map = darks / 'defect_map.tif'
+    old_gain_map = darks / 'gain_map_100ms.tif'
+    for path in (old_defect_map, old_gain_map):
+        imageio.imwrite(path, np.zeros((4, 4), dtype=np.uint16))
+    catalogue.add(str(old_gain_map), GAIN_MAP, exposure=100)
+
+    catalogue.relocate(storage.adopt(DEFECTS, 'defect_map.*'))
+    catalogue.relocate(storage.adopt(GAINS, 'gain_map_*'))
+    Housekeeper(storage.root(DARKS), DELETE, catalogue=catalogue).run()
+
+    assert (storage.root(DEFECTS) / 'defect_map.tif').exists()
+    assert (storage.root(GAINS) / 'gain_map_100ms.tif').exists()
+    [record] = catalogue.query(kind=GAIN_MAP)
+    assert record['path'] == str(storage.root(GAINS) / 'gain_map_100ms.tif')
+
+
+@pytest.mark.parametrize('kind', (GAINS, DEFECTS))
+def test_calibration_may_not_share_the_darks_root(tmp_path, kind):
+    with pytest.raises(ValueError):
+        Storage(base=tmp_path, roots={DARKS: 'calibration', kind: str(tmp_path / 'calibration')})
@@ -0,0 +1,210 @@
+"""
+On-disk cache of 8-bit thumbnails for a folder of 16-bit captures.
+
+All thumbnails of a folder live in one fixed-slot file (thumbnails.u8, read
+through a memmap) described by one index (thumbnails.json). Index entries are
+keyed by file name and carry the file's mtime and size, so an edited or
+replaced capture is regenerated while unchanged ones are never decoded again.
+Missing thumbnails are generated on a worker pool in a background thread.
+"""
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import imageio.v2 as imageio
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = '.thumbnails'
+INDEX_NAME = 'thumbnails.json'
+DATA_NAME = 'thumbnails.u8'
+THUMBNAIL_SIZE = 128
+# Slots added each time the data file grows
+GROW_SLOTS = 256
+
+
+def make_thumbnail(filename, size=THUMBNAIL_SIZE):
+    """Block-averaged 8-bit preview whose long side is at most `size`"""
+    img = imageio.imread(filename)
+    if img.ndim == 3:
+        img = img[0] if img.shape[0] < img.shape[-1] else img[..., 0]
+
+    factor = max(1, -(-max(img.shape) // size))
+    h, w = img.shape[0] // factor, img.shape[1] // factor
+    small = img[:h * factor, :w * factor].reshape(h, factor, w, factor).mean(axis=(1, 3))
+
+    peak = small.max()
+    if peak > 0:
+        small *= 255 / peak
+    return small.astype(np.uint8)
+
+
+class ThumbnailCache:
+    def __init__(self, folder, size=THUMBNAIL_SIZE, workers=None):
+        self.folder = folder
+        self.size = size
+        self.workers = workers or min(8, os.cpu_count() or 1)
+        self.cache_dir = os.path.join(folder, CACHE_DIR)
+
+        self.entries = {}
+        self._lock = threading.Lock()
+        self._data = None
+        self._slots = 0
+        self._thread = None
+        self._stop = threading.Event()
+        self.load()
+
+    def _index_path(self):
+        return os.path.join(self.cache_dir, INDEX_NAME)
+
+    def _data_path(self):
+        return os.path.join(self.cache_dir, DATA_NAME)
+
+    def load(self):
+        self.entries = {}
+        try:
+            with open(self._index_path()) as f:
+                index = json.load(f)
+            if index.get('size') == self.size:
+                self.entries = index['entries']
+            else:
+                logger.info('Thumbnail size changed, rebuilding cache in %s', self.folder)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError):
+            logger.exception('Could not read thumbnail index in %s', self.folder)
+        self._open_data(max((e['slot'] for e in self.entries.values()), default=-1) + 1)
+
+    def save(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with self._lock:
+            if self._data is not None:
+                self._data.flush()
+            index = {'size': self.size, 'entries': dict(self.entries)}
+        tmp = self._index_path() + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp, self._index_path())
+
+    def _open_data(self, slots):
+        """(Re)open the data file with room for at least `slots` thumbnails"""
+        slots = -(-max(slots, 1) // GROW_SLOTS) * GROW_SLOTS
+        if slots <= self._slots:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        if self._data is not None:
+            self._data.flush()
+        slot_bytes = self.size * self.size
+        with open(self._data_path(), 'ab') as f:
+            if f.tell() < slots * slot_bytes:
+                f.truncate(slots * slot_bytes)
+        self._data = np.memmap(self._data_path(), dtype=np.uint8, mode='r+', shape=(slots, self.size, self.size))
+        self._slots = slots
+
+    @staticmethod
+    def _key(filename):
+        st = os.stat(filename)
+        return st.st_mtime_ns, st.st_size
+
+    def is_current(self, filename):
+        entry = self.entries.get(os.path.basename(filename))
+        if entry is None:
+            return False
+        try:
+            return (entry['mtime'], entry['bytes']) == self._key(filename)
+        except OSError:
+            return False
+
+    def get(self, filename):
+        """Cached thumbnail (a copy) or None if missing or out of date"""
+        if not self.is_current(filename):
+            return None
+        entry = self.entries[os.path.basename(filename)]
+        with self._lock:
+            return np.array(self._data[entry['slot'], :entry['h'], :entry['w']])
+
+    def put(self, filename, thumbnail):
+        name = os.path.basename(filename)
+        mtime, size = self._key(filename)
+        h, w = thumbnail.shape
+        with self._lock:
+            entry = self.entries.get(name)
+            if entry is not None:
+                slot = entry['slot']
+            else:
+                slot = len(self.entries)
+                self._open_data(slot + 1)
+            self._data[slot, :h, :w] = thumbnail
+            self.entries[name] = {'slot': slot, 'mtime': mtime, 'bytes': size, 'h': h, 'w': w}
+
+    def missing(self, files):
+        return [f for f in files if not self.is_current(f)]
+
+    def prune(self):
+        """Drop entries whose capture no longer exists and compact the slots"""
+        with self._lock:
+            alive = {
+                name: entry for name, entry in self.entries.items()
+                if os.path.exists(os.path.join(self.folder, name))
+            }
+            if len(alive) == len(self.entries):
+                return 0
+            removed = len(self.entries) - len(alive)
+            for new_slot, (name, entry) in enumerate(sorted(alive.items(), key=lambda item: item[1]['slot'])):
+                if entry['slot'] != new_slot:
+                    self._data[new_slot] = self._data[entry['slot']]
+                    entry['slot'] = new_slot
+            self.entries = alive
+        self.save()
+        return removed
+
+    def update(self, files, progress=None):
+        """
+        Generate thumbnails for files that are missing or stale, in parallel.
+        progress(done, total) is called as each one lands. Returns the number
+        generated.
+        """
+        todo = self.missing(files)
+        if not todo:
+            return 0
+        logger.info('Generating %d thumbnails in %s', len(todo), self.folder)
+        done = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = [pool.submit(make_thumbnail, f, self.size) for f in todo]
+            for filename, future in zip(todo, futures):
+                if self._stop.is_set():
+                    for f in futures:
+                        f.cancel()
+                    break
+                try:
+                    self.put(filename, future.result())
+                except (OSError, ValueError):
+                    logger.exception('Could not make a thumbnail for %s', filename)
+                done += 1
+                if progress is not None:
+                    progress(done, len(todo))
+        self.save()
+        return done
+
+    def update_in_background(self, files, progress=None, finished=None):
+        """Run update() on a daemon thread; finished(count) is called when it ends"""
+        self.stop()
+        self._stop.clear()
+
+        def run():
+            count = self.update(files, progress)
+            if finished is not None:
+                finished(count)
+
+        self._thread = threading.Thread(target=run, name='thumbnails', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        if self._thread is not None and self._thread.is_alive():
+            self._stop.set()
+            self._thread.join()
+        self._thread = None
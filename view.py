@@ -1,51 +1,110 @@
-import os
-import glob
-import re
+import sys
 import matplotlib.pyplot as plt
-import imageio.v2 as imageio
 import numpy as np
 
-def extract_exposure_time(filename):
+from catalogue import Catalogue, CAPTURE, BURST
+from storage import Storage, CAPTURES
+from thumbnail_cache import ThumbnailCache
+
+# Thumbnails per page of the gallery
+ROWS, COLS = 6, 8
+
+def montage(thumbnails, rows, cols, size):
+    """Tile thumbnails into one 8-bit image so a page is a single imshow"""
+    sheet = np.zeros((rows * size, cols * size), dtype=np.uint8)
+    for i, thumb in enumerate(thumbnails[:rows * cols]):
+        if thumb is None:
+            continue
+        r, c = divmod(i, cols)
+        h, w = thumb.shape
+        y, x = r * size + (size - h) // 2, c * size + (size - w) // 2
+        sheet[y:y + h, x:x + w] = thumb
+    return sheet
+
+def plot_grid(records, title, cache, rows=ROWS, cols=COLS):
     """
-    Extract exposure time (in ms) from filename like '200ms_7196.tif'
-    Returns integer value in ms.
+    Page through the thumbnails of catalogue records, in the order given.
+    Left/right or page up/down change page. Thumbnails still being generated
+    show as blank and fill in on the next redraw.
     """
-    match = re.search(r"(\d+)ms", os.path.basename(filename))
-    if match:
-        return int(match.group(1))
-    else:
-        return float("inf")
-
-def plot_grid(files, title):
-    # Sort by exposure time
-    files.sort(key=extract_exposure_time)
-    files = files[:12]
-
-    fig, axes = plt.subplots(3, 4, figsize=(12, 9))
-    fig.suptitle(title, fontsize=14)
-    axes = axes.ravel()
-
-    for i, file in enumerate(files):
-        img = imageio.imread(file)  # 16-bit TIFF
-        img_norm = img.astype(np.float32) / np.max(img)  # normalize 0–1
-        axes[i].imshow(img_norm, cmap="gray", vmin=0, vmax=1)
-        axes[i].set_title(f"{extract_exposure_time(file)} ms", fontsize=9)
-        axes[i].axis("off")
+    files = [r["path"] for r in records]
+    exposures = [r["exposure"] for r in records]
+    per_page = rows * cols
+    pages = max(1, -(-len(files) // per_page))
+    state = {'page': 0}
+
+    fig, ax = plt.subplots(figsize=(cols * 1.5, rows * 1.5 + 0.5))
+    ax.axis("off")
+    image = ax.imshow(np.zeros((rows * cache.size, cols * cache.size), dtype=np.uint8), cmap="gray", vmin=0, vmax=255)
+    labels = []
+
+    def draw():
+        first = state['page'] * per_page
+        page_files = files[first:first + per_page]
+        image.set_data(montage([cache.get(f) for f in page_files], rows, cols, cache.size))
+        for label in labels:
+            label.remove()
+        labels.clear()
+        for i, exposure in enumerate(exposures[first:first + per_page]):
+            r, c = divmod(i, cols)
+            labels.append(ax.text(
+                c * cache.size + 2, r * cache.size + 2, f"{exposure} ms",
+                color="yellow", fontsize=7, va="top",
+            ))
+        fig.suptitle(f"{title} - page {state['page'] + 1}/{pages} ({len(files)} images)", fontsize=12)
+        fig.canvas.draw_idle()
+
+    def on_key(event):
+        if event.key in ("right", "pagedown"):
+            state['page'] = min(state['page'] + 1, pages - 1)
+        elif event.key in ("left", "pageup"):
+            state['page'] = max(state['page'] - 1, 0)
+        elif event.key != "r":
+            return
+        draw()
 
+    fig.canvas.mpl_connect("key_press_event", on_key)
+    draw()
     plt.tight_layout()
-    plt.show()
+    return fig, draw
 
 def plot_tifs_two_sets(folder_path):
-    files = glob.glob(os.path.join(folder_path, "*.tif"))
+    # The GUI's catalogue, wherever the captures root has been moved to
+    catalogue = Catalogue(Storage().base)
+    catalogue.import_legacy(folder_path)
+    catalogue.remove_missing(folder_path)
+    raw_files = catalogue.query(kind=(CAPTURE, BURST), corrected=False, folder=folder_path)
+    corr_files = catalogue.query(kind=(CAPTURE, BURST), corrected=True, folder=folder_path)
+    files = [r["path"] for r in raw_files + corr_files]
+
+    if not files:
+        raise ValueError(f"No catalogued images in {folder_path}")
+
+    # Figures render straight from the cache; anything not cached yet is
+    # generated in the background and filled in by a redraw timer
+    cache = ThumbnailCache(folder_path)
+    cache.prune()
+    figures = []
+    if raw_files:
+        figures.append(plot_grid(raw_files, "Uncorrected Images", cache))
+    if corr_files:
+        figures.append(plot_grid(corr_files, "Corrected Images", cache))
 
-    corr_files = [f for f in files if os.path.basename(f).startswith("corr_")]
-    raw_files = [f for f in files if not os.path.basename(f).startswith("corr_")]
+    if cache.missing(files):
+        worker = cache.update_in_background(files)
+        for fig, draw in figures:
+            timer = fig.canvas.new_timer(interval=500)
 
-    if len(corr_files) < 12 or len(raw_files) < 12:
-        raise ValueError("Need at least 12 corr_ and 12 non-corr_ images.")
+            def refresh(draw=draw, timer=timer):
+                draw()
+                if not worker.is_alive():
+                    timer.stop()
 
-    plot_grid(raw_files, "Uncorrected Images")
-    plot_grid(corr_files, "Corrected Images")
+            timer.add_callback(refresh)
+            timer.start()
+
+    plt.show()
+    cache.stop()
 
-# Example usage:
-plot_tifs_two_sets(r"C:\programming\pyside6-practice\Images\captured_images")
+if __name__ == "__main__":
+    plot_tifs_two_sets(sys.argv[1] if len(sys.argv) > 1 else Storage().root(CAPTURES))